@@ -9,14 +9,33 @@ from routes.dashboard import dashboard_bp
 from routes.agents import agents_bp
 from flask_login import LoginManager, login_required
 
-def create_app():
+def create_app(check_schema=True):
+    """
+    The Flask app. Fails fast when the database is missing tables or columns
+    (they come from init_db.py, not from here); init_db.py and the migrate
+    scripts pass check_schema=False.
+    """
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'dev-secret-key-change-in-prod' # TODO: Use env var
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///rental.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///rental.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Request instrumentation (see utils_instrumentation)
+    app.config['INSTRUMENTATION'] = os.environ.get('INSTRUMENTATION', '1') != '0'
+    app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+    app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING') == '1'
+    app.config['INSTRUMENTATION_LOG'] = os.environ.get('INSTRUMENTATION_LOG', 'requests.log')
+    app.config['INSTRUMENTATION_LOG_ALL'] = os.environ.get('INSTRUMENTATION_LOG_ALL') == '1'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN') # /metrics is off without one
+
     db.init_app(app)
 
+    from utils_instrumentation import init_instrumentation
+    init_instrumentation(app)
+    from utils_metrics import init_metrics
+    init_metrics(app)
+
     login_manager = LoginManager()
     login_manager.login_view = 'auth.login'
     login_manager.init_app(app)
@@ -38,26 +57,55 @@ def create_app():
     from routes.reports import reports_bp
     app.register_blueprint(reports_bp, url_prefix='/reports')
 
+    from routes.jobs import jobs_bp
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+
+    from routes.search import search_bp
+    app.register_blueprint(search_bp, url_prefix='/search')
+
+    from routes.metrics import metrics_bp
+    app.register_blueprint(metrics_bp)
+
     @app.route('/')
     def index():
         return redirect(url_for('auth.login'))
 
-    with app.app_context():
-        db.create_all()
-        # Seed Admin User
-        from werkzeug.security import generate_password_hash
-        if not User.query.filter_by(username='admin').first():
-            admin = User(
-                username='admin', 
-                password_hash=generate_password_hash('admin123'),
-                role='admin'
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("Created default admin user.")
-
+    if check_schema:
+        _check_schema(app)
     return app
 
+def _check_schema(app):
+    """
+    Raises when the database is behind the models: a table or mapped column
+    is missing, e.g. after an update without init_db.py. One sqlite_master
+    query and one PRAGMA per table.
+    """
+    from init_db import migration_for
+    missing = []
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        existing = set(inspector.get_table_names())
+        if db.engine.dialect.name == 'sqlite' and 'search_index' not in existing:
+            missing.append('search_index') # FTS5 table from utils_search
+        for name, table in db.metadata.tables.items():
+            if name not in existing:
+                missing.append(name)
+                continue
+            columns = {c['name'] for c in inspector.get_columns(name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    script = migration_for(name, column.name)
+                    missing.append(f"{name}.{column.name}" + (f" (from {script}.py)" if script else ""))
+    if missing:
+        raise RuntimeError(
+            f"The database is behind this version of the code; missing: {', '.join(missing)}. "
+            "Run `python init_db.py` (after every update): it creates the tables and runs the "
+            "pending migrate scripts in order. Then restart the server."
+        )
+
 if __name__ == '__main__':
-    app = create_app()
+    # Tables, search index and admin login come from init_db.py, not create_app():
+    # every server worker and script calls create_app()
+    from init_db import init_db
+    app = init_db()
     app.run(debug=True)
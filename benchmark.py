@@ -0,0 +1,285 @@
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Hot-path benchmarks against generated portfolios (generate_portfolio.py):
+#
+#   python benchmark.py [--scales small,medium] [--repeat 3] [--only aging_report,...] [--save] [--ci]
+#                       [--today YYYY-MM-DD]
+#
+# Each read-only case runs once untimed, then records its best wall time
+# over --repeat runs and the number of SQL statements of the last run.
+# Results are compared with the committed benchmark_baseline.json: the script exits 1 when a case runs more queries
+# than its baseline, or is slower by more than TIME_TOLERANCE (and
+# MIN_SLOWDOWN seconds). --ci is for a build server: it exits 1 when a case
+# has no baseline and compares query counts only, since the committed
+# timings come from another machine.
+# --save records the current results as the baseline.
+# Portfolios are generated as of TODAY (pinned, so query counts match the
+# baseline on any day) into the instance folder and reused; cases that
+# write run last, on a copy.
+
+SCALES = { # name: (units, years)
+    'small': (200, 3),
+    'medium': (1000, 5),
+    'large': (5000, 10),
+}
+DEFAULT_SCALES = ['small', 'medium']
+SEED = 1
+TODAY = date(2026, 6, 30) # Portfolio date of the committed baseline; change both together
+BASELINE_FILE = 'benchmark_baseline.json'
+TIME_TOLERANCE = 0.25 # 25% slower than baseline fails...
+MIN_SLOWDOWN = 0.05 # ...if also this many seconds slower (timer noise on fast cases)
+LHDN_INVOICES = 20 # Invoices turned into e-invoice payloads
+IMPORT_ROWS = 200
+
+# Every process-wide SQL statement while counting (the benchmark runs single-threaded)
+_queries = [0]
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _queries[0] += 1
+
+# --- Cases ------------------------------------------------------------------
+# Each case takes the benchmark context and runs once; setup(ctx) picks its
+# inputs beforehand (untimed). Cases marked as writing run after all others.
+
+def _get(ctx, url):
+    response = ctx['client'].get(url)
+    assert response.status_code == 200, f"GET {url}: {response.status_code}"
+
+def _post(ctx, url, **kwargs):
+    response = ctx['client'].post(url, **kwargs)
+    assert response.status_code in (200, 302), f"POST {url}: {response.status_code}"
+    return response
+
+def setup_busiest_tenant(ctx):
+    from models import db, Invoice
+    ctx['busiest_tenant'] = db.session.query(Invoice.tenant_id).group_by(Invoice.tenant_id)\
+        .order_by(db.func.count().desc()).limit(1).scalar()
+
+def case_tenant_unpaid_items(ctx):
+    from utils import get_tenant_unpaid_items
+    get_tenant_unpaid_items(ctx['busiest_tenant'])
+
+def setup_exemptions(ctx):
+    from models import SSTExemption
+    by_tenant = {}
+    for ex in SSTExemption.query.all():
+        by_tenant.setdefault(ex.tenant_id, []).append(ex)
+    ctx['exemptions'] = list(by_tenant.values())
+
+def case_taxable_fraction(ctx):
+    from utils_sst import calculate_taxable_fraction
+    months = [date(2025, m, 1) for m in range(1, 13)] + [date(2026, m, 1) for m in range(1, 13)]
+    for exemptions in ctx['exemptions']:
+        for start in months:
+            end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            calculate_taxable_fraction(start, end, exemptions)
+
+def case_prepare_late_fees(ctx):
+    _get(ctx, '/billing/prepare_late_fees')
+
+def case_aging_report(ctx):
+    _get(ctx, '/billing/aging_report')
+
+def case_dashboard_metrics(ctx):
+    from routes.dashboard import get_dashboard_metrics
+    get_dashboard_metrics()
+
+def case_list_tenants_search(ctx):
+    _get(ctx, '/tenants/?search=maju')
+
+def case_properties_dashboard(ctx):
+    _get(ctx, '/properties/')
+
+def case_sst_report(ctx):
+    _post(ctx, '/reports/sst_preparation', data={'start_date': '2025-07-01', 'end_date': ctx['today'].isoformat()})
+
+def setup_lhdn(ctx):
+    """A sandbox MyInvois configuration (in the working copy) and the invoices to build payloads for."""
+    from models import db, Invoice, MyInvoisConfig
+    db.session.query(MyInvoisConfig).delete()
+    db.session.add(MyInvoisConfig(environment='sandbox', issuer_tin='C0000000000'))
+    db.session.commit()
+    ctx['lhdn_invoices'] = [i for (i,) in db.session.query(Invoice.id).order_by(Invoice.id.desc()).limit(LHDN_INVOICES)]
+
+def case_lhdn_payload(ctx):
+    from models import Invoice
+    from services.lhdn_service import LHDNService
+    service = LHDNService()
+    for invoice in Invoice.query.filter(Invoice.id.in_(ctx['lhdn_invoices'])):
+        service._generate_payload(invoice)
+
+def case_generate_rent(ctx):
+    next_month = (ctx['today'].replace(day=1) + timedelta(days=32)).strftime('%Y-%m')
+    _post(ctx, '/billing/generate_rent', data={'target_date': next_month})
+
+def setup_import(ctx):
+    from models import Property
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['Account Code', 'project', 'floor', 'lot', 'Agreement status', 'Tenant Name',
+                     'Security', 'Utility', 'MISC', 'Rent RM', 'Start Date', 'End Date'])
+    units = Property.query.filter_by(status='vacant').order_by(Property.id).limit(IMPORT_ROWS).all()
+    start = ctx['today'].replace(day=1)
+    for i in range(IMPORT_ROWS):
+        unit = units[i] if i < len(units) else None
+        writer.writerow([f"9000/{i:05}", unit.project if unit else 'MISC', unit.floor if unit else 'G',
+                         unit.unit if unit else str(i), 'active', f"BENCHMARK IMPORT {i} SDN BHD",
+                         2000, 500, 0, 1500, start.isoformat(), (start + timedelta(days=364)).isoformat()])
+    ctx['import_csv'] = out.getvalue().encode('utf-8')
+
+def case_import_tenants(ctx):
+    _post(ctx, '/tenants/import', data={'file': (io.BytesIO(ctx['import_csv']), 'benchmark.csv')},
+          content_type='multipart/form-data')
+
+# (name, case, setup, writes)
+CASES = [
+    ('tenant_unpaid_items', case_tenant_unpaid_items, setup_busiest_tenant, False),
+    ('taxable_fraction', case_taxable_fraction, setup_exemptions, False),
+    ('prepare_late_fees', case_prepare_late_fees, None, False),
+    ('aging_report', case_aging_report, None, False),
+    ('dashboard_metrics', case_dashboard_metrics, None, False),
+    ('list_tenants_search', case_list_tenants_search, None, False),
+    ('properties_dashboard', case_properties_dashboard, None, False),
+    ('sst_report', case_sst_report, None, False),
+    ('lhdn_payload', case_lhdn_payload, setup_lhdn, True),
+    ('generate_rent', case_generate_rent, None, True),
+    ('import_tenants', case_import_tenants, setup_import, True),
+]
+
+# --- Runner -----------------------------------------------------------------
+
+def portfolio(scale, today=TODAY):
+    """Path of the scale's portfolio as of today (in the instance folder), generating it if needed."""
+    from generate_portfolio import generate
+    units, years = SCALES[scale]
+    name = f"benchmark_{scale}_{today.isoformat()}.db"
+    instance = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+    path = os.path.join(instance, name)
+    if not os.path.exists(path):
+        for old in os.listdir(instance) if os.path.isdir(instance) else []:
+            if old.startswith(f"benchmark_{scale}_"):
+                os.remove(os.path.join(instance, old))
+        print(f"Generating {scale} portfolio ({units} units, {years} years)...")
+        os.environ['DATABASE_URL'] = f"sqlite:///{name}"
+        generate(units=units, years=years, seed=SEED, today=today, reset=True)
+    return path
+
+def run_scale(scale, repeat, only, today=TODAY):
+    from app import create_app
+    from models import db
+
+    source = portfolio(scale, today)
+    tmp = tempfile.mkdtemp(prefix='benchmark_')
+    work = os.path.join(tmp, 'work.db')
+    shutil.copy(source, work)
+    os.environ['DATABASE_URL'] = f"sqlite:///{work}"
+    app = create_app()
+    app.config['TESTING'] = True
+
+    results = {}
+    client = app.test_client()
+    ctx = {'client': client, 'tmp': tmp, 'today': today}
+    try:
+        _post(ctx, '/login', data={'username': 'admin', 'password': 'admin123'})
+        for name, case, setup, writes in CASES:
+            if only and name not in only:
+                continue
+            if setup:
+                with app.app_context():
+                    setup(ctx)
+            if not writes:
+                # Untimed warm-up: one-off work (snapshot and rollup builds, caches) is not counted
+                with app.app_context():
+                    case(ctx)
+            best = None
+            for _ in range(1 if writes else repeat):
+                # A fresh app context per run: empty session, as in a new request
+                with app.app_context():
+                    _queries[0] = 0
+                    started = time.perf_counter()
+                    case(ctx)
+                    elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = {'seconds': round(best, 4), 'queries': _queries[0]}
+            print(f"  {scale:<7} {name:<22} {best * 1000:>10.1f} ms {_queries[0]:>7} queries")
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+def compare(results, baseline, ci=False):
+    """[(scale, case, reason)] for every case that regressed against the baseline (or has none, in CI mode)."""
+    regressions = []
+    for scale, cases in results.items():
+        for name, result in cases.items():
+            base = baseline.get(scale, {}).get(name)
+            if not base:
+                if ci:
+                    regressions.append((scale, name, f"no baseline in {BASELINE_FILE}"))
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append((scale, name, f"{result['queries']} queries (baseline {base['queries']})"))
+            slower = result['seconds'] - base['seconds']
+            if not ci and slower > MIN_SLOWDOWN and result['seconds'] > base['seconds'] * (1 + TIME_TOLERANCE):
+                regressions.append((scale, name, f"{result['seconds'] * 1000:.0f} ms (baseline {base['seconds'] * 1000:.0f} ms)"))
+    return regressions
+
+def main(scales, repeat=3, only=None, save=False, ci=False, today=TODAY):
+    # Timings here are the benchmark's own; request logging would only add noise
+    os.environ.setdefault('INSTRUMENTATION', '0')
+    baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), BASELINE_FILE)
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    results = {}
+    for scale in scales:
+        results[scale] = run_scale(scale, repeat, only, today)
+
+    if save:
+        for scale, cases in results.items():
+            baseline.setdefault(scale, {}).update(cases)
+        with open(baseline_path, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {BASELINE_FILE}.")
+        return 0
+
+    regressions = compare(results, baseline, ci=ci)
+    for scale, name, reason in regressions:
+        print(f"REGRESSION {scale} {name}: {reason}")
+    if not baseline:
+        print("No baseline yet; run with --save to record one.")
+    elif not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+def _option(args, name, default, cast=str):
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    only = _option(args, '--only', None)
+    sys.exit(main(
+        scales=_option(args, '--scales', ','.join(DEFAULT_SCALES)).split(','),
+        repeat=int(_option(args, '--repeat', 3)),
+        only=set(only.split(',')) if only else None,
+        save='--save' in args,
+        ci='--ci' in args,
+        today=_option(args, '--today', TODAY, lambda s: datetime.strptime(s, '%Y-%m-%d').date())
+    ))
@@ -0,0 +1,36 @@
+from app import create_app
+import sys
+
+from models import TenantDuplicate
+from utils_dedup import refresh_duplicate_queue, merge_tenants, dismiss_duplicate
+
+USAGE = """Usage:
+  python dedupe_tenants.py                      Rescan and list pending duplicate pairs
+  python dedupe_tenants.py merge KEEP_ID DUP_ID Merge tenant DUP_ID into KEEP_ID
+  python dedupe_tenants.py dismiss PAIR_ID      Mark a queued pair as not a duplicate"""
+
+def scan():
+    result = refresh_duplicate_queue()
+    pairs = TenantDuplicate.query.filter_by(status='pending').order_by(TenantDuplicate.score.desc()).all()
+    for p in pairs:
+        print(f"[{p.id}] {p.score:.2f}  #{p.tenant_id} {p.tenant.name}  <->  #{p.duplicate_id} {p.duplicate.name}  ({p.reasons})")
+    print(f"New: {result['added']}, cleared: {result['removed']}, pending review: {result['pending']}")
+
+def run(args):
+    app = create_app()
+    with app.app_context():
+        if not args:
+            scan()
+        elif args[0] == 'merge' and len(args) == 3:
+            moved = merge_tenants(int(args[1]), int(args[2]))
+            for table, count in sorted(moved.items()):
+                print(f"  {table}: {count}")
+            print(f"Merged tenant #{args[2]} into #{args[1]}.")
+        elif args[0] == 'dismiss' and len(args) == 2:
+            dismiss_duplicate(int(args[1]))
+            print(f"Pair {args[1]} dismissed.")
+        else:
+            print(USAGE)
+
+if __name__ == '__main__':
+    run(sys.argv[1:])
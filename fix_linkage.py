@@ -1,57 +1,31 @@
 
 from app import create_app
 from models import db, Property, Lease
+from utils_units import relink_leases
 
 app = create_app()
 
 def fix():
     with app.app_context():
-        # Get active leases without property_id
-        active_leases = Lease.query.all()
+        total = Lease.query.count()
+        print(f"Total Leases: {total}")
         
-        print(f"Total Leases: {len(active_leases)}")
+        # Links pointing at deleted properties are reset first so they get relinked
+        broken = Lease.query.filter(
+            Lease.property_id != None,
+            ~Lease.property_id.in_(db.session.query(Property.id))
+        ).all()
+        for lease in broken:
+            print(f"BROKEN LINK: Lease '{lease.unit_number}' points to Dead ID {lease.property_id}")
+        if broken:
+            Lease.query.filter(Lease.id.in_([l.id for l in broken])).update(
+                {Lease.property_id: None}, synchronize_session=False
+            )
         
-        relinked_count = 0
-        missing_properties = []
+        # One join per unit-key form (exact, project-prefixed, prefix-stripped)
+        relinked_count = relink_leases()
         
-        for lease in active_leases:
-            if not lease.property_id:
-                # Try to find property by unit_number
-                # Try exact match first
-                target_unit = lease.unit_number.strip()
-                # Debug Check
-                if 'P5' in target_unit:
-                     print(f"DEBUG: Checking Lease Unit '{target_unit}' (Len: {len(target_unit)})")
-                     # Find ANY P5 property
-                     p5_props = Property.query.filter(Property.unit_number.ilike('%P5%')).all()
-                     for p in p5_props:
-                         print(f"   Candidate: '{p.unit_number}' (ID: {p.id}, Len: {len(p.unit_number)})")
-                         if p.unit_number == target_unit:
-                             print("   -> EXACT STRING MATCH!")
-                         else:
-                             print(f"   -> Mismatch. Target vs Cand: {list(target_unit)} vs {list(p.unit_number)}")
-
-                prop = Property.query.filter(Property.unit_number == target_unit).first()
-                if not prop:
-                     prop = Property.query.filter(Property.unit_number.ilike(target_unit)).first()
-                
-                if prop:
-                    print(f"MATCH FOUND: Lease '{lease.unit_number}' -> Property '{prop.unit_number}' (ID: {prop.id})")
-                    lease.property_id = prop.id
-                    relinked_count += 1
-                else:
-                    # Try fuzzy variations? 
-                    # e.g. "C-0-3A" vs "C-0-03A" or "C-G-3A"
-                    print(f"MISSING: Property for Lease '{lease.unit_number}' not found in DB.")
-                    missing_properties.append(lease.unit_number)
-            else:
-                 # Check if linked property actually exists
-                 prop = Property.query.get(lease.property_id)
-                 if not prop:
-                     print(f"BROKEN LINK: Lease '{lease.unit_number}' points to Dead ID {lease.property_id}")
-                     lease.property_id = None # Reset
-        
-        if relinked_count > 0:
+        if relinked_count > 0 or broken:
             db.session.commit()
             print(f"Successfully relinked {relinked_count} leases.")
             
@@ -63,6 +37,7 @@ def fix():
         else:
             print("No leases could be automatically relinked.")
             
+        missing_properties = [u for (u,) in db.session.query(Lease.unit_number).filter(Lease.property_id == None).distinct()]
         if missing_properties:
             print("\nThe following Lease Units do NOT exist in the Property Database:")
             for m in missing_properties:
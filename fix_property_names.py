@@ -3,6 +3,16 @@ from models import db, Property
 
 app = create_app()
 
+def rename(p, new_name, label):
+    """Renames unless another property already has the new unit number (unique)."""
+    clash = Property.query.filter(Property.unit_number == new_name, Property.id != p.id).first()
+    if clash:
+        print(f"Skipped {label}: {p.unit_number} -> {new_name} (same unit as {clash.unit_number})")
+        return 0
+    print(f"Renamed {label}: {p.unit_number} -> {new_name}")
+    p.unit_number = new_name
+    return 1
+
 with app.app_context():
     print("Starting Property Name Fix...")
     
@@ -27,9 +37,7 @@ with app.app_context():
                 # "Lot 17, B-0-5". unique.
                 # So stripping prefix is safe because suffix contains unique info.
                 
-                p.unit_number = new_name
-                count += 1
-                print(f"Renamed: {original} -> {new_name}")
+                count += rename(p, new_name, 'Lot')
                 
     # Fix SH (Suria Shops) - e.g. 13-G-SH13-1-0 -> SH13-1-0
     props_sh = Property.query.filter(Property.unit_number.like('%SH%')).all()
@@ -41,13 +49,7 @@ with app.app_context():
             idx = original.find('SH')
             if idx > 0:
                  new_name = original[idx:]
-                 p.unit_number = new_name
-                 count += 1
-                 print(f"Renamed SH: {original} -> {new_name}")
-                
-                 p.unit_number = new_name
-                 count += 1
-                 print(f"Renamed SH: {original} -> {new_name}")
+                 count += rename(p, new_name, 'SH')
                  
     # Fix Elemen P2 Shops (G-C-0-1 -> C-0-1)
     props_c = Property.query.filter(Property.unit_number.like('G-C-%')).all()
@@ -55,9 +57,7 @@ with app.app_context():
         original = p.unit_number
         if original.startswith('G-C-'):
              new_name = original[2:] # Strip "G-"
-             p.unit_number = new_name
-             count += 1
-             print(f"Renamed Elemen C: {original} -> {new_name}")
+             count += rename(p, new_name, 'Elemen C')
              
     # Fix Kolam Centre (3-1-3-7B -> 1-3-7B)
     # Pattern: Digit-1-...
@@ -68,14 +68,7 @@ with app.app_context():
         # e.g. "3-1-"
         if len(original) > 4 and original[0].isdigit() and original[1] == '-' and original[2:4] == '1-':
              new_name = original[2:]
-             p.unit_number = new_name
-             count += 1
-             print(f"Renamed Kolam: {original} -> {new_name}")
-
-             new_name = original[2:]
-             p.unit_number = new_name
-             count += 1
-             print(f"Renamed Kolam: {original} -> {new_name}")
+             count += rename(p, new_name, 'Kolam')
              
     # Fix Latitud 6 (G-0-1 -> 0-1)
     props_lat = Property.query.filter(Property.unit_number.like('G-0-%')).all()
@@ -83,14 +76,7 @@ with app.app_context():
         original = p.unit_number
         if original.startswith('G-0-'):
              new_name = original[2:] # Strip "G-"
-             p.unit_number = new_name
-             count += 1
-             print(f"Renamed Latitud: {original} -> {new_name}")
-
-             new_name = original[2:] # Strip "G-"
-             p.unit_number = new_name
-             count += 1
-             print(f"Renamed Latitud: {original} -> {new_name}")
+             count += rename(p, new_name, 'Latitud')
 
     # Fix Elemen P2 Shops remaining (1-C-1-1 -> C-1-1, 2-C-2-1 -> C-2-1)
     # Pattern: Digit-C-...
@@ -100,9 +86,7 @@ with app.app_context():
         # Check if it starts with digit + hyphen + 'C-'
         if len(original) > 4 and original[0].isdigit() and original[1] == '-' and original[2:4] == 'C-':
              new_name = original[2:]
-             p.unit_number = new_name
-             count += 1
-             print(f"Renamed Elemen C Rem: {original} -> {new_name}")
+             count += rename(p, new_name, 'Elemen C Rem')
 
     db.session.commit()
     print(f"Fixed {count} properties.")
@@ -1,5 +1,6 @@
 from app import create_app
 from models import db, Property, Lease
+from utils_units import relink_leases
 from datetime import date
 
 app = create_app()
@@ -9,19 +10,13 @@ with app.app_context():
     
     # 1. Fix Missing Property Links in Leases
     # (If leases were imported with unit_number but not property_id)
-    leases_without_link = Lease.query.filter(Lease.property_id == None).all()
-    print(f"Found {len(leases_without_link)} leases without property_id links.")
+    unlinked = Lease.query.filter(Lease.property_id == None).count()
+    print(f"Found {unlinked} leases without property_id links.")
     
-    linked_count = 0
-    for lease in leases_without_link:
-        # Find property by unit number
-        prop = Property.query.filter_by(unit_number=lease.unit_number).first()
-        if prop:
-            lease.property_id = prop.id
-            linked_count += 1
-            print(f"Linked Lease {lease.id} ({lease.unit_number}) -> Property {prop.id}")
-        else:
-            print(f"WARNING: Could not find Property for Lease {lease.id} ({lease.unit_number})")
+    # Match on the normalized unit key in one join per key form
+    linked_count = relink_leases()
+    for lease in Lease.query.filter(Lease.property_id == None):
+        print(f"WARNING: Could not find Property for Lease {lease.id} ({lease.unit_number})")
             
     db.session.commit()
     print(f"Successfully linked {linked_count} leases.")
@@ -0,0 +1,440 @@
+from app import create_app
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import count
+
+from sqlalchemy import literal, select, text
+
+from models import (
+    db, Project, Property, Tenant, Lease, Invoice, InvoiceLineItem, LateFeeSource, Receipt,
+    SSTExemption, PropertyExpense, Agent, Commission, EXPENSE_GL_CODES
+)
+from init_db import init_db
+from utils_lease_ledger import refresh_lease_summaries
+from utils_lease_timeline import refresh_latest_lease_end
+from utils_search import ensure_search_index
+from utils_tenant_lifecycle import refresh_effective_status
+from utils_units import unit_key
+
+# Synthetic portfolio for load and scale testing:
+#
+#   python generate_portfolio.py [--units 500] [--years 3] [--projects 5] [--seed 1] [--today YYYY-MM-DD] [--reset]
+#
+# Writes into the database named by DATABASE_URL, which must be set (e.g.
+# DATABASE_URL=sqlite:///synthetic.db) so the app's own rental.db is never
+# filled by accident. Refuses a database that already has tenants unless
+# --reset is given, which drops every table but the logins and
+# MyInvois settings. The same arguments (including --today) always produce the
+# same data. 10 years x 5,000 units is about 2.5M rows.
+
+PROJECTS = [
+    ('Kota Century', 'KC'), ('Latitud 6', 'L6'), ('Sina Plaza', 'SP'), ('Bandar Baru Centre', 'BBC'),
+    ('Riverside Walk', 'RW'), ('Taman Damai', 'TD'), ('Harbour Point', 'HP'), ('Jesselton Square', 'JS'),
+]
+PROPERTY_TYPES = [ # (type, category, weight, median rent, median sqft)
+    ('Shop', 'Commercial', 40, 2800, 1400),
+    ('Office', 'Commercial', 20, 1900, 1000),
+    ('Apartment', 'Residential', 40, 1200, 850),
+]
+COMPANY_WORDS = ['Maju', 'Jaya', 'Sinar', 'Borneo', 'Emas', 'Harmoni', 'Setia', 'Kinabalu', 'Mega', 'Prima',
+                 'Global', 'Bintang', 'Cahaya', 'Mutiara', 'Sentosa', 'Alam', 'Pacific', 'Delta', 'Seri', 'Indah']
+COMPANY_TRADES = ['Trading', 'Enterprise', 'Holdings', 'Services', 'Hardware', 'Motor', 'Pharmacy', 'Clinic',
+                  'Restaurant', 'Bakery', 'Electrical', 'Textile', 'Travel', 'Properties', 'Logistics']
+FIRST_NAMES = ['Ahmad', 'Siti', 'Wong', 'Lim', 'Tan', 'Nur', 'Mohd', 'Chong', 'Lee', 'Aminah', 'Rajesh', 'Mary',
+               'John', 'Fatimah', 'Ismail', 'Chin', 'Yap', 'Liew', 'Daniel', 'Grace']
+LAST_NAMES = ['Abdullah', 'Kee Ming', 'Mei Ling', 'Hassan', 'Wei Jie', 'Ibrahim', 'Kumar', 'Yusof', 'Ah Kow',
+              'Suhaili', 'Chee Keong', 'Rahman', 'Siew Lan', 'Majid', 'Jun Hao']
+
+OCCUPIED_AT_START = 0.8
+LEASE_TERMS = ([12, 24, 36], [50, 35, 15]) # months, weights
+RENEWAL_RATE = 0.6
+RENEWAL_INCREASE = 1.05
+REPEAT_TENANT_RATE = 0.1 # New commercial tenancies taken by an existing company tenant
+PAYERS = [ # (weight, (days to pay low, high, lowest share of a partial payment, chance of skipping a month))
+    (70, (0, 10, 1.0, 0.0)), # Prompt
+    (20, (10, 60, 1.0, 0.02)), # Slow
+    (10, (20, 90, 0.6, 0.15)), # Poor: partial payments
+]
+LATE_FEE_CHANCE = 0.25 # Per invoice paid > 30 days late or unpaid after 60
+LATE_FEE_RATE = 0.08 # Per annum, as in billing.prepare_late_fees
+SST_RATE = 0.08
+SST_START = date(2025, 7, 1) # Commercial rentals became taxable
+SST_REGISTERED = 0.35 # Of company tenants renting commercial units
+SST_EXEMPT = 0.1 # Of registered tenants
+COMMISSION_CHANCE = 0.5 # New tenancies placed by an agent
+AGENTS = 20
+FLUSH_INVOICES = 20000 # Rows are inserted in batches of roughly this many invoices
+KEPT_TABLES = {'user', 'my_invois_config'}
+
+# Expenses: (type, months billed, expected field, expected is per year)
+EXPENSES = [
+    ('quit_rent', [3], 'expected_quit_rent', True),
+    ('assessment', [2, 8], 'expected_assessment', True),
+    ('fire_insurance', [1], 'expected_fire_insurance', True),
+    ('management_fee', [1, 4, 7, 10], 'expected_management_fee', False),
+    ('sinking_fund', [1, 4, 7, 10], 'expected_sinking_fund', False),
+]
+
+# Parents first. The millions of billing rows are built as tuples in BULK_COLUMNS
+# order with dates already as ISO strings; the other tables as dicts. Columns
+# left out take their scalar defaults.
+TABLES = [
+    ('project', Project), ('agent', Agent), ('property', Property), ('tenant', Tenant), ('sst_exemption', SSTExemption),
+    ('lease', Lease), ('commission', Commission), ('invoice', Invoice), ('invoice_line_item', InvoiceLineItem),
+    ('late_fee_source', LateFeeSource), ('receipt', Receipt), ('property_expense', PropertyExpense),
+]
+BULK_COLUMNS = {
+    'invoice': ('id', 'tenant_id', 'lease_id', 'property_id', 'issue_date', 'due_date', 'total_amount',
+                'description', 'status'),
+    'invoice_line_item': ('id', 'invoice_id', 'lease_id', 'property_id', 'item_type', 'description', 'amount'),
+    'late_fee_source': ('id', 'line_item_id', 'source_invoice_id'),
+    'receipt': ('id', 'tenant_id', 'invoice_id', 'date_received', 'amount', 'reference'),
+    'property_expense': ('id', 'property_id', 'expense_type', 'amount', 'description', 'bill_date', 'due_date',
+                         'paid_by_company', 'payment_date', 'payment_reference', 'gl_code', 'export_status',
+                         'created_at'),
+}
+
+def month_start(base, offset):
+    """First day of the month `offset` months after base (a first-of-month date)."""
+    y, m = divmod(base.month - 1 + offset, 12)
+    return date(base.year + y, m + 1, 1)
+
+def _sql_value(value):
+    return str(value) if isinstance(value, (date, datetime)) else value
+
+class PortfolioGenerator:
+    """Simulates the portfolio unit by unit, inserting rows with explicit ids in executemany batches."""
+
+    def __init__(self, conn, units, years, projects, seed, today):
+        self.conn = conn
+        self.rng = random.Random(seed)
+        self.units = units
+        self.today = today
+        self.base = month_start(date(today.year - years, today.month, 1), 1)
+        self.months = [month_start(self.base, i) for i in range(years * 12 + 48)]
+        self.month_iso = [m.isoformat() for m in self.months]
+        self.month_names = [m.strftime('%B %Y') for m in self.months]
+        self.current = years * 12 - 1 # Index of today's month
+        self.projects = PROJECTS[:max(1, min(projects, len(PROJECTS)))]
+        self.rows = {name: [] for name, _ in TABLES}
+        self.ids = {name: count(1) for name, _ in TABLES}
+        self.counts = {name: 0 for name, _ in TABLES}
+        self.company_tenants = []
+
+    def add(self, table, **row):
+        row.setdefault('id', next(self.ids[table]))
+        self.rows[table].append(row)
+        return row
+
+    def flush(self, final=False):
+        for name, model in TABLES:
+            rows = self.rows[name]
+            if not rows or (name == 'tenant' and not final): # Tenant status depends on every later lease
+                continue
+            if name in BULK_COLUMNS:
+                self.insert(model.__table__, BULK_COLUMNS[name], rows)
+            else:
+                names = [k for k in rows[0] if not k.startswith('_')]
+                self.insert(model.__table__, names, [tuple(_sql_value(row[k]) for k in names) for row in rows])
+            self.counts[name] += len(rows)
+            self.rows[name] = []
+
+    def insert(self, table, names, rows):
+        """
+        One executemany straight on the driver: at millions of rows SQLAlchemy's
+        per-row parameter processing costs more than SQLite's own insert.
+        Scalar defaults of the columns not given go in as literals.
+        """
+        defaults = [c for c in table.c if c.name not in names and c.default is not None and c.default.is_scalar]
+        values = ['?'] * len(names) + [
+            str(literal(c.default.arg, c.type).compile(dialect=self.conn.dialect, compile_kwargs={'literal_binds': True}))
+            for c in defaults
+        ]
+        sql = (f"INSERT INTO {table.name} ({', '.join(list(names) + [c.name for c in defaults])}) "
+               f"VALUES ({', '.join(values)})")
+        self.conn.exec_driver_sql(sql, rows)
+
+    # --- Reference data ---------------------------------------------------
+
+    def add_projects_and_agents(self):
+        rng = self.rng
+        for name, code in self.projects:
+            self.add('project', name=name, description=f"{code} (synthetic)")
+        for i in range(AGENTS):
+            self.add('agent', name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} (Agent {i + 1})",
+                     company=f"{rng.choice(COMPANY_WORDS)} Realty", phone=f"01{rng.randint(10000000, 99999999)}",
+                     status='active')
+
+    def add_property(self, index):
+        rng = self.rng
+        project_id = index % len(self.projects) + 1
+        name, code = self.projects[project_id - 1]
+        kind, category, _, median_rent, median_sqft = rng.choices(PROPERTY_TYPES, [t[2] for t in PROPERTY_TYPES])[0]
+        block = chr(ord('A') + (index // len(self.projects)) % 6)
+        floor = (index // (len(self.projects) * 6)) % 12 + 1
+        unit = index // (len(self.projects) * 72) + 1
+        unit_number = f"{code}-{block}-{floor}-{unit}"
+        sqft = round(median_sqft * rng.lognormvariate(0, 0.25))
+        rent = round(median_rent * rng.lognormvariate(0, 0.3), -1)
+        return self.add(
+            'property', project_id=project_id, project=name, unit_number=unit_number, unit_key=unit_key(unit_number),
+            property_type=kind, property_category=category, status='vacant', size_sqft=sqft, target_rent=rent,
+            block=block, floor=str(floor), unit=str(unit),
+            expected_quit_rent=round(sqft * 0.12, 2), expected_assessment=round(rent * 12 * 0.04, 2),
+            expected_fire_insurance=round(sqft * 0.35, 2), expected_management_fee=round(sqft * 0.25, 2),
+            expected_sinking_fund=round(sqft * 0.025, 2)
+        )
+
+    def new_tenant(self, commercial):
+        rng = self.rng
+        tenant_id = next(self.ids['tenant'])
+        if commercial or rng.random() < 0.3:
+            name = f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_TRADES)} Sdn Bhd"
+            reg_no = str(rng.randint(200001000000, 202499999999))
+        else:
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            reg_no = None
+        registered = commercial and reg_no is not None and rng.random() < SST_REGISTERED
+        tenant = self.add(
+            'tenant', id=tenant_id, name=f"{name} #{tenant_id}", account_code=f"3060/{tenant_id:05}",
+            company_reg_no=reg_no, email=f"tenant{tenant_id}@example.com", phone=f"01{rng.randint(10000000, 99999999)}",
+            status='past', is_sst_registered=registered, charge_sst=registered,
+            sst_start_date=SST_START if registered else None,
+            sst_registration_number=f"C{rng.randint(1000000000, 9999999999)}" if registered else None,
+            city='Kota Kinabalu', state='Sabah', postcode='88000'
+        )
+        tenant['_payer'] = rng.choices([p[1] for p in PAYERS], [p[0] for p in PAYERS])[0]
+        tenant['_exempt'] = None
+        if registered and rng.random() < SST_EXEMPT:
+            start = SST_START + timedelta(days=rng.randint(0, 180))
+            end = start + timedelta(days=rng.choice([90, 180]))
+            self.add('sst_exemption', tenant_id=tenant_id, start_date=start, end_date=end,
+                     description='Exemption letter (synthetic)', created_at=datetime.combine(start, datetime.min.time()))
+            tenant['_exempt'] = (start, end)
+        if reg_no:
+            self.company_tenants.append(tenant)
+        return tenant
+
+    # --- Billing ----------------------------------------------------------
+
+    def bill_month(self, tenant, lease, month):
+        """Rent invoice (with SST where due), its payment if made by today and sometimes a late fee."""
+        rng = self.rng
+        issue = self.months[month]
+        issued = self.month_iso[month]
+        rent = lease['rent_amount']
+        invoice_id = next(self.ids['invoice'])
+        line_items = self.rows['invoice_line_item']
+        line_items.append((next(self.ids['invoice_line_item']), invoice_id, lease['id'], lease['property_id'],
+                           'Rent', lease['_line_description'], rent))
+        total = rent
+        sst_from, exempt = tenant['sst_start_date'], tenant['_exempt']
+        if sst_from and issue >= sst_from and not (exempt and exempt[0] <= issue <= exempt[1]):
+            sst = round(rent * SST_RATE, 2)
+            line_items.append((next(self.ids['invoice_line_item']), invoice_id, lease['id'], lease['property_id'],
+                               'sst', 'Service Tax (8%)', sst))
+            total = round(rent + sst, 2)
+
+        low, high, share, skip = tenant['_payer']
+        paid_on = issue + timedelta(days=rng.randint(low, high))
+        paid = 0.0
+        if paid_on <= self.today and rng.random() >= skip:
+            paid = total if share >= 1 or rng.random() < 0.5 else round(total * rng.uniform(share, 0.95), 2)
+            self.rows['receipt'].append((next(self.ids['receipt']), tenant['id'], invoice_id, paid_on.isoformat(),
+                                         paid, f"TRF-{invoice_id:07}"))
+        self.rows['invoice'].append((invoice_id, tenant['id'], lease['id'], lease['property_id'], issued, issued, total,
+                                     f"Rent for {self.month_names[month]}", 'paid' if paid >= total else 'unpaid'))
+
+        days_late = ((paid_on if paid else self.today) - issue).days
+        if days_late > (30 if paid else 60) and rng.random() < LATE_FEE_CHANCE:
+            charged_on = issue + timedelta(days=min(days_late, 45))
+            if charged_on <= self.today:
+                self.add_late_fee(tenant, invoice_id, total - paid if paid < total else total, days_late, charged_on)
+
+    def add_late_fee(self, tenant, source_invoice_id, outstanding, days_late, charged_on):
+        """Late fee invoice on its own, as billing.apply_late_fees posts them, without a lease or unit."""
+        amount = max(10.0, round(outstanding * LATE_FEE_RATE * days_late / 365.0, 2))
+        invoice_id = next(self.ids['invoice'])
+        line_item_id = next(self.ids['invoice_line_item'])
+        charged = charged_on.isoformat()
+        paid = self.rng.random() < 0.5
+        self.rows['invoice'].append((invoice_id, tenant['id'], None, None, charged, charged, amount,
+                                     f"Late Fee - {charged_on.strftime('%B %Y')}", 'paid' if paid else 'unpaid'))
+        self.rows['invoice_line_item'].append((line_item_id, invoice_id, None, None, 'late_fee',
+                                               f"8% Late Fee on Outstanding Rent (Ref: #{source_invoice_id})", amount))
+        self.rows['late_fee_source'].append((next(self.ids['late_fee_source']), line_item_id, source_invoice_id))
+        if paid:
+            self.rows['receipt'].append((next(self.ids['receipt']), tenant['id'], invoice_id,
+                                         (charged_on + timedelta(days=14)).isoformat(), amount, f"TRF-{invoice_id:07}"))
+
+    def add_expenses(self, prop):
+        """Statutory and building charges from the property's expected amounts, plus the odd repair."""
+        rng = self.rng
+        expenses = self.rows['property_expense']
+        for year in range(self.base.year, self.today.year + 1):
+            for expense_type, months, field, yearly in EXPENSES:
+                expected = prop[field] / len(months) if yearly else prop[field] * 12 / len(months)
+                label = f"{expense_type.replace('_', ' ').title()} {year}"
+                for month in months:
+                    bill_date = date(year, month, 1)
+                    if bill_date < self.base or bill_date > self.today:
+                        continue
+                    age = (self.today - bill_date).days
+                    paid = age > 30 and rng.random() < 0.97
+                    expenses.append((
+                        next(self.ids['property_expense']), prop['id'], expense_type,
+                        round(expected * rng.uniform(0.95, 1.1), 2), label, bill_date.isoformat(),
+                        (bill_date + timedelta(days=30)).isoformat(), paid,
+                        (bill_date + timedelta(days=14)).isoformat() if paid else None,
+                        f"PV-{prop['id']:05}-{year}{month:02}" if paid else None,
+                        EXPENSE_GL_CODES[expense_type], 'exported' if age > 90 else 'pending',
+                        f"{bill_date} 00:00:00.000000"
+                    ))
+        if rng.random() < 0.15:
+            bill_date = self.months[rng.randrange(self.current + 1)]
+            expenses.append((
+                next(self.ids['property_expense']), prop['id'], 'repair', round(rng.lognormvariate(6, 0.8), 2),
+                'Repair works', bill_date.isoformat(), (bill_date + timedelta(days=30)).isoformat(), True,
+                (bill_date + timedelta(days=21)).isoformat(), f"PV-R{prop['id']:05}", EXPENSE_GL_CODES['repair'],
+                'pending', f"{bill_date} 00:00:00.000000"
+            ))
+
+    # --- Tenancies --------------------------------------------------------
+
+    def add_tenancies(self, prop):
+        """
+        Lease after lease on one unit from the start of the period: renewals
+        keep the tenant at a higher rent, otherwise the unit sits vacant for a
+        few months until the next tenant (now and then an existing company).
+        """
+        rng = self.rng
+        commercial = prop['property_category'] == 'Commercial'
+        month = 0 if rng.random() < OCCUPIED_AT_START else rng.randint(1, 6)
+        tenant = None
+        rent = prop['target_rent']
+        while month <= self.current:
+            renewal = tenant is not None
+            if not renewal:
+                if commercial and self.company_tenants and rng.random() < REPEAT_TENANT_RATE:
+                    tenant = rng.choice(self.company_tenants)
+                else:
+                    tenant = self.new_tenant(commercial)
+            term = rng.choices(*LEASE_TERMS)[0]
+            start = self.months[month]
+            end = self.months[month + term] - timedelta(days=1)
+            lease = self.add('lease', tenant_id=tenant['id'], property_id=prop['id'], project=prop['project'],
+                             unit_number=prop['unit_number'], unit_key=prop['unit_key'], start_date=start,
+                             end_date=end, rent_amount=rent, security_deposit=rent * 2,
+                             utility_deposit=round(rent * 0.5, -1))
+            lease['_line_description'] = f"Monthly Rent ({prop['unit_number']})"
+            if not renewal and rng.random() < COMMISSION_CHANCE:
+                paid = (self.today - start).days > 60 and rng.random() < 0.95
+                commission_id = next(self.ids['commission'])
+                self.add('commission', id=commission_id, agent_id=min(AGENTS, int(rng.paretovariate(1.2))),
+                         lease_id=lease['id'], amount=rent, status='paid' if paid else 'pending',
+                         payment_date=start + timedelta(days=30) if paid else None,
+                         payment_reference=f"PV-C{commission_id:06}" if paid else None,
+                         created_at=datetime.combine(start, datetime.min.time()))
+
+            for m in range(month, min(month + term, self.current + 1)):
+                self.bill_month(tenant, lease, m)
+
+            if start <= self.today <= end:
+                prop['status'] = 'occupied'
+                tenant['status'] = 'active'
+            month += term
+            if rng.random() < RENEWAL_RATE:
+                rent = round(rent * RENEWAL_INCREASE, -1)
+            else:
+                tenant = None
+                month += 1 + min(int(rng.expovariate(1 / 3.0)), 12) # Vacancy gap, months
+                rent = round(prop['target_rent'] * rng.uniform(0.95, 1.15), -1)
+
+    def run(self):
+        self.add_projects_and_agents()
+        for index in range(self.units):
+            prop = self.add_property(index)
+            self.add_tenancies(prop)
+            self.add_expenses(prop)
+            if len(self.rows['invoice']) >= FLUSH_INVOICES:
+                self.flush()
+        self.flush(final=True)
+        return self.counts
+
+def generate(units=500, years=3, projects=5, seed=1, today=None, reset=False):
+    """Generates the portfolio; returns {table: rows inserted}, or None when the database already has data."""
+    today = today or date.today()
+    app = init_db(create_app(check_schema=False))
+    with app.app_context():
+        if reset:
+            tables = [t for t in db.metadata.sorted_tables if t.name not in KEPT_TABLES]
+            print(f"Dropping and recreating {len(tables)} tables...")
+            db.metadata.drop_all(db.engine, tables=tables)
+            db.metadata.create_all(db.engine, tables=tables)
+        elif db.session.query(Tenant.id).first():
+            print("Database already has tenants. Use --reset to replace everything with generated data.")
+            return None
+        db.session.remove()
+
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            # Search triggers would index row by row: the index goes with them
+            # and ensure_search_index builds it once at the end
+            triggers = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'search%'"))
+            for name in triggers.scalars().all():
+                conn.execute(text(f"DROP TRIGGER {name}"))
+            conn.execute(text("DROP TABLE IF EXISTS search_index"))
+            conn.execute(text("PRAGMA synchronous = OFF"))
+            conn.execute(text("PRAGMA cache_size = -262144")) # 256 MB: index pages stay in memory during the load
+
+            counts = PortfolioGenerator(conn, units, years, projects, seed, today).run()
+            print(f"Inserted {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
+
+            refresh_latest_lease_end(connection=conn)
+            refresh_effective_status(connection=conn, today=today)
+            refresh_lease_summaries(conn.execute(select(Tenant.id)).scalars().all(), conn)
+
+        ensure_search_index()
+        with db.engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+
+        for table, rows in counts.items():
+            print(f"  {table}: {rows:,}")
+        print(f"Done in {time.perf_counter() - started:.1f}s.")
+        return counts
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM-DD date: {value!r}")
+
+def _parser():
+    parser = argparse.ArgumentParser(allow_abbrev=False,
+        description="Fills the database named by DATABASE_URL with a synthetic portfolio for load and scale testing."
+    )
+    parser.add_argument('--units', type=int, default=500, help="number of units (default 500)")
+    parser.add_argument('--years', type=int, default=3, help="years of lease and billing history (default 3)")
+    parser.add_argument('--projects', type=int, default=5, help=f"number of projects, at most {len(PROJECTS)} (default 5)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed (default 1)")
+    parser.add_argument('--today', type=_date, default=None, help="date the history ends, YYYY-MM-DD (default today)")
+    parser.add_argument('--reset', action='store_true', help="wipe all data but the logins and MyInvois settings first")
+    return parser
+
+if __name__ == '__main__':
+    options = _parser().parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit("DATABASE_URL is not set. Point it at a scratch database, e.g. "
+                 "DATABASE_URL=sqlite:///synthetic.db, so the app's own database is left alone.")
+    generate(
+        units=options.units,
+        years=options.years,
+        projects=options.projects,
+        seed=options.seed,
+        today=options.today,
+        reset=options.reset
+    )
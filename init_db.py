@@ -0,0 +1,94 @@
+import importlib
+
+from app import create_app
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+from utils_search import ensure_search_index
+from utils_rent_roll import backfill_occupancy_snapshots
+
+# Creates missing tables, runs pending migrations, builds the search index,
+# fills missing occupancy month starts and the default admin login:
+#
+#   python init_db.py
+#
+# Run it once on a new database and again after every update (new tables,
+# columns and search triggers are only created here, not on server start).
+# Existing tables and data are left alone.
+
+# Schema changes since the first release, in the order they must run: later
+# backfills load rows through the models, so every column they map has to
+# exist first. Each runs on an existing database when one of its markers
+# (a table, 'table.column' or an index name) is missing.
+MIGRATIONS = [
+    ('migrate_lease_timeline', ['tenant.latest_lease_end', 'ix_lease_tenant_end_date']),
+    ('migrate_tenant_effective_status', ['tenant.effective_status', 'ix_tenant_effective_status']),
+    ('migrate_unit_keys', ['property.unit_key', 'lease.unit_key', 'ix_property_unit_key', 'ix_lease_unit_key']),
+    ('migrate_invoice_lease_links', ['invoice.lease_id', 'invoice.property_id', 'invoice_line_item.lease_id',
+                                     'invoice_line_item.property_id', 'ix_invoice_lease_id']),
+    ('migrate_late_fee_source', ['late_fee_source']),
+    ('migrate_lease_ledger_summary', ['lease_ledger_summary']),
+    ('migrate_statement_indexes', ['ix_invoice_tenant_issue_date', 'ix_receipt_tenant_date_received']),
+    ('migrate_commission_indexes', ['ix_commission_agent_status', 'ix_commission_status_created_at']),
+]
+
+def migration_for(table, column=None):
+    """The migrate script (without .py) that adds a table or column, or None."""
+    marker = f"{table}.{column}" if column else table
+    return next((script for script, markers in MIGRATIONS if marker in markers), None)
+
+def _schema_names(inspector):
+    """Every table, 'table.column' and index name in the database."""
+    names = set()
+    for table in inspector.get_table_names():
+        names.add(table)
+        names.update(f"{table}.{c['name']}" for c in inspector.get_columns(table))
+        names.update(i['name'] for i in inspector.get_indexes(table))
+    return names
+
+def pending_migrations(names):
+    """Scripts from MIGRATIONS with a missing marker, given the names of an existing database."""
+    pending = []
+    for script, markers in MIGRATIONS:
+        for marker in markers:
+            table = marker.split('.')[0]
+            if marker in names:
+                continue
+            # A column of a table create_all() is about to build comes with it
+            if '.' in marker and table not in names:
+                continue
+            pending.append(script)
+            break
+    return pending
+
+def init_db(app=None):
+    app = app or create_app(check_schema=False)
+    with app.app_context():
+        names = _schema_names(db.inspect(db.engine))
+        pending = pending_migrations(names) if names else [] # A new database needs none
+        db.create_all()
+    for script in pending:
+        print(f"Running {script}.py...")
+        importlib.import_module(script).migrate()
+    with app.app_context():
+        if ensure_search_index():
+            print("Built search index.")
+        # The dashboard only reads snapshots; the nightly job keeps them filled after this
+        filled = backfill_occupancy_snapshots(24)
+        if filled:
+            print(f"Rebuilt {len(filled)} occupancy month starts from lease history.")
+        # Seed Admin User
+        if not User.query.filter_by(username='admin').first():
+            admin = User(
+                username='admin',
+                password_hash=generate_password_hash('admin123'),
+                role='admin'
+            )
+            db.session.add(admin)
+            db.session.commit()
+            print("Created default admin user.")
+    return app
+
+if __name__ == '__main__':
+    init_db()
+    print("Database ready.")
@@ -0,0 +1,239 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+# HTTP load test against a running server (start it on a generated portfolio,
+# see generate_portfolio.py):
+#
+#   python load_test.py [--url http://localhost:8080] [--users 10] [--accounts 3] [--duration 60]
+#                       [--think 1.0] [--user admin] [--password admin123] [--compare FILE]
+#
+# Each virtual user is a thread with its own login session working through a
+# coordinator or accounts routine with think time between steps. Latency
+# percentiles and error rates per endpoint are printed and saved to
+# load_test_results/ for comparison between releases (--compare a saved file).
+# The accounts routine records real (small) payments: never run it on live data.
+
+RESULTS_DIR = 'load_test_results'
+KEYSTROKE_DELAY = 0.15 # Seconds between search-as-you-type requests
+PAYMENT_AMOUNT = 1.0
+SAMPLE_SIZE = 200 # Tenant names, projects and unpaid invoices drawn from the database
+
+COORDINATOR = 'coordinator'
+ACCOUNTS = 'accounts'
+
+class Stats:
+    """Latencies and errors per endpoint name, shared by every user thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        """{endpoint: {'requests', 'errors', 'error_rate', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}}"""
+        with self.lock:
+            items = {name: sorted(values) for name, values in self.latencies.items()}
+            errors = dict(self.errors)
+        summary = {}
+        for name, values in sorted(items.items()):
+            count = len(values)
+            summary[name] = {
+                'requests': count,
+                'errors': errors.get(name, 0),
+                'error_rate': round(errors.get(name, 0) / count, 4),
+                'rps': round(count / elapsed, 2),
+                'p50_ms': round(percentile(values, 50) * 1000, 1),
+                'p95_ms': round(percentile(values, 95) * 1000, 1),
+                'p99_ms': round(percentile(values, 99) * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1),
+            }
+        return summary
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+class VirtualUser(threading.Thread):
+    def __init__(self, number, role, options, sample, stats, deadline):
+        super().__init__(daemon=True)
+        import requests
+        self.number = number
+        self.role = role
+        self.options = options
+        self.sample = sample
+        self.stats = stats
+        self.deadline = deadline
+        self.rng = random.Random(number)
+        self.session = requests.Session()
+
+    def request(self, name, method, path, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, self.options['url'] + path, allow_redirects=False,
+                                            timeout=self.options['timeout'], **kwargs)
+            # A redirect to the login page means the session was lost
+            ok = response.status_code < 400 and '/login' not in response.headers.get('Location', '')
+        except Exception:
+            response = None
+        self.stats.record(name, time.perf_counter() - started, ok)
+        return response
+
+    def login(self):
+        response = self.request('auth.login', 'POST', '/login',
+                                data={'username': self.options['user'], 'password': self.options['password']})
+        return response is not None and response.status_code == 302
+
+    def think(self):
+        time.sleep(self.rng.uniform(0.5, 1.5) * self.options['think'])
+
+    # --- Coordinator steps ----------------------------------------------
+
+    def search_as_you_type(self):
+        word = self.rng.choice(self.sample['words'])
+        for end in range(3, len(word) + 1):
+            self.request('search.suggest', 'GET', '/search/suggest', params={'q': word[:end]})
+            time.sleep(KEYSTROKE_DELAY)
+
+    def filter_properties(self):
+        self.request('properties.dashboard', 'GET', '/properties/')
+        self.think()
+        params = {'project': self.rng.choice(self.sample['projects']), 'status': self.rng.choice(['vacant', 'occupied'])}
+        self.request('properties.dashboard (filtered)', 'GET', '/properties/', params=params)
+
+    def search_tenants(self):
+        self.request('tenants.list_tenants (search)', 'GET', '/tenants/', params={'search': self.rng.choice(self.sample['words'])})
+
+    # --- Accounts steps -------------------------------------------------
+
+    def list_invoices(self):
+        self.request('billing.list_invoices (unpaid)', 'GET', '/billing/invoices', params={'status': 'unpaid'})
+
+    def record_payment(self):
+        invoice_id = self.rng.choice(self.sample['invoices'])
+        self.request('billing.receive_payment', 'POST', '/billing/receive_payment',
+                     json={'invoice_id': invoice_id, 'amount': PAYMENT_AMOUNT, 'reference': f"LOADTEST-{self.number}"})
+
+    def dashboard_metrics(self):
+        self.request('dashboard.dashboard_metrics', 'GET', '/api/dashboard/metrics')
+
+    def routine(self):
+        if self.role == COORDINATOR:
+            return [(5, self.search_as_you_type), (3, self.filter_properties), (2, self.search_tenants)]
+        return [(3, self.list_invoices), (4, self.record_payment), (2, self.dashboard_metrics), (1, self.search_as_you_type)]
+
+    def run(self):
+        if not self.login():
+            return
+        steps = self.routine()
+        weights = [w for w, _ in steps]
+        while time.monotonic() < self.deadline:
+            self.rng.choices(steps, weights)[0][1]()
+            self.think()
+
+def load_sample():
+    """Search words, project names and unpaid invoice ids from the database the server uses (DATABASE_URL)."""
+    from app import create_app
+    from models import db, Tenant, Project, Invoice
+
+    app = create_app()
+    with app.app_context():
+        names = [n for (n,) in db.session.query(Tenant.name).order_by(Tenant.id).limit(SAMPLE_SIZE)]
+        words = sorted({w.strip('#,.').lower() for n in names for w in (n or '').split() if len(w.strip('#,.')) >= 4})
+        projects = [p for (p,) in db.session.query(Project.name).order_by(Project.id)]
+        invoices = [i for (i,) in db.session.query(Invoice.id).filter(Invoice.status == 'unpaid')
+                    .order_by(Invoice.id.desc()).limit(SAMPLE_SIZE)]
+    if not (words and projects and invoices):
+        raise SystemExit("The database has no tenants, projects or unpaid invoices; run generate_portfolio.py first.")
+    return {'words': words, 'projects': projects, 'invoices': invoices}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def print_summary(summary, previous=None):
+    print(f"{'Endpoint':<36} {'Reqs':>6} {'Err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, row in summary.items():
+        line = (f"{name:<36} {row['requests']:>6} {row['error_rate'] * 100:>5.1f}% "
+                f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}")
+        before = (previous or {}).get(name)
+        if before and before['p95_ms']:
+            line += f"   p95 {(row['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}% vs {before['p95_ms']:.1f}"
+        print(line)
+
+def run(url, users=10, accounts=3, duration=60, think=1.0, user='admin', password='admin123', timeout=60, compare=None):
+    sample = load_sample()
+    options = {'url': url.rstrip('/'), 'think': think, 'user': user, 'password': password, 'timeout': timeout}
+    stats = Stats()
+    deadline = time.monotonic() + duration
+    threads = [
+        VirtualUser(i, ACCOUNTS if i < accounts else COORDINATOR, options, sample, stats, deadline)
+        for i in range(users)
+    ]
+    print(f"{users} users ({accounts} accounts, {users - accounts} coordinators) for {duration}s against {url}...")
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+        time.sleep(min(1.0, duration / max(users, 1) / 4)) # Staggered logins
+    for thread in threads:
+        thread.join(timeout=max(0, deadline - time.monotonic()) + timeout)
+    elapsed = time.monotonic() - started
+
+    summary = stats.summary(elapsed)
+    previous = None
+    if compare:
+        with open(compare) as f:
+            previous = json.load(f)['endpoints']
+    print_summary(summary, previous)
+    total = sum(r['requests'] for r in summary.values())
+    errors = sum(r['errors'] for r in summary.values())
+    print(f"{total} requests in {elapsed:.0f}s ({total / elapsed:.1f}/s), {errors} errors")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w') as f:
+        json.dump({
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'options': {'url': url, 'users': users, 'accounts': accounts, 'duration': duration, 'think': think},
+            'elapsed': round(elapsed, 1),
+            'endpoints': summary,
+        }, f, indent=2)
+    print(f"Results saved to {path}")
+    return summary
+
+def _option(args, name, default, cast=str):
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    run(
+        url=_option(args, '--url', 'http://localhost:8080'),
+        users=_option(args, '--users', 10, int),
+        accounts=_option(args, '--accounts', 3, int),
+        duration=_option(args, '--duration', 60, int),
+        think=_option(args, '--think', 1.0, float),
+        user=_option(args, '--user', 'admin'),
+        password=_option(args, '--password', 'admin123'),
+        compare=_option(args, '--compare', None)
+    )
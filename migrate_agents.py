@@ -2,7 +2,7 @@ from app import create_app, db
 from models import Agent, Commission
 import sqlalchemy
 
-app = create_app()
+app = create_app(check_schema=False)
 
 def migrate():
     with app.app_context():
@@ -2,7 +2,7 @@ from app import create_app, db
 from models import AuditLog
 from sqlalchemy import text
 
-app = create_app()
+app = create_app(check_schema=False)
 
 with app.app_context():
     print("Migrating Database: Creating AuditLog table...")
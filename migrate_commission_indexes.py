@@ -0,0 +1,25 @@
+from app import create_app, db
+from sqlalchemy import text
+
+# db.create_all() only builds indexes for new tables, so existing databases need these added
+INDEXES = [
+    ('ix_commission_agent_status', 'commission', 'agent_id, status'),
+    ('ix_commission_status_created_at', 'commission', 'status, created_at'),
+]
+
+def migrate():
+    app = create_app(check_schema=False)
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for name, table, columns in INDEXES:
+                print(f"Creating index {name} on {table}({columns})...")
+                try:
+                    conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+                    print(f"Index {name} ready.")
+                except Exception as e:
+                    print(f"Error creating {name}: {str(e)}")
+            conn.execute(text('ANALYZE'))
+            conn.commit()
+
+if __name__ == '__main__':
+    migrate()
@@ -2,7 +2,7 @@ from app import create_app, db
 from sqlalchemy import text
 
 def migrate():
-    app = create_app()
+    app = create_app(check_schema=False)
     with app.app_context():
         # Get existing columns to avoid duplicate errors
         inspector = db.inspect(db.engine)
@@ -0,0 +1,58 @@
+from app import create_app, db
+from sqlalchemy import text
+from utils_revenue import link_invoices_to_leases
+
+NEW_COLUMNS = {
+    'invoice': [
+        ('lease_id', 'INTEGER REFERENCES lease(id)'),
+        ('property_id', 'INTEGER REFERENCES property(id)')
+    ],
+    'invoice_line_item': [
+        ('lease_id', 'INTEGER REFERENCES lease(id)'),
+        ('property_id', 'INTEGER REFERENCES property(id)')
+    ]
+}
+
+INDEXES = [
+    ('ix_invoice_lease_id', 'invoice', 'lease_id'),
+    ('ix_invoice_property_issue_date', 'invoice', 'property_id, issue_date'),
+    ('ix_invoice_line_item_invoice_id', 'invoice_line_item', 'invoice_id'),
+    ('ix_invoice_line_item_property_type', 'invoice_line_item', 'property_id, item_type'),
+]
+
+def migrate():
+    app = create_app(check_schema=False)
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        
+        with db.engine.connect() as conn:
+            for table, new_columns in NEW_COLUMNS.items():
+                columns = [c['name'] for c in inspector.get_columns(table)]
+                for col_name, col_type in new_columns:
+                    if col_name not in columns:
+                        print(f"Adding column {table}.{col_name}...")
+                        try:
+                            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {col_name} {col_type}'))
+                            print(f"Successfully added {col_name}")
+                        except Exception as e:
+                            print(f"Error adding {col_name}: {str(e)}")
+                    else:
+                        print(f"Column {table}.{col_name} already exists.")
+            
+            for name, table, columns in INDEXES:
+                print(f"Creating index {name} on {table}({columns})...")
+                conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+            conn.commit()
+        
+        # Backfill from "Monthly Rent (unit)" descriptions and chargeback links
+        print("Linking existing invoices to leases...")
+        counts = link_invoices_to_leases()
+        db.session.commit()
+        print(f"Linked {counts['invoices']} invoices and {counts['line_items']} line items. "
+              f"{counts['unmatched']} invoices could not be matched to a unit.")
+        
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,41 @@
+import re
+from app import create_app, db
+from models import InvoiceLineItem, LateFeeSource
+from sqlalchemy import text
+
+# Late fee lines written before the link table carry their sources as "(Ref: #12,13)"
+REF_PATTERN = re.compile(r'Ref:\s*#([\d,\s]+)')
+
+def migrate():
+    app = create_app(check_schema=False)
+    with app.app_context():
+        print("Migrating Database: Creating late_fee_source table...")
+        db.create_all()
+
+        result = db.session.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='late_fee_source';"))
+        if not result.fetchone():
+            print("Error: Table not created.")
+            return
+
+        # Backfill from the description convention, skipping lines already linked
+        linked = {row[0] for row in db.session.query(LateFeeSource.line_item_id).distinct()}
+        fee_lines = db.session.query(InvoiceLineItem.id, InvoiceLineItem.description)\
+            .filter(InvoiceLineItem.item_type == 'late_fee').all()
+
+        links = []
+        for line_id, description in fee_lines:
+            if line_id in linked or not description:
+                continue
+            match = REF_PATTERN.search(description)
+            if not match:
+                continue
+            for inv_id in {int(x) for x in match.group(1).replace(' ', '').split(',') if x}:
+                links.append({'line_item_id': line_id, 'source_invoice_id': inv_id})
+
+        if links:
+            db.session.execute(LateFeeSource.__table__.insert(), links)
+        db.session.commit()
+        print(f"Backfilled {len(links)} late fee source links from {len(fee_lines)} late fee lines.")
+
+if __name__ == '__main__':
+    migrate()
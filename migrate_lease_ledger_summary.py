@@ -0,0 +1,24 @@
+from app import create_app, db
+from models import Tenant
+from sqlalchemy import text
+from utils_lease_ledger import refresh_lease_summaries
+
+def migrate():
+    app = create_app(check_schema=False)
+    with app.app_context():
+        print("Migrating Database: Creating lease_ledger_summary table...")
+        db.create_all()
+
+        result = db.session.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='lease_ledger_summary';"))
+        if not result.fetchone():
+            print("Error: Table not created.")
+            return
+
+        # Full rebuild; afterwards invoice/receipt/lease changes keep it current
+        tenant_ids = [row[0] for row in db.session.query(Tenant.id)]
+        refresh_lease_summaries(tenant_ids)
+        db.session.commit()
+        print(f"Summarised leases for {len(tenant_ids)} tenants.")
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,42 @@
+from app import create_app, db
+from sqlalchemy import text
+from utils_lease_timeline import refresh_latest_lease_end
+
+INDEXES = [
+    ('ix_lease_end_date', 'lease', 'end_date'),
+    ('ix_lease_tenant_end_date', 'lease', 'tenant_id, end_date'),
+    ('ix_tenant_status_latest_lease_end', 'tenant', 'status, latest_lease_end'),
+]
+
+def migrate():
+    app = create_app(check_schema=False)
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        columns = [c['name'] for c in inspector.get_columns('tenant')]
+        
+        with db.engine.connect() as conn:
+            if 'latest_lease_end' not in columns:
+                print("Adding column latest_lease_end...")
+                try:
+                    conn.execute(text('ALTER TABLE tenant ADD COLUMN latest_lease_end DATE'))
+                    print("Successfully added latest_lease_end")
+                except Exception as e:
+                    print(f"Error adding latest_lease_end: {str(e)}")
+            else:
+                print("Column latest_lease_end already exists.")
+            
+            for name, table, cols in INDEXES:
+                print(f"Creating index {name} on {table}({cols})...")
+                conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})'))
+            conn.commit()
+        
+        print("Backfilling latest lease end per tenant...")
+        refresh_latest_lease_end()
+        db.session.commit()
+        
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        print("Done.")
+
+if __name__ == '__main__':
+    migrate()
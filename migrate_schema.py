@@ -3,7 +3,7 @@ from app import create_app, db
 from sqlalchemy import text
 
 def run_migration():
-    app = create_app()
+    app = create_app(check_schema=False)
     with app.app_context():
         print("Migrating Schema...")
         try:
@@ -0,0 +1,24 @@
+from app import create_app, db
+from sqlalchemy import text
+from utils_search import SEARCH_DDL, rebuild_search_index
+
+def migrate():
+    app = create_app(check_schema=False)
+    with app.app_context():
+        # init_db.py already creates the index if it is missing; this also
+        # rebuilds an existing one (e.g. after rows were changed with triggers off)
+        with db.engine.connect() as conn:
+            print("Creating search index, document views and triggers...")
+            for statement in SEARCH_DDL:
+                conn.execute(text(statement))
+            conn.commit()
+        
+        print("Rebuilding search index...")
+        count = rebuild_search_index()
+        db.session.execute(text("INSERT INTO search_index(search_index) VALUES ('optimize')"))
+        db.session.commit()
+        print(f"Indexed {count} documents.")
+        print("Done.")
+
+if __name__ == '__main__':
+    migrate()
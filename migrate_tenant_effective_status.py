@@ -0,0 +1,31 @@
+from app import create_app, db
+from sqlalchemy import text
+from utils_tenant_lifecycle import run_tenant_lifecycle
+
+def migrate():
+    app = create_app(check_schema=False)
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        columns = [c['name'] for c in inspector.get_columns('tenant')]
+        
+        with db.engine.connect() as conn:
+            if 'effective_status' not in columns:
+                print("Adding column effective_status...")
+                try:
+                    conn.execute(text('ALTER TABLE tenant ADD COLUMN effective_status VARCHAR(20)'))
+                    print("Successfully added effective_status")
+                except Exception as e:
+                    print(f"Error adding effective_status: {str(e)}")
+            else:
+                print("Column effective_status already exists.")
+            
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_tenant_effective_status ON tenant (effective_status)'))
+            conn.commit()
+        
+        # Requires latest_lease_end (migrate_lease_timeline.py)
+        print("Running tenant lifecycle to fill effective_status...")
+        result = run_tenant_lifecycle()
+        print(f"Filled {result['initialised']} tenants; {result['effective_changes']} status changes recorded in the audit log.")
+
+if __name__ == '__main__':
+    migrate()
@@ -3,7 +3,7 @@ from app import create_app, db
 from models import Property
 
 def migrate_data():
-    app = create_app()
+    app = create_app(check_schema=False)
     with app.app_context():
         properties = Property.query.all()
         print(f"Migrating {len(properties)} properties...")
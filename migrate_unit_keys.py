@@ -0,0 +1,54 @@
+from app import create_app, db
+from sqlalchemy import text
+from utils_units import backfill_unit_keys, relink_leases
+
+NEW_COLUMNS = {
+    'property': 'unit_key VARCHAR(50)',
+    'lease': 'unit_key VARCHAR(50)',
+}
+
+def migrate():
+    app = create_app(check_schema=False)
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        
+        with db.engine.connect() as conn:
+            for table, column_def in NEW_COLUMNS.items():
+                columns = [c['name'] for c in inspector.get_columns(table)]
+                if 'unit_key' not in columns:
+                    print(f"Adding column {table}.unit_key...")
+                    try:
+                        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column_def}'))
+                        print(f"Successfully added {table}.unit_key")
+                    except Exception as e:
+                        print(f"Error adding {table}.unit_key: {str(e)}")
+                else:
+                    print(f"Column {table}.unit_key already exists.")
+            conn.commit()
+        
+        print("Backfilling unit keys...")
+        collisions = backfill_unit_keys()
+        db.session.commit()
+        for prop_id, unit_number, key in collisions:
+            print(f"  SHARED KEY: Property {prop_id} '{unit_number}' normalizes to {key} like another unit - matched on exact unit number only")
+        
+        with db.engine.connect() as conn:
+            # Earlier versions made this index unique, which rejected distinct units sharing a key
+            conn.execute(text('DROP INDEX IF EXISTS ux_property_unit_key'))
+            print("Creating index ix_property_unit_key on property(unit_key)...")
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_property_unit_key ON property (unit_key)'))
+            print("Creating index ix_lease_unit_key on lease(unit_key)...")
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_lease_unit_key ON lease (unit_key)'))
+            conn.commit()
+        
+        print("Relinking leases without a property...")
+        linked = relink_leases()
+        db.session.commit()
+        print(f"Linked {linked} leases.")
+        
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        print("Done.")
+
+if __name__ == '__main__':
+    migrate()
@@ -35,6 +35,10 @@ class AuditLog(db.Model):
     user = db.relationship('User', backref=db.backref('audit_logs', lazy=True))
 
 class Tenant(db.Model):
+    __table_args__ = (
+        db.Index('ix_tenant_status_latest_lease_end', 'status', 'latest_lease_end'), # Active / lapsed filters
+        db.Index('ix_tenant_effective_status', 'effective_status'), # Tenant list tabs / counts
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     account_code = db.Column(db.String(50)) # Added from Rental Source
@@ -43,6 +47,8 @@ class Tenant(db.Model):
     email = db.Column(db.String(100))
     phone = db.Column(db.String(20))
     status = db.Column(db.String(20), default='active') # active, past, evicted
+    latest_lease_end = db.Column(db.Date) # MAX(lease.end_date), kept current by utils_lease_timeline
+    effective_status = db.Column(db.String(20)) # status as of today: active, lapsed, prospective, past (utils_tenant_lifecycle)
 
     # E-Invoice / Company Details
     is_sst_registered = db.Column(db.Boolean, default=False)
@@ -85,6 +91,8 @@ class Tenant(db.Model):
     def has_active_lease(self):
         """Check if tenant has at least one active lease (end_date >= today)"""
         from datetime import date
+        if self.latest_lease_end is not None:
+            return self.latest_lease_end >= date.today()
         if not self.leases:
             return False
         return any(lease.end_date >= date.today() for lease in self.leases)
@@ -116,6 +124,25 @@ class TenantNote(db.Model):
     note = db.Column(db.Text)
     attachment = db.Column(db.String(200)) # Path to uploaded file
 
+class TenantDuplicate(db.Model):
+    """Candidate duplicate tenant pair in the review queue (found by utils_dedup.refresh_duplicate_queue)"""
+    __tablename__ = 'tenant_duplicate'
+    __table_args__ = (
+        db.UniqueConstraint('tenant_id', 'duplicate_id', name='uq_tenant_duplicate_pair'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenant.id'), nullable=False) # Lower id of the pair
+    duplicate_id = db.Column(db.Integer, db.ForeignKey('tenant.id'), nullable=False, index=True)
+    score = db.Column(db.Float, default=0.0) # 0-1, higher is more likely the same tenant
+    reasons = db.Column(db.String(200)) # e.g. "same TIN, name 92% similar"
+    status = db.Column(db.String(20), default='pending', index=True) # pending, dismissed
+    reviewed_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    reviewed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    tenant = db.relationship('Tenant', foreign_keys=[tenant_id])
+    duplicate = db.relationship('Tenant', foreign_keys=[duplicate_id])
+
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
@@ -123,6 +150,9 @@ class Project(db.Model):
     properties = db.relationship('Property', backref='project_rel', lazy=True)
 
 class Property(db.Model):
+    __table_args__ = (
+        db.Index('ix_property_unit_key', 'unit_key'), # Not unique: G-11-Lot 23 and A-2-Lot 23 share a key
+    )
     id = db.Column(db.Integer, primary_key=True)
     
     # Linked Project (Optional for legacy support but encouraged)
@@ -131,6 +161,7 @@ class Property(db.Model):
     project = db.Column(db.String(50)) 
     
     unit_number = db.Column(db.String(50), unique=True, nullable=False)
+    unit_key = db.Column(db.String(50)) # Normalized unit_number, kept current by utils_units
     property_type = db.Column(db.String(50)) # e.g. Shop, Apartment
     status = db.Column(db.String(20), default='vacant') # vacant, occupied, maintenance
     
@@ -174,12 +205,18 @@ class Property(db.Model):
     leases = db.relationship('Lease', backref='property_obj', lazy=True)
 
 class Lease(db.Model):
+    __table_args__ = (
+        db.Index('ix_lease_end_date', 'end_date'), # Expiry forecast
+        db.Index('ix_lease_tenant_end_date', 'tenant_id', 'end_date'), # Latest lease end per tenant
+        db.Index('ix_lease_unit_key', 'unit_key'), # Relinking leases to properties
+    )
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('tenant.id'), nullable=False)
     property_id = db.Column(db.Integer, db.ForeignKey('property.id')) # Link to Property Inventory
     
     project = db.Column(db.String(50)) # Added for better filtering
     unit_number = db.Column(db.String(50), nullable=False)
+    unit_key = db.Column(db.String(50)) # Normalized unit_number, kept current by utils_units
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     rent_amount = db.Column(db.Float, nullable=False)
@@ -222,9 +259,17 @@ class MyInvoisConfig(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Invoice(db.Model):
+    __table_args__ = (
+        db.Index('ix_invoice_tenant_issue_date', 'tenant_id', 'issue_date'), # Statements / opening balances
+        db.Index('ix_invoice_lease_id', 'lease_id'),
+        db.Index('ix_invoice_property_issue_date', 'property_id', 'issue_date'), # Per-unit revenue
+    )
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('tenant.id'), nullable=False)
     tenant = db.relationship('Tenant', backref=db.backref('invoices', lazy=True))
+    # Lease / unit billed (null for tenant-level charges and unmatched legacy invoices)
+    lease_id = db.Column(db.Integer, db.ForeignKey('lease.id'))
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'))
     issue_date = db.Column(db.Date, default=datetime.utcnow)
     due_date = db.Column(db.Date, nullable=False)
     total_amount = db.Column(db.Float, default=0.0) # Sum of line items
@@ -244,13 +289,31 @@ class Invoice(db.Model):
     line_items = db.relationship('InvoiceLineItem', backref='invoice', lazy=True, cascade="all, delete-orphan")
 
 class InvoiceLineItem(db.Model):
+    __table_args__ = (
+        db.Index('ix_invoice_line_item_invoice_id', 'invoice_id'),
+        db.Index('ix_invoice_line_item_property_type', 'property_id', 'item_type'), # Revenue by unit / block / floor
+    )
     id = db.Column(db.Integer, primary_key=True)
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
+    lease_id = db.Column(db.Integer, db.ForeignKey('lease.id'))
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'))
     item_type = db.Column(db.String(50), nullable=False) # rent, water, electricity, late_fee, etc
     description = db.Column(db.String(200))
     amount = db.Column(db.Float, nullable=False)
+    
+    late_fee_sources = db.relationship('LateFeeSource', backref='line_item', lazy=True, cascade="all, delete-orphan")
+
+class LateFeeSource(db.Model):
+    """Links a late fee line item to each overdue invoice it was charged on (dedup for late fee runs)"""
+    __tablename__ = 'late_fee_source'
+    id = db.Column(db.Integer, primary_key=True)
+    line_item_id = db.Column(db.Integer, db.ForeignKey('invoice_line_item.id'), nullable=False, index=True)
+    source_invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False, index=True)
 
 class Receipt(db.Model):
+    __table_args__ = (
+        db.Index('ix_receipt_tenant_date_received', 'tenant_id', 'date_received'), # Statements / opening balances
+    )
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('tenant.id'), nullable=False)
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id')) # Optional: generic payment or specific invoice
@@ -272,6 +335,10 @@ class Agent(db.Model):
     commissions = db.relationship('Commission', backref='agent', lazy=True)
 
 class Commission(db.Model):
+    __table_args__ = (
+        db.Index('ix_commission_agent_status', 'agent_id', 'status'), # Per-agent totals
+        db.Index('ix_commission_status_created_at', 'status', 'created_at'), # Commission dashboard pages
+    )
     id = db.Column(db.Integer, primary_key=True)
     agent_id = db.Column(db.Integer, db.ForeignKey('agent.id'), nullable=False)
     lease_id = db.Column(db.Integer, db.ForeignKey('lease.id'), nullable=False)
@@ -321,3 +388,83 @@ class PropertyExpense(db.Model):
     # Relationships
     property = db.relationship('Property', backref=db.backref('expenses', lazy=True, cascade="all, delete-orphan"))
     tenant_invoice = db.relationship('Invoice', backref=db.backref('property_expenses', lazy=True))
+
+class LeaseLedgerSummary(db.Model):
+    """Invoiced / paid totals attributed to each lease (kept current by utils_lease_ledger)"""
+    __tablename__ = 'lease_ledger_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    lease_id = db.Column(db.Integer, db.ForeignKey('lease.id'), nullable=False, unique=True)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenant.id'), nullable=False, index=True)
+    invoiced = db.Column(db.Float, default=0.0)
+    paid = db.Column(db.Float, default=0.0)
+    invoice_count = db.Column(db.Integer, default=0)
+    receipt_count = db.Column(db.Integer, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ExpenseBudgetRollup(db.Model):
+    """Monthly expected vs actual property cost per GL code (rebuilt by utils_budget.refresh_budget_rollups)"""
+    __tablename__ = 'expense_budget_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('month', 'property_id', 'gl_code', name='uq_budget_rollup_month_property_gl'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False, index=True) # First day of the month
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=False, index=True)
+    gl_code = db.Column(db.String(50), nullable=False)
+    expected = db.Column(db.Float, default=0.0)
+    actual = db.Column(db.Float, default=0.0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OccupancySnapshot(db.Model):
+    """Daily rent roll totals per project (taken nightly by utils_rent_roll.take_occupancy_snapshot)"""
+    __tablename__ = 'occupancy_snapshot'
+    __table_args__ = (
+        db.UniqueConstraint('snapshot_date', 'project', name='uq_occupancy_snapshot_date_project'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, nullable=False, index=True)
+    project = db.Column(db.String(100), nullable=False) # Project name or 'Unassigned'
+    total_units = db.Column(db.Integer, default=0) # Unarchived units on the date
+    occupied_units = db.Column(db.Integer, default=0)
+    contracted_rent = db.Column(db.Float, default=0.0) # Monthly rent of leases running on the date
+    asking_rent = db.Column(db.Float, default=0.0) # Target rent of vacant units
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    """Background job (bulk printing, exports) polled by the UI for progress"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False) # e.g. 'documents'
+    description = db.Column(db.String(200))
+    status = db.Column(db.String(20), default='queued', index=True) # queued, running, done, failed
+
+    # Progress
+    total = db.Column(db.Integer, default=0)
+    completed = db.Column(db.Integer, default=0)
+
+    # Output
+    result_path = db.Column(db.String(300)) # File under instance/exports
+    error = db.Column(db.Text)
+
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def percent(self):
+        if not self.total:
+            return 100 if self.status == 'done' else 0
+        return int(self.completed * 100 / self.total)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'description': self.description,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'percent': self.percent,
+            'error': self.error,
+            'has_result': bool(self.result_path)
+        }
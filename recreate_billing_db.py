@@ -1,7 +1,7 @@
 from app import create_app
 from models import db, Invoice, InvoiceLineItem
 
-app = create_app()
+app = create_app(check_schema=False)
 
 with app.app_context():
     # Drop existing tables
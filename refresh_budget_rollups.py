@@ -0,0 +1,16 @@
+from app import create_app
+from datetime import date
+import sys
+
+from utils_budget import refresh_budget_rollups
+
+def refresh(year=None):
+    """Rebuilds the expected-vs-actual monthly rollups for a year (default: current year). Safe to run nightly."""
+    app = create_app()
+    with app.app_context():
+        year = year or date.today().year
+        count = refresh_budget_rollups(date(year, 1, 1), date(year, 12, 1))
+        print(f"Refreshed budget rollups for {year}: {count} rows.")
+
+if __name__ == '__main__':
+    refresh(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -1,21 +1,23 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
-from models import db, Agent, Commission
-from flask_login import login_required
-from datetime import datetime
+from models import db, Agent, Commission, Lease
+from flask_login import login_required, current_user
+from datetime import datetime, date
+from sqlalchemy.orm import joinedload
 from utils import log_audit
+from utils_commissions import get_agent_totals, get_commission_totals, filter_commissions, pay_commissions
 
 agents_bp = Blueprint('agents', __name__, url_prefix='/agents')
 
+COMMISSION_PAGE_SIZE = 100
+
 @agents_bp.route('/')
 @login_required
 def list_agents():
     agents = Agent.query.order_by(Agent.name).all()
-    # Calculate stats per agent
-    for agent in agents:
-        agent.total_commissions = sum(c.amount for c in agent.commissions)
-        agent.pending_commissions = sum(c.amount for c in agent.commissions if c.status == 'pending')
+    # Per-agent totals (pending, paid, by year) from one grouped query
+    totals = get_agent_totals()
         
-    return render_template('agents/list.html', agents=agents)
+    return render_template('agents/list.html', agents=agents, totals=totals)
 
 @agents_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -74,16 +76,34 @@ def edit_agent(id):
 @agents_bp.route('/commissions')
 @login_required
 def commissions_dashboard():
-    # List all commissions, filterable by status
+    # List all commissions, filterable by status and agent
     status = request.args.get('status', 'pending')
+    agent_id = request.args.get('agent', type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     
-    query = Commission.query
-    if status != 'all':
-        query = query.filter(Commission.status == status)
-        
-    commissions = query.order_by(Commission.created_at.desc()).all()
+    query = filter_commissions(
+        Commission.query.options(
+            joinedload(Commission.agent),
+            joinedload(Commission.lease).joinedload(Lease.tenant)
+        ),
+        status, agent_id
+    )
+    
+    # One page at a time; fetch one extra row to know whether a next page exists
+    commissions = query.order_by(Commission.created_at.desc(), Commission.id.desc())\
+                       .offset((page - 1) * COMMISSION_PAGE_SIZE).limit(COMMISSION_PAGE_SIZE + 1).all()
+    pager = {'page': page, 'has_next': len(commissions) > COMMISSION_PAGE_SIZE}
+    commissions = commissions[:COMMISSION_PAGE_SIZE]
     
-    return render_template('agents/commissions.html', commissions=commissions, current_status=status)
+    return render_template('agents/commissions.html',
+                           commissions=commissions,
+                           current_status=status,
+                           current_agent=agent_id,
+                           agents=Agent.query.order_by(Agent.name).all(),
+                           stats=get_commission_totals(status, agent_id),
+                           pager=pager,
+                           filter_args={k: v for k, v in request.args.items() if k != 'page' and v},
+                           today=date.today().isoformat())
 
 @agents_bp.route('/commissions/pay/<int:id>', methods=['POST'])
 @login_required
@@ -124,6 +144,42 @@ def pay_commission(id):
         
     return redirect(url_for('agents.commissions_dashboard'))
 
+@agents_bp.route('/commissions/pay_batch', methods=['POST'])
+@login_required
+def pay_commissions_batch():
+    """Marks the selected commissions paid under one payout (shared date, reference and proof)"""
+    ids = request.form.getlist('commission_ids')
+    payment_date = request.form.get('payment_date')
+    reference = request.form.get('reference')
+    
+    if not ids:
+        flash('No commissions selected', 'error')
+        return redirect(url_for('agents.commissions_dashboard'))
+    
+    try:
+        from werkzeug.utils import secure_filename
+        import os
+        
+        # One proof file for the whole payout
+        proof_path = None
+        file = request.files.get('proof')
+        if file and file.filename != '':
+            filename = secure_filename(f"comm_batch_{datetime.now().strftime('%Y%m%d%H%M%S')}_{file.filename}")
+            upload_folder = os.path.join(request.root_path, 'static', 'uploads', 'commissions')
+            os.makedirs(upload_folder, exist_ok=True)
+            file.save(os.path.join(upload_folder, filename))
+            proof_path = f"uploads/commissions/{filename}"
+        
+        paid_on = datetime.strptime(payment_date, '%Y-%m-%d').date() if payment_date else datetime.today().date()
+        count, amount = pay_commissions(ids, paid_on, reference, proof_path, user_id=current_user.id)
+        flash(f'{count} commission(s) totalling RM{amount:,.2f} marked as paid!', 'success' if count else 'warning')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(url_for('agents.commissions_dashboard', **{k: v for k, v in request.args.items() if v}))
+
 @agents_bp.route('/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_agent(id):
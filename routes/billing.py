@@ -1,11 +1,16 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, send_file
-from models import db, Invoice, InvoiceLineItem, Tenant, Receipt, Lease
-from datetime import datetime, date
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, send_file, make_response, Response, stream_template
+from models import db, Invoice, InvoiceLineItem, Tenant, Receipt, Lease, LateFeeSource, Job
+from datetime import datetime, date, timedelta
 from flask_login import login_required, current_user
 from routes.auth import role_required
 from utils import get_tenant_unpaid_items, log_audit
 from utils_sst import get_sst_amount_if_applicable
-from io import BytesIO
+from utils_statement import get_balances_before, get_range_totals, iter_statement_rows, iter_portfolio_statements
+from utils_aging import get_unpaid_items_as_of, get_current_unpaid_items, get_aging_history, summarize_aging, month_end_dates, AGING_BUCKETS, LETTER_SEVERITIES, letter_severity, select_demand_letters
+from utils_documents import run_document_job, run_demand_letter_job, DOCUMENT_BUILDERS
+from utils_search import matching_ids
+from utils_revenue import lease_property_ids
+from services.job_service import JobService
 from io import BytesIO
 
 billing_bp = Blueprint('billing', __name__)
@@ -90,11 +95,7 @@ def generate_demand_letter(tenant_id):
         max_days_overdue = max((today - i['due_date']).days for i in unpaid_items)
         
     # Determine Letter Type/Severity
-    severity = "Reminder"
-    if max_days_overdue > 90:
-        severity = "Final Notice"
-    elif max_days_overdue > 30:
-        severity = "Demand Letter"
+    severity = letter_severity(max_days_overdue)
         
     # Generate Printable HTML
     return render_template('billing/print_demand_letter.html', 
@@ -104,6 +105,42 @@ def generate_demand_letter(tenant_id):
                          date=today,
                          severity=severity)
 
+@billing_bp.route('/demand_letters/bulk', methods=['GET', 'POST'])
+@login_required
+@role_required('admin', 'legal', 'accounts')
+def bulk_demand_letters():
+    """Demand letters for every active tenant at or above a severity, rendered in one job."""
+    if request.method == 'GET':
+        jobs = Job.query.filter_by(kind='demand_letters').order_by(Job.created_at.desc()).limit(20).all()
+        return render_template('billing/demand_letters.html', jobs=jobs)
+    
+    today = date.today()
+    min_severity = request.form.get('min_severity', 'Demand Letter')
+    if min_severity not in LETTER_SEVERITIES:
+        min_severity = 'Demand Letter'
+    fmt = request.form.get('format', 'merged')
+    if fmt not in ('zip', 'merged'):
+        fmt = 'merged'
+    
+    # Same batch aging pass as the aging report
+    tenant_ids = [t.id for t in Tenant.query.with_entities(Tenant.id).filter_by(status='active')]
+    letters = select_demand_letters(get_current_unpaid_items(tenant_ids), today, min_severity)
+    
+    if not letters:
+        flash(f"No active tenants are due a {min_severity} or above.", "info")
+        return redirect(url_for('billing.bulk_demand_letters'))
+    
+    # One audit entry for the whole batch
+    log_audit('CREATE', 'DemandLetter', 0,
+              f"Bulk demand letters ({min_severity} and above) for {len(letters)} tenants: "
+              + ", ".join(str(l['tenant_id']) for l in letters))
+    
+    description = f"Demand letters ({min_severity}+) - {len(letters)} tenants"
+    job = JobService.start('demand_letters', description, run_demand_letter_job, letters, today, fmt)
+    
+    flash(f"Started print job #{job.id}: {description}", 'success')
+    return redirect(url_for('billing.bulk_demand_letters'))
+
 @billing_bp.route('/aging_report')
 @login_required
 @role_required('admin', 'accounts')
@@ -111,41 +148,18 @@ def aging_report():
     today = date.today()
     tenants = Tenant.query.filter_by(status='active').order_by(Tenant.name).all()
     
+    # One batch pass for all active tenants instead of a ledger query per tenant
+    snapshot = get_unpaid_items_as_of([today], tenant_ids=[t.id for t in tenants])[today]
+    
     report_data = []
     
     for t in tenants:
-        unpaid_items = get_tenant_unpaid_items(t.id)
+        unpaid_items = snapshot.get(t.id)
         if not unpaid_items:
             continue
             
-        row = {
-            'tenant': t,
-            'total': 0,
-            'current': 0,
-            'd1_30': 0,
-            'd31_60': 0,
-            'd61_90': 0,
-            'over_90': 0
-        }
-        
-        for item in unpaid_items:
-            amount = item['unpaid_amount']
-            due_date = item['due_date']
-            
-            days_overdue = (today - due_date).days
-            
-            row['total'] += amount
-            
-            if days_overdue <= 0:
-                row['current'] += amount
-            elif days_overdue <= 30:
-                row['d1_30'] += amount
-            elif days_overdue <= 60:
-                row['d31_60'] += amount
-            elif days_overdue <= 90:
-                row['d61_90'] += amount
-            else:
-                row['over_90'] += amount
+        row = summarize_aging(unpaid_items, today)
+        row['tenant'] = t
                 
         if row['total'] > 0.01:
             report_data.append(row)
@@ -155,6 +169,48 @@ def aging_report():
             
     return render_template('billing/aging.html', report=report_data)
 
+@billing_bp.route('/aging_history/export')
+@login_required
+@role_required('admin', 'accounts')
+def aging_history_export():
+    """Month-end aging snapshots as CSV (auditor trail). ?months=12&detail=1 for per-tenant rows."""
+    import csv
+    import io
+    
+    months = min(max(request.args.get('months', 12, type=int), 1), 120)
+    detail = request.args.get('detail') == '1'
+    
+    history = get_aging_history(month_end_dates(months), by_tenant=detail)
+    
+    tenant_names = {}
+    if detail:
+        tenant_names = {t.id: (t.account_code or '', t.name) for t in Tenant.query.all()}
+    
+    output = io.StringIO()
+    writer = csv.writer(output)
+    header = ['As Of', 'Tenant ID', 'Account Code', 'Tenant Name'] if detail else ['As Of', 'Debtors']
+    writer.writerow(header + ['Total Due', 'Current', '1-30 Days', '31-60 Days', '61-90 Days', '>90 Days', 'Overdue'])
+    
+    def amounts(row):
+        return [f"{row[key]:.2f}" for key in ['total'] + AGING_BUCKETS + ['overdue']]
+    
+    for snap in history:
+        if not detail:
+            writer.writerow([snap['as_of'].isoformat(), snap['tenant_count']] + amounts(snap))
+            continue
+        for tenant_id, row in sorted(snap['tenants'].items()):
+            if row['total'] <= 0.01:
+                continue
+            code, name = tenant_names.get(tenant_id, ('', ''))
+            writer.writerow([snap['as_of'].isoformat(), tenant_id, code, name] + amounts(row))
+    
+    log_audit('REPORT', 'System', 0, f"Exported aging history ({months} month-ends{', per tenant' if detail else ''})")
+    
+    response = make_response(output.getvalue())
+    response.headers["Content-Disposition"] = f"attachment; filename=aging_history_{date.today().isoformat()}.csv"
+    response.headers["Content-Type"] = "text/csv"
+    return response
+
 @billing_bp.route('/invoices')
 def list_invoices():
     query = Invoice.query
@@ -166,14 +222,8 @@ def list_invoices():
         
     search = request.args.get('search')
     if search:
-        term = f"%{search}%"
-        query = query.join(Tenant).filter(
-            db.or_(
-                Tenant.name.ilike(term),
-                Invoice.description.ilike(term),
-                db.cast(Invoice.id, db.String).ilike(term)
-            )
-        )
+        # Invoice number, description, tenant name and account via the FTS index
+        query = query.filter(Invoice.id.in_(matching_ids('invoice', search)))
         
     type_filter = request.args.get('type')
     if type_filter:
@@ -226,6 +276,7 @@ def generate_rent():
 
     # Find all active leases
     active_leases = Lease.query.join(Tenant).filter(Tenant.status == 'active').all()
+    lease_properties = lease_property_ids(active_leases)
     
     count = 0
     skipped = 0
@@ -234,10 +285,12 @@ def generate_rent():
     for lease in active_leases:
         if lease.rent_amount > 0:
             # Check for duplicate
-            # Look for existing invoice for this tenant with same description
-            existing = Invoice.query.filter_by(
-                tenant_id=lease.tenant_id,
-                description=description
+            # Look for existing invoice for this lease with same description
+            # (invoices from before lease_id was recorded count for every lease of the tenant)
+            existing = Invoice.query.filter(
+                Invoice.tenant_id == lease.tenant_id,
+                Invoice.description == description,
+                db.or_(Invoice.lease_id == lease.id, Invoice.lease_id == None)
             ).first()
             # Optionally check status to allow regenerating voided ones? 
             # For now, simplistic check: if it exists, skip.
@@ -245,10 +298,13 @@ def generate_rent():
             if existing:
                 skipped += 1
                 continue
+            property_id = lease_properties[lease.id]
 
             # Create Invoice Header
             inv = Invoice(
                 tenant_id=lease.tenant_id,
+                lease_id=lease.id,
+                property_id=property_id,
                 due_date=target_date, # Due on 1st of selected month
                 description=description,
                 total_amount=lease.rent_amount,
@@ -260,6 +316,8 @@ def generate_rent():
             # Create Line Item
             item = InvoiceLineItem(
                 invoice_id=inv.id,
+                lease_id=lease.id,
+                property_id=property_id,
                 item_type='Rent',
                 description=f"Monthly Rent ({lease.unit_number})",
                 amount=lease.rent_amount
@@ -275,6 +333,8 @@ def generate_rent():
             if sst_amount > 0:
                 sst_item = InvoiceLineItem(
                     invoice_id=inv.id,
+                    lease_id=lease.id,
+                    property_id=property_id,
                     item_type='sst',
                     description=f"Service Tax (8%)",
                     amount=sst_amount
@@ -287,7 +347,7 @@ def generate_rent():
             # Find unbilled expenses for this property meant for the tenant
             from models import PropertyExpense
             pending_expenses = PropertyExpense.query.filter_by(
-                property_id=lease.property_id, 
+                property_id=property_id, 
                 charge_tenant=True,
                 tenant_invoice_id=None
             ).all()
@@ -296,6 +356,8 @@ def generate_rent():
                 # Add to invoice
                 charge_item = InvoiceLineItem(
                     invoice_id=inv.id,
+                    lease_id=lease.id,
+                    property_id=exp.property_id,
                     item_type='Chargeback', # or exp.expense_type
                     description=f"{exp.expense_type.replace('_', ' ').title()} - {exp.description or 'Reimbursement'}",
                     amount=exp.amount
@@ -347,10 +409,30 @@ def prepare_late_fees():
             assessment_date = today
 
     tenants = Tenant.query.filter_by(status='active').all()
+    proposed_fees = calculate_late_fees(tenants, assessment_date)
+
+    return render_template('billing/late_fees.html', fees=proposed_fees, assessment_date=assessment_date)
+
+def calculate_late_fees(tenants, assessment_date):
+    """Proposed late fee per tenant as of assessment_date: 8% a year on overdue rent lines only."""
+    # 2. Batch waterfall for every active tenant (one pass, no per-tenant ledger queries)
+    unpaid_by_tenant = get_current_unpaid_items(tenant_ids=[t.id for t in tenants])
+    
+    # Rule: Due on 1st. Late if not paid by 8th (7-day grace period).
+    # Only 'rent' (or other penalty-attracting type) items attract a fee.
+    candidate_invoice_ids = set()
+    for unpaid_items in unpaid_by_tenant.values():
+        for item in unpaid_items:
+            if item['type'].lower() == 'rent' and assessment_date >= item['due_date'] + timedelta(days=7):
+                candidate_invoice_ids.add(item['invoice_id'])
+    
+    # 3. Dedup: invoices already charged a late fee, via the indexed late_fee_source link
+    already_charged = get_invoices_with_late_fees(candidate_invoice_ids)
+    
     proposed_fees = []
     
     for t in tenants:
-        unpaid_items = get_tenant_unpaid_items(t.id)
+        unpaid_items = unpaid_by_tenant.get(t.id, [])
         
         # Calculate Penalty Base
         penalty_base = 0.0
@@ -359,53 +441,29 @@ def prepare_late_fees():
         overdue_invoice_ids = []
         
         for item in unpaid_items:
-            # Filter Logic:
-            # 1. Must be 'rent' (or other penalty-attracting type)
-            if item['type'].lower() != 'rent': continue
-            
-            # 2. Check Lateness relative to Assessment Date
-            # Rule: Due on 1st. Late if not paid by 8th.
-            # So if assessment_date >= 8th AND assessment_date >= item.due_date + 7 days
+            # Candidates are invoices; their SST and charge-back lines do not attract the fee
+            if item['type'].lower() != 'rent':
+                continue
+            if item['invoice_id'] not in candidate_invoice_ids or item['invoice_id'] in already_charged:
+                continue
             
             due_date = item['due_date']
-            # Calculate the "Late Trigger Date" for this specific item
-            # If due date is 1st Jan -> Late on 8th Jan.
-            # safe_grace_period = 7 days.
-            # late_trigger = due_date + timedelta(days=7)
-            from datetime import timedelta
             late_trigger = due_date + timedelta(days=7)
             
-            if assessment_date >= late_trigger:
-                # CHECK FOR DUPLICATES: Has a late fee already been charged for this specific Invoice ID?
-                # We look for any line item of type 'late_fee' whose description contains "Ref: #{invoice_id}"
-                # This relies on the convention established in apply_late_fees below.
-                existing_fee = InvoiceLineItem.query.filter(
-                    InvoiceLineItem.item_type == 'late_fee',
-                    InvoiceLineItem.description.contains(f"#{item['invoice_id']}")
-                ).first()
-                
-                if existing_fee:
-                    continue
-
-                # Calculate Pro-rated Fee
-                # Formula: Outstanding * 8% * (Days Late / 365)
-                # User Policy: Interest applies only to days AFTER the grace period (from 8th onwards)
-                
-                # late_trigger is Due Date + 7 days.
-                # If Assessment is 21st, and Trigger is 8th: Days Late = 13.
-                
-                days_late = (assessment_date - late_trigger).days
-                
-                # Ensure we don't have negative days (though the if check handles this)
-                if days_late < 1: days_late = 1
-                
-                item_fee = item['unpaid_amount'] * 0.08 * (days_late / 365.0)
-                
-                penalty_base += item['unpaid_amount'] # Total outstanding subject to penalty
-                total_fee += item_fee
-                
-                details.append(f"{item['description']} (Due {due_date}, {days_late} days overdue)")
-                overdue_invoice_ids.append(str(item['invoice_id']))
+            # Calculate Pro-rated Fee
+            # Formula: Outstanding * 8% * (Days Late / 365)
+            # User Policy: Interest applies only to days AFTER the grace period (from 8th onwards)
+            # If Assessment is 21st, and Trigger is 8th: Days Late = 13.
+            days_late = (assessment_date - late_trigger).days
+            if days_late < 1: days_late = 1
+            
+            item_fee = item['unpaid_amount'] * 0.08 * (days_late / 365.0)
+            
+            penalty_base += item['unpaid_amount'] # Total outstanding subject to penalty
+            total_fee += item_fee
+            
+            details.append(f"{item['description']} (Due {due_date}, {days_late} days overdue)")
+            overdue_invoice_ids.append(str(item['invoice_id']))
         
         if total_fee > 0:
             proposed_fees.append({
@@ -414,10 +472,21 @@ def prepare_late_fees():
                 'outstanding_rent': penalty_base,
                 'fee_amount': total_fee,
                 'details': "; ".join(details),
-                'invoice_ids': ",".join(list(set(overdue_invoice_ids))) # Dedupe just in case
+                'invoice_ids': ",".join(sorted(set(overdue_invoice_ids), key=int)) # Dedupe just in case
             })
-            
-    return render_template('billing/late_fees.html', fees=proposed_fees, assessment_date=assessment_date)
+    return proposed_fees
+
+def get_invoices_with_late_fees(invoice_ids, chunk_size=500):
+    """Returns the subset of invoice_ids that already have a late fee line linked to them."""
+    invoice_ids = list(invoice_ids)
+    charged = set()
+    for i in range(0, len(invoice_ids), chunk_size):
+        chunk = invoice_ids[i:i + chunk_size]
+        rows = db.session.query(LateFeeSource.source_invoice_id)\
+            .join(InvoiceLineItem, LateFeeSource.line_item_id == InvoiceLineItem.id)\
+            .filter(LateFeeSource.source_invoice_id.in_(chunk)).distinct().all()
+        charged.update(r[0] for r in rows)
+    return charged
 
 @billing_bp.route('/apply_late_fees', methods=['POST'])
 @login_required
@@ -427,38 +496,61 @@ def apply_late_fees():
     items = data.get('fees', [])
     today = date.today()
     
-    count = 0
+    # Build every invoice first, then insert headers, lines and source links
+    # in three batched flushes within a single transaction.
+    batch = []
     for item in items:
-        tenant_id = item['tenant_id']
         amount = float(item['amount'])
-        invoice_ids = item.get('invoice_ids', '')
-        
-        if amount > 0:
-            # Create Invoice for Late Fee
-            inv = Invoice(
-                tenant_id=tenant_id,
-                due_date=today,
-                description=f"Late Fee - {today.strftime('%B %Y')}",
-                total_amount=amount,
-                status='unpaid'
-            )
-            db.session.add(inv)
-            db.session.flush()
-            
-            # Helper text for reference
-            ref_text = f" (Ref: #{invoice_ids})" if invoice_ids else ""
+        if amount <= 0:
+            continue
             
-            line = InvoiceLineItem(
+        invoice_ids = str(item.get('invoice_ids') or '')
+        source_ids = sorted({int(x) for x in invoice_ids.split(',') if x.strip().isdigit()})
+        
+        inv = Invoice(
+            tenant_id=int(item['tenant_id']),
+            due_date=today,
+            description=f"Late Fee - {today.strftime('%B %Y')}",
+            total_amount=amount,
+            status='unpaid'
+        )
+        batch.append((inv, amount, source_ids))
+    
+    # Skip sources charged since the preview was rendered (double submit / second tab)
+    already_charged = get_invoices_with_late_fees({i for _, _, ids in batch for i in ids})
+    batch = [(inv, amount, ids) for inv, amount, ids in batch if not (ids and set(ids) <= already_charged)]
+    
+    try:
+        db.session.add_all([inv for inv, _, _ in batch])
+        db.session.flush()
+        
+        lines = []
+        for inv, amount, source_ids in batch:
+            # Human-readable reference; dedup uses late_fee_source, not this text
+            ref_text = f" (Ref: #{','.join(map(str, source_ids))})" if source_ids else ""
+            lines.append(InvoiceLineItem(
                 invoice_id=inv.id,
                 item_type='late_fee',
                 description=f"8% Late Fee on Outstanding Rent{ref_text}",
                 amount=amount
-            )
-            db.session.add(line)
-            count += 1
+            ))
+        db.session.add_all(lines)
+        db.session.flush()
+        
+        links = [
+            {'line_item_id': line.id, 'source_invoice_id': source_id}
+            for line, (_, _, source_ids) in zip(lines, batch)
+            for source_id in source_ids if source_id not in already_charged
+        ]
+        if links:
+            db.session.execute(LateFeeSource.__table__.insert(), links)
             
-    db.session.commit()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
     
+    count = len(batch)
     if count > 0:
         log_audit('GENERATE', 'Invoice', 0, f"Generated {count} late fee invoices")
         
@@ -470,7 +562,8 @@ def apply_late_fees():
 def create_custom():
     if request.method == 'GET':
         tenants = Tenant.query.order_by(Tenant.name).all()
-        return render_template('billing/create_custom.html', tenants=tenants)
+        leases = Lease.query.order_by(Lease.unit_number).all()
+        return render_template('billing/create_custom.html', tenants=tenants, leases=leases)
     
     # Handle POST (JSON or Form)
     data = request.get_json() if request.is_json else None
@@ -486,8 +579,19 @@ def create_custom():
     
     total = sum(float(i['amount']) for i in items)
     
+    # Optional unit the charges relate to (must be one of the tenant's leases)
+    lease = None
+    if data.get('lease_id'):
+        lease = Lease.query.filter_by(id=int(data['lease_id']), tenant_id=int(tenant_id)).first()
+        if not lease:
+            return "Invalid Unit", 400
+    lease_id = lease.id if lease else None
+    property_id = lease_property_ids([lease])[lease.id] if lease else None
+    
     inv = Invoice(
         tenant_id=tenant_id,
+        lease_id=lease_id,
+        property_id=property_id,
         due_date=due_date,
         description=data.get('description', 'Custom Invoice'),
         total_amount=total,
@@ -499,6 +603,8 @@ def create_custom():
     for i in items:
         line = InvoiceLineItem(
             invoice_id=inv.id,
+            lease_id=lease_id,
+            property_id=property_id,
             item_type=i.get('type', 'General'),
             description=i.get('description'),
             amount=float(i['amount'])
@@ -531,21 +637,35 @@ def edit_invoice(id):
     invoice.due_date = datetime.strptime(data.get('due_date'), '%Y-%m-%d').date()
     invoice.description = data.get('description')
     
-    # Update Items: Strategy is Delete All -> Re-add (Simpler than diffing)
-    InvoiceLineItem.query.filter_by(invoice_id=invoice.id).delete()
-    
+    # Update Items: existing lines (sent with their id) are updated in place so
+    # late fee lines keep their LateFeeSource links (dedup for late fee runs);
+    # lines left out are deleted, with their links, and new ones added
+    existing = {line.id: line for line in invoice.line_items}
     items = data.get('items', [])
     total = 0
+    kept = set()
     for i in items:
         amt = float(i['amount'])
         total += amt
-        line = InvoiceLineItem(
-            invoice_id=invoice.id,
-            item_type=i.get('type', 'General'),
-            description=i.get('description'),
-            amount=amt
-        )
-        db.session.add(line)
+        line = existing.get(int(i['id'])) if i.get('id') else None
+        if line:
+            kept.add(line.id)
+            line.item_type = i.get('type', line.item_type)
+            line.description = i.get('description')
+            line.amount = amt
+        else:
+            line = InvoiceLineItem(
+                invoice_id=invoice.id,
+                lease_id=invoice.lease_id,
+                property_id=invoice.property_id,
+                item_type=i.get('type', 'General'),
+                description=i.get('description'),
+                amount=amt
+            )
+            db.session.add(line)
+    for line_id, line in existing.items():
+        if line_id not in kept:
+            db.session.delete(line)
     
     invoice.total_amount = total
     db.session.commit()
@@ -672,48 +792,130 @@ def update_invoice_status(invoice):
     else:
         invoice.status = 'unpaid'
 
+STATEMENT_PAGE_SIZE = 500
+
+def parse_statement_range(args):
+    """Reads ?from=YYYY-MM-DD&to=YYYY-MM-DD; missing or invalid values mean open-ended."""
+    def parse(key):
+        try:
+            return datetime.strptime(args.get(key, ''), '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    return parse('from'), parse('to')
+
+def parse_month(month_str, today=None):
+    """'YYYY-MM' -> (first day, last day). Defaults to the last completed month."""
+    import calendar
+    
+    today = today or date.today()
+    try:
+        year, month = map(int, month_str.split('-'))
+        period_start = date(year, month, 1)
+    except (AttributeError, ValueError):
+        last_month_end = today.replace(day=1) - timedelta(days=1)
+        period_start = last_month_end.replace(day=1)
+    period_end = date(period_start.year, period_start.month,
+                      calendar.monthrange(period_start.year, period_start.month)[1])
+    return period_start, period_end
+
 @billing_bp.route('/statement/<int:tenant_id>')
 def tenant_statement(tenant_id):
     tenant = Tenant.query.get_or_404(tenant_id)
+    from_date, to_date = parse_statement_range(request.args)
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    # Opening balance (everything before the range) and range totals are indexed aggregates;
+    # the running balance comes from a SQL window over the rows in range.
+    opening_balance = get_balances_before(from_date, [tenant.id]).get(tenant.id, 0)
+    total_debit, total_credit = get_range_totals(tenant.id, from_date, to_date)
+    balance = opening_balance + total_debit - total_credit
+    
+    # Fetch one extra row to know whether a next page exists
+    pager = {'page': page, 'has_next': False}
+    rows = iter_statement_rows([tenant.id], from_date, to_date,
+                               opening={tenant.id: opening_balance},
+                               offset=(page - 1) * STATEMENT_PAGE_SIZE,
+                               limit=STATEMENT_PAGE_SIZE + 1)
+    
+    def ledger():
+        for i, row in enumerate(rows):
+            if i == STATEMENT_PAGE_SIZE:
+                pager['has_next'] = True
+                break
+            yield row
+    
+    return Response(stream_template('billing/statement.html',
+                                    tenant=tenant,
+                                    ledger=ledger(),
+                                    balance=balance,
+                                    opening_balance=opening_balance,
+                                    from_date=from_date,
+                                    to_date=to_date,
+                                    range_args={k: v for k, v in (('from', from_date), ('to', to_date)) if v},
+                                    pager=pager))
+
+@billing_bp.route('/statements/month_end')
+@login_required
+@role_required('admin', 'accounts')
+def month_end_statements():
+    """Printable month-end statements for the whole portfolio, streamed in one pass."""
+    today = date.today()
+    period_start, period_end = parse_month(request.args.get('month'), today)
     
-    # Fetch Invoices and Receipts
-    invoices = Invoice.query.filter_by(tenant_id=tenant_id).all()
-    receipts = Receipt.query.filter_by(tenant_id=tenant_id).all()
+    status = request.args.get('status', 'active')
     
-    # Combine into a ledger
-    ledger = []
-    for inv in invoices:
-        ledger.append({
-            'date': inv.issue_date,
-            'type': 'Invoice',
-            'ref': f"#{inv.id}",
-            'desc': inv.description,
-            'debit': inv.total_amount,
-            'credit': 0,
-            'obj': inv
-        })
-        
-    for r in receipts:
-        ledger.append({
-            'date': r.date_received,
-            'type': 'Payment',
-            'ref': f"R-{r.id}",
-            'desc': f"Ref: {r.reference}" if r.reference else "Payment",
-            'debit': 0,
-            'credit': r.amount,
-            'obj': r
-        })
-        
-    # Sort by date
-    ledger.sort(key=lambda x: x['date'])
-    
-    # Calculate Running Balance
-    balance = 0
-    for entry in ledger:
-        balance += entry['debit'] - entry['credit']
-        entry['balance'] = balance
-        
-    return render_template('billing/statement.html', tenant=tenant, ledger=ledger, balance=balance)
+    # Log first: log_audit commits, which would expire the tenants loaded below
+    log_audit('REPORT', 'System', 0, f"Printed month-end statements for {period_start.strftime('%B %Y')} ({status} tenants)")
+    
+    query = Tenant.query
+    if status != 'all':
+        query = query.filter(Tenant.status == status)
+    tenants = query.order_by(Tenant.id).all()
+    
+    statements = iter_portfolio_statements(tenants, period_start, period_end)
+    
+    return Response(stream_template('billing/print_statements.html',
+                                    statements=statements,
+                                    period_start=period_start,
+                                    period_end=period_end,
+                                    date=today))
+
+@billing_bp.route('/documents/batch', methods=['GET', 'POST'])
+@login_required
+@role_required('admin', 'accounts')
+def batch_documents():
+    """Bulk print invoices/receipts for a month or a selection, rendered in a background job."""
+    if request.method == 'GET':
+        jobs = Job.query.filter_by(kind='documents').order_by(Job.created_at.desc()).limit(20).all()
+        default_month = parse_month(None)[0].strftime('%Y-%m')
+        return render_template('billing/batch_documents.html', jobs=jobs, default_month=default_month)
+    
+    data = request.get_json(silent=True) or request.form
+    doc_type = data.get('doc_type', 'invoice')
+    fmt = data.get('format', 'zip')
+    if doc_type not in DOCUMENT_BUILDERS or fmt not in ('zip', 'merged'):
+        return jsonify({'status': 'error', 'message': 'Invalid document type or format'}), 400
+    
+    ids = None
+    period_start = period_end = None
+    if data.get('ids'):
+        try:
+            ids = [int(i) for i in data.get('ids')]
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Invalid selection'}), 400
+        description = f"{len(ids)} selected {doc_type}s"
+    else:
+        period_start, period_end = parse_month(data.get('month'))
+        description = f"{doc_type.title()}s - {period_start.strftime('%B %Y')}"
+    
+    log_audit('REPORT', 'System', 0, f"Bulk printed {description} ({fmt})")
+    job = JobService.start('documents', description, run_document_job,
+                           doc_type, ids, period_start, period_end, fmt, description)
+    
+    if request.is_json:
+        return jsonify({'status': 'success', 'job_id': job.id})
+    flash(f"Started print job #{job.id}: {description}", 'success')
+    return redirect(url_for('billing.batch_documents'))
 
 @billing_bp.route('/invoice/<int:id>/pdf')
 def download_invoice_pdf(id):
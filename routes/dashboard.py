@@ -1,10 +1,12 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required
 from models import db, Invoice, Receipt, Property, Lease, Tenant
 from datetime import date, datetime, timedelta
 from sqlalchemy import func, and_, or_, extract, desc
 from dateutil.relativedelta import relativedelta
-from utils import get_tenant_unpaid_items
+from utils_aging import get_unpaid_items_as_of, summarize_aging, month_end_dates
+from utils_rent_roll import get_occupancy_trend
+from utils_lease_timeline import get_expiry_histogram
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -37,56 +39,43 @@ def get_dashboard_metrics():
             .scalar() or 0
         receipts_data.append(float(rec))
 
-    # 2. Occupancy Rate (Last 6 Months)
-    occupancy_data = []
+    # 2. Occupancy Rate (Month starts, from nightly rent roll snapshots)
+    # Unarchived units on each date form the denominator
+    occupancy_trend = get_occupancy_trend(24, today)
+    occupancy_data = occupancy_trend['occupancy'][-6:]
     
     # 3. Card Metrics
-    total_properties = Property.query.filter_by(archived=False).count() or 1 # Ensure not zero for division
-    occupied_count_current = Property.query.filter_by(status='occupied', archived=False).count()
-    vacant_count = total_properties - occupied_count_current
-    total_tenants = Tenant.query.filter_by(status='active').count()  # Only count active tenants
-    lapsed_tenants = Tenant.query.filter(Tenant.status.in_(['lapse', 'lapsed'])).count()  # Count lapsed tenants
-    
-    for i in range(5, -1, -1):
-        d = today - relativedelta(months=i)
-        chk_date = d.replace(day=1)
-        
-        occupied_count_month = Lease.query.filter(
-            and_(Lease.start_date <= chk_date, Lease.end_date >= chk_date)
-        ).count()
-        
-        rate = (occupied_count_month / total_properties) * 100
-        occupancy_data.append(round(rate, 1))
+    # Active = lease running, lapsed = every lease ended (maintained by the lifecycle job)
+    status_counts = dict(db.session.query(Tenant.effective_status, func.count(Tenant.id)).group_by(Tenant.effective_status).all())
+    total_tenants = status_counts.get('active', 0)
+    lapsed_tenants = status_counts.get('lapsed', 0)
+
+    # 3. Aging Metrics (Current Snapshot + Month-End History)
+    # One sweep serves today's snapshot, last month's KPI and the overdue trend
+    month_ends = month_end_dates(5, today)
+    snapshots = get_unpaid_items_as_of(month_ends + [today])
 
-    # 3. Aging Metrics (Current Snapshot)
     aging_buckets = {'1-30 Days': 0, '31-60 Days': 0, '61-90 Days': 0, '>90 Days': 0}
-    tenants = Tenant.query.filter_by(status='active').all()
-    for t in tenants:
-        unpaid = get_tenant_unpaid_items(t.id)
-        for item in unpaid:
-            days = (today - item['due_date']).days
-            if days > 90: aging_buckets['>90 Days'] += float(item['unpaid_amount'])
-            elif days > 60: aging_buckets['61-90 Days'] += float(item['unpaid_amount'])
-            elif days > 60: aging_buckets['31-60 Days'] += float(item['unpaid_amount']) # Fix logic
-            elif days > 30: aging_buckets['31-60 Days'] += float(item['unpaid_amount'])
-            elif days > 0: aging_buckets['1-30 Days'] += float(item['unpaid_amount'])
+    active_ids = {t_id for (t_id,) in db.session.query(Tenant.id).filter_by(status='active').all()}
+    for tenant_id, unpaid in snapshots[today].items():
+        if tenant_id not in active_ids:
+            continue
+        row = summarize_aging(unpaid, today)
+        aging_buckets['1-30 Days'] += float(row['d1_30'])
+        aging_buckets['31-60 Days'] += float(row['d31_60'])
+        aging_buckets['61-90 Days'] += float(row['d61_90'])
+        aging_buckets['>90 Days'] += float(row['over_90'])
+
+    def get_overdue_balance_at(target_date):
+        """Overdue (past due date, unpaid after allocation) as of a snapshot date"""
+        return sum(summarize_aging(unpaid, target_date)['overdue'] for unpaid in snapshots[target_date].values())
+
+    overdue_data = [round(float(get_overdue_balance_at(d)), 2) for d in month_ends + [today]]
 
     # 4. Lease Expiry Forecast (Next 6 Months)
-    expiry_labels = []
-    expiry_counts = []
-    
-    for i in range(1, 7):
-        d = today + relativedelta(months=i)
-        month_start = d.replace(day=1)
-        next_month = d + relativedelta(months=1)
-        month_end = next_month.replace(day=1) - timedelta(days=1)
-        
-        expiry_labels.append(d.strftime('%b %Y'))
-        
-        count = Lease.query.filter(
-            and_(Lease.end_date >= month_start, Lease.end_date <= month_end)
-        ).count()
-        expiry_counts.append(count)
+    expiry = get_expiry_histogram(today.replace(day=1) + relativedelta(months=1), 6)
+    expiry_labels = expiry['labels']
+    expiry_counts = expiry['counts']
     
     # KPIs (Current)
     kpi_revenue_current = revenue_data[-1] if revenue_data else 0
@@ -95,39 +84,28 @@ def get_dashboard_metrics():
     kpi_collected_current = receipts_data[-1] if receipts_data else 0
     kpi_collected_last = receipts_data[-2] if len(receipts_data) > 1 else 0
 
-    kpi_occupancy_current = occupancy_data[-1] if occupancy_data else 0
-    kpi_occupancy_last = occupancy_data[-2] if len(occupancy_data) > 1 else 0
+    # Months the nightly snapshot job has not filled yet are None
+    kpi_occupancy_current = (occupancy_data[-1] if occupancy_data else 0) or 0
+    kpi_occupancy_last = (occupancy_data[-2] if len(occupancy_data) > 1 else 0) or 0
 
-    # Overdue Comparison (Historical Approximation)
-    def get_overdue_balance_at(target_date):
-        """Calculate outstanding balance as of a specific date"""
-        # Sum of all invoices due before or on target_date
-        total_invoiced = db.session.query(func.sum(Invoice.total_amount))\
-            .filter(Invoice.due_date <= target_date)\
-            .filter(Invoice.status != 'void').scalar() or 0
-            
-        # Sum of all receipts received before or on target_date
-        total_collected = db.session.query(func.sum(Receipt.amount))\
-            .filter(Receipt.date_received <= target_date).scalar() or 0
-            
-        return max(0, total_invoiced - total_collected)
-
-    # Current Overdue (Today)
+    # Overdue Comparison (As-of Aging Snapshots)
     kpi_overdue_current = get_overdue_balance_at(today)
     
     # Last Month Overdue (Last day of last month)
-    last_month_date = today.replace(day=1) - timedelta(days=1)
-    kpi_overdue_last = get_overdue_balance_at(last_month_date)
+    kpi_overdue_last = get_overdue_balance_at(month_ends[-1])
 
     return {
         'months': months,
         'revenue_data': revenue_data,
         'receipts_data': receipts_data,
         'occupancy_data': occupancy_data,
+        'occupancy_trend': occupancy_trend,
         'aging_labels': list(aging_buckets.keys()),
         'aging_data': list(aging_buckets.values()),
         'expiry_labels': expiry_labels,
         'expiry_counts': expiry_counts,
+        'overdue_labels': [d.strftime('%b %Y') for d in month_ends] + ['Today'],
+        'overdue_data': overdue_data,
         
         # New Comparison KPIs
         'kpi_revenue_current': kpi_revenue_current,
@@ -153,6 +131,17 @@ def dashboard_metrics():
     data = get_dashboard_metrics()
     return jsonify(data)
 
+@dashboard_bp.route('/api/dashboard/expiry_forecast')
+@login_required
+def expiry_forecast():
+    """Leases expiring per month. ?months=24 for the horizon, ?start=YYYY-MM (default next month)."""
+    months = min(max(request.args.get('months', 12, type=int), 1), 120)
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m').date()
+    except ValueError:
+        start = date.today().replace(day=1) + relativedelta(months=1)
+    return jsonify(get_expiry_histogram(start, months))
+
 @dashboard_bp.route('/dashboard')
 @login_required
 def index():
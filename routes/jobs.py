@@ -0,0 +1,29 @@
+from flask import Blueprint, jsonify, send_file, abort
+from models import Job
+from flask_login import login_required, current_user
+import os
+
+jobs_bp = Blueprint('jobs', __name__)
+
+def get_job_for_user(job_id):
+    job = Job.query.get_or_404(job_id)
+    # Users see their own jobs; admins see all
+    if current_user.role != 'admin' and job.created_by != current_user.id:
+        abort(403)
+    return job
+
+@jobs_bp.route('/<int:job_id>')
+@login_required
+def job_status(job_id):
+    return jsonify(get_job_for_user(job_id).to_dict())
+
+@jobs_bp.route('/<int:job_id>/download')
+@login_required
+def download_result(job_id):
+    job = get_job_for_user(job_id)
+    if job.status != 'done' or not job.result_path or not os.path.exists(job.result_path):
+        abort(404)
+
+    # Strip the internal "job_<id>_" prefix from the stored file name
+    download_name = os.path.basename(job.result_path).split('_', 2)[-1]
+    return send_file(job.result_path, as_attachment=True, download_name=download_name)
@@ -0,0 +1,49 @@
+import hmac
+
+from flask import Blueprint, Response, request, abort, current_app
+from models import db, Job
+from services import document_renderer
+from utils_metrics import render, sqlite_file_sizes
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# functools caches reported under cache_requests_total
+LRU_CACHES = {
+    'document_template': document_renderer.get_template,
+    'document_styles': document_renderer.get_template_styles,
+}
+
+def _authorized():
+    """
+    METRICS_TOKEN as a Bearer header or ?token=. There is no local-only
+    fallback: behind a reverse proxy every request comes from localhost.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip() or request.args.get('token', '')
+    return hmac.compare_digest(supplied, token)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    if not current_app.config.get('METRICS_TOKEN'):
+        abort(404) # Off until a token is set
+    if not _authorized():
+        abort(403)
+
+    queue = db.session.query(Job.status, db.func.count(Job.id))\
+        .filter(Job.status.in_(['queued', 'running'])).group_by(Job.status).all()
+    depth = dict(queue)
+    gauges = [
+        ('jobs_in_queue', 'Background jobs waiting or running',
+         [({'status': status}, depth.get(status, 0)) for status in ('queued', 'running')]),
+    ]
+    if db.engine.dialect.name == 'sqlite' and db.engine.url.database:
+        gauges.append(('sqlite_file_bytes', 'Size of the SQLite database file and its write-ahead log',
+                       sqlite_file_sizes(db.engine.url.database)))
+
+    counters = []
+    for name, cached in LRU_CACHES.items():
+        info = cached.cache_info()
+        counters.append(('cache_requests_total', {'cache': name, 'result': 'hit'}, info.hits))
+        counters.append(('cache_requests_total', {'cache': name, 'result': 'miss'}, info.misses))
+
+    return Response(render(gauges, counters), mimetype='text/plain; version=0.0.4')
@@ -4,22 +4,30 @@ from datetime import date, datetime
 import os
 import io
 import csv
-
-try:
-    import openpyxl
-    from openpyxl import Workbook
-except ImportError:
-    openpyxl = None
-    Workbook = None
+import tempfile
+from time import perf_counter
 
 from werkzeug.utils import secure_filename
-from flask_login import login_required
+from flask_login import login_required, current_user
 from routes.auth import role_required
 from utils import log_audit
+from utils_expenses import filter_expenses, get_expense_totals, get_property_choices
+from utils_bulk import delete_properties, archive_properties
+from utils_metrics import record_import
+from utils_budget import get_variance_report, refresh_budget_rollups
+from utils_lease_ledger import get_lease_summaries
+from utils_rent_roll import get_rent_roll, summarize_rent_roll, occupancy_rate
+from utils_search import matching_ids
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
 properties_bp = Blueprint('properties', __name__, url_prefix='/properties')
 
+# Rows used to size columns in streamed (write-only) exports
+EXPORT_WIDTH_SAMPLE = 200
+
+EXPENSE_PAGE_SIZE = 200
+
 def recalculate_property_statuses():
     """Recalculate all property statuses based on active leases"""
     today = date.today()
@@ -101,14 +109,7 @@ def dashboard():
         query = query.filter(Property.furnishing_status == furnishing_filter)
         
     if search_term:
-        term = f"%{search_term}%"
-        query = query.filter(
-            db.or_(
-                Property.unit_number.ilike(term),
-                Property.project.ilike(term),
-                Property.property_type.ilike(term)
-            )
-        )
+        query = query.filter(Property.id.in_(matching_ids('property', search_term)))
         
     properties = query.order_by(Property.project, Property.unit_number).all()
     
@@ -356,7 +357,7 @@ def history(id):
     
     # 1. Fetch Leases (Past & Present)
     # Try linking by ID first, fallback to unit_number match if legacy data
-    leases = Lease.query.filter(
+    leases = Lease.query.options(joinedload(Lease.tenant)).filter(
         (Lease.property_id == id) | (Lease.unit_number == property.unit_number)
     ).order_by(Lease.end_date.desc()).all()
     
@@ -365,23 +366,12 @@ def history(id):
     current_lease = None
     today = date.today()
     
+    # Financials per lease (not per tenant), so tenants who also leased other units
+    # only show what was billed/paid for this one. One query for all leases.
+    summaries = get_lease_summaries(leases)
+    
     for lease in leases:
-        tenant = lease.tenant
-        
-        # Calculate Financials for this Tenant
-        # Note: This aggregates ALL time for the tenant. If a tenant had multiple leases for different units, 
-        # this might over-count. Ideally, receipt/invoice should link to lease or property.
-        # For now, assuming 1-to-1 or 1-to-many sequential relationship (Tenant -> Lease).
-        
-        # Fetch Invoices for this tenant
-        tenant_invoices = Invoice.query.filter_by(tenant_id=tenant.id).all()
-        total_invoiced = sum(inv.total_amount for inv in tenant_invoices)
-        
-        # Fetch Receipts
-        tenant_receipts = Receipt.query.filter_by(tenant_id=tenant.id).all()
-        total_paid = sum(r.amount for r in tenant_receipts)
-        
-        balance = total_invoiced - total_paid
+        financials = summaries.get(lease.id, {'invoiced': 0, 'paid': 0, 'balance': 0})
         
         # Check active
         is_active = lease.start_date <= today <= lease.end_date
@@ -390,12 +380,8 @@ def history(id):
             
         tenancy_history.append({
             'lease': lease,
-            'tenant': tenant,
-            'financials': {
-                'invoiced': total_invoiced,
-                'paid': total_paid,
-                'balance': balance
-            },
+            'tenant': lease.tenant,
+            'financials': financials,
             'is_active': is_active
         })
         
@@ -406,7 +392,7 @@ def history(id):
     issues = []
     tenant_ids = [l.tenant_id for l in leases]
     if tenant_ids:
-        raw_notes = TenantNote.query.filter(
+        raw_notes = TenantNote.query.options(joinedload(TenantNote.tenant)).filter(
             TenantNote.tenant_id.in_(tenant_ids),
             TenantNote.category.in_(['Complaint', 'Maintenance', 'Request'])
         ).order_by(TenantNote.date.desc()).all()
@@ -423,10 +409,7 @@ def history(id):
     # 4. Fetch Expenses & Stats
     from models import PropertyExpense
     expenses = PropertyExpense.query.filter_by(property_id=id).order_by(PropertyExpense.bill_date.desc()).all()
-    
-    total_expenses = sum(e.amount for e in expenses)
-    paid_expenses = sum(e.amount for e in expenses if e.paid_by_company)
-    pending_expenses = total_expenses - paid_expenses
+    expense_totals = get_expense_totals(property_id=id)
 
     return render_template('properties/history.html', 
                          property=property,
@@ -434,7 +417,7 @@ def history(id):
                          issues=issues,
                          current_lease=current_lease,
                          expenses=expenses,
-                         expense_stats={'total': total_expenses, 'paid': paid_expenses, 'pending': pending_expenses})
+                         expense_stats=expense_totals)
 
 @properties_bp.route('/archive/<int:id>', methods=['POST'])
 @login_required
@@ -490,7 +473,9 @@ def add_project():
 @properties_bp.route('/download_template')
 @login_required
 def download_template():
-    if not openpyxl:
+    try:
+        from openpyxl import Workbook
+    except ImportError:
         return "Internal Error: openpyxl library missing", 500
         
     # Create a Workbook using openpyxl
@@ -541,6 +526,7 @@ def bulk_upload():
             
         if file:
             try:
+                started = perf_counter()
                 # 1. Parse File
                 data_rows = []
                 headers = []
@@ -553,7 +539,9 @@ def bulk_upload():
                     data_rows = list(csv_reader)
                 else:
                     # Handle Excel
-                    if not openpyxl:
+                    try:
+                        import openpyxl
+                    except ImportError:
                         flash('Server Error: "openpyxl" library not installed.', 'error')
                         return redirect(request.url)
                         
@@ -702,6 +690,7 @@ def bulk_upload():
                     added_count += 1
                 
                 db.session.commit()
+                record_import('property', perf_counter() - started, imported=added_count, skipped=skipped_count)
                 log_audit('IMPORT', 'Property', 0, f"Bulk imported {added_count} properties")
                 flash(f'Success! Added {added_count} properties. Skipped {skipped_count} duplicates.', 'success')
                 return redirect(url_for('properties.dashboard'))
@@ -795,61 +784,60 @@ def quick_add_tenant():
 
 @properties_bp.route('/bulk_delete', methods=['POST'])
 @login_required
+@role_required('admin', 'coordinator')
 def bulk_delete():
-    """Bulk delete properties and all related data (leases, invoices, receipts)"""
+    """Bulk delete properties and all related data; {"dry_run": true} previews the per-table counts"""
+    data = request.get_json()
+    return _bulk_delete(data, dry_run=bool(data.get('dry_run')))
+
+@properties_bp.route('/bulk_delete/preview', methods=['POST'])
+@login_required
+def bulk_delete_preview():
+    """Dry run of bulk_delete for anyone who can see the list; nothing is changed"""
+    return _bulk_delete(request.get_json(), dry_run=True)
+
+def _bulk_delete(data, dry_run):
     try:
-        data = request.get_json()
         property_ids = data.get('property_ids', [])
         
         if not property_ids:
             return jsonify({'status': 'error', 'message': 'No properties selected'}), 400
         
-        deleted_count = 0
-        
-        # Import related models
-        from models import Invoice, Receipt, TenantNote
-        
-        for property_id in property_ids:
-            property_obj = Property.query.get(int(property_id))
-            if not property_obj:
-                continue
-            
-            # Delete all related data (cascade)
-            # Find all leases for this property
-            leases = Lease.query.filter_by(property_id=property_obj.id).all()
-            
-            for lease in leases:
-                # Delete invoices and receipts for this lease's tenant
-                tenant = lease.tenant
-                if tenant:
-                    # Delete receipts linked to tenant's invoices
-                    for invoice in Invoice.query.filter_by(tenant_id=tenant.id).all():
-                        Receipt.query.filter_by(invoice_id=invoice.id).delete()
-                        db.session.delete(invoice)
-                    
-                    # Delete tenant notes
-                    TenantNote.query.filter_by(tenant_id=tenant.id).delete()
-                
-                # Delete the lease
-                db.session.delete(lease)
-            
-            # Delete the property
-            db.session.delete(property_obj)
-            deleted_count += 1
-        
-        db.session.commit()
-        
-        log_audit('DELETE', 'Property', 0, f"Bulk deleted {deleted_count} properties: {', '.join(map(str, property_ids))}")
+        counts = delete_properties(property_ids, user_id=current_user.id, dry_run=dry_run)
+        deleted_count = counts.get('property', 0)
 
         return jsonify({
             'status': 'success',
+            'dry_run': dry_run,
             'deleted_count': deleted_count,
-            'message': f'Successfully deleted {deleted_count} propert{"ies" if deleted_count != 1 else "y"}'
+            'counts': counts,
+            'message': f'{"Would delete" if dry_run else "Successfully deleted"} {deleted_count} propert{"ies" if deleted_count != 1 else "y"}'
         })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@properties_bp.route('/bulk_archive', methods=['POST'])
+@login_required
+@role_required('admin', 'coordinator')
+def bulk_archive():
+    """Archives the selected properties; occupied units are skipped"""
+    try:
+        data = request.get_json()
+        property_ids = data.get('property_ids', [])
+        if not property_ids:
+            return jsonify({'status': 'error', 'message': 'No properties selected'}), 400
+
+        result = archive_properties(property_ids, user_id=current_user.id)
+        message = f"Archived {result['archived']} propert{'ies' if result['archived'] != 1 else 'y'}"
+        if result['skipped_occupied']:
+            message += f", skipped {result['skipped_occupied']} occupied"
+        return jsonify({'status': 'success', 'message': message, **result})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @properties_bp.route('/<int:id>/add_expense', methods=['POST'])
 @login_required
 @role_required('admin', 'coordinator', 'accounts')
@@ -949,45 +937,30 @@ def expenses_dashboard():
     expense_type_filter = request.args.get('expense_type')
     status_filter = request.args.get('status')  # paid, unpaid, all
     export_status_filter = request.args.get('export_status') # pending, exported, all
+    page = request.args.get('page', 1, type=int)
+    page = max(page, 1)
     
-    query = PropertyExpense.query
-    
-    if property_filter:
-        query = query.filter(PropertyExpense.property_id == property_filter)
-    
-    if expense_type_filter:
-        query = query.filter(PropertyExpense.expense_type == expense_type_filter)
-    
-    if status_filter == 'paid':
-        query = query.filter(PropertyExpense.paid_by_company == True)
-    elif status_filter == 'unpaid':
-        query = query.filter(PropertyExpense.paid_by_company == False)
-        
-    if export_status_filter == 'pending':
-        query = query.filter((PropertyExpense.export_status == 'pending') | (PropertyExpense.export_status == None))
-    elif export_status_filter == 'exported':
-        query = query.filter(PropertyExpense.export_status == 'exported')
+    query = filter_expenses(PropertyExpense.query.options(joinedload(PropertyExpense.property)),
+                            property_filter, expense_type_filter, status_filter, export_status_filter)
     
-    expenses = query.order_by(PropertyExpense.bill_date.desc()).all()
+    # One page at a time; fetch one extra row to know whether a next page exists
+    expenses = query.order_by(PropertyExpense.bill_date.desc(), PropertyExpense.id.desc())\
+                    .offset((page - 1) * EXPENSE_PAGE_SIZE).limit(EXPENSE_PAGE_SIZE + 1).all()
+    pager = {'page': page, 'has_next': len(expenses) > EXPENSE_PAGE_SIZE}
+    expenses = expenses[:EXPENSE_PAGE_SIZE]
     
-    # Statistics
-    all_expenses = PropertyExpense.query.all()
-    total_expenses = sum(e.amount for e in all_expenses)
-    paid_expenses = sum(e.amount for e in all_expenses if e.paid_by_company)
-    pending_expenses = total_expenses - paid_expenses
+    # Statistics (grouped SUM for the current filters, cached)
+    stats = get_expense_totals(property_filter, expense_type_filter, status_filter, export_status_filter)
     
     # Get properties for filter dropdown
-    properties = Property.query.order_by(Property.unit_number).all()
+    properties = get_property_choices()
     
     return render_template('properties/expenses_dashboard.html',
                          expenses=expenses,
                          properties=properties,
-                         stats={
-                             'total': total_expenses,
-                             'paid': paid_expenses,
-                             'pending': pending_expenses,
-                             'count': len(all_expenses)
-                         },
+                         stats=stats,
+                         pager=pager,
+                         filter_args={k: v for k, v in request.args.items() if k != 'page' and v},
                          current_filters={
                              'property': property_filter,
                              'expense_type': expense_type_filter,
@@ -998,6 +971,90 @@ def expenses_dashboard():
 
 
 
+@properties_bp.route('/budget')
+@login_required
+@role_required('admin', 'accounts')
+def budget_variance():
+    """Expected (Property expected_* fields) vs actual expenses, per project, month and GL code."""
+    today = date.today()
+    year = request.args.get('year', today.year, type=int)
+    project = request.args.get('project') or None
+    
+    report = get_variance_report(year, project)
+    projects = [p.name for p in Project.query.order_by(Project.name).all()]
+    
+    return render_template('properties/budget.html',
+                         report=report,
+                         projects=projects,
+                         years=range(today.year - 5, today.year + 2))
+
+@properties_bp.route('/budget/refresh', methods=['POST'])
+@login_required
+@role_required('admin', 'accounts')
+def refresh_budget():
+    year = request.form.get('year', date.today().year, type=int)
+    count = refresh_budget_rollups(date(year, 1, 1), date(year, 12, 1))
+    flash(f'Budget rollups for {year} refreshed ({count} rows).', 'success')
+    return redirect(url_for('properties.budget_variance', year=year, project=request.form.get('project') or None))
+
+@properties_bp.route('/rent_roll')
+@login_required
+@role_required('admin', 'accounts', 'coordinator')
+def rent_roll():
+    """Unit-by-unit status, tenant, rent, deposits and expiry as at any date. ?format=csv to export."""
+    try:
+        as_of = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        as_of = date.today()
+    project = request.args.get('project') or None
+    
+    roll = get_rent_roll(as_of, project)
+    
+    if request.args.get('format') == 'csv':
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['As Of', 'Project', 'Block', 'Floor', 'Unit', 'Type', 'Size (sqft)', 'Status',
+                         'Account Code', 'Tenant', 'Lease Start', 'Lease End', 'Days to Expiry',
+                         'Rent', 'Asking Rent', 'Security Deposit', 'Utility Deposit', 'Misc Deposit'])
+        for u in roll:
+            writer.writerow([
+                as_of.isoformat(), u['project'], u['block'] or '', u['floor'] or '', u['unit_number'],
+                u['property_type'] or '', u['size_sqft'] or '', u['status'].title(),
+                u['account_code'] or '', u['tenant_name'] or '',
+                u['start_date'].isoformat() if u['start_date'] else '',
+                u['end_date'].isoformat() if u['end_date'] else '',
+                u['days_to_expiry'] if u['days_to_expiry'] is not None else '',
+                f"{u['rent_amount']:.2f}", f"{u['target_rent']:.2f}",
+                f"{u['security_deposit']:.2f}", f"{u['utility_deposit']:.2f}", f"{u['misc_deposit']:.2f}"
+            ])
+        log_audit('REPORT', 'System', 0, f"Exported rent roll as at {as_of.isoformat()}")
+        
+        response = make_response(output.getvalue())
+        response.headers["Content-Disposition"] = f"attachment; filename=rent_roll_{as_of.isoformat()}.csv"
+        response.headers["Content-Type"] = "text/csv"
+        return response
+    
+    summary = summarize_rent_roll(roll)
+    totals = {
+        'total_units': sum(s['total_units'] for s in summary.values()),
+        'occupied_units': sum(s['occupied_units'] for s in summary.values()),
+        'contracted_rent': sum(s['contracted_rent'] for s in summary.values()),
+        'asking_rent': sum(s['asking_rent'] for s in summary.values()),
+        'deposits': sum(u['security_deposit'] + u['utility_deposit'] + u['misc_deposit'] for u in roll)
+    }
+    totals['rate'] = occupancy_rate(totals['occupied_units'], totals['total_units'])
+    for entry in summary.values():
+        entry['rate'] = occupancy_rate(entry['occupied_units'], entry['total_units'])
+    projects = [p.name for p in Project.query.order_by(Project.name).all()]
+    
+    return render_template('properties/rent_roll.html',
+                         roll=roll,
+                         summary=summary,
+                         totals=totals,
+                         as_of=as_of,
+                         project=project,
+                         projects=projects)
+
 @properties_bp.route('/expenses/bulk_add', methods=['POST'])
 @login_required
 @role_required('admin', 'coordinator', 'accounts')
@@ -1103,50 +1160,48 @@ def export_expenses():
     status_filter = request.args.get('status')
     export_status_filter = request.args.get('export_status')
     
-    query = PropertyExpense.query
-    
-    if property_filter:
-        query = query.filter(PropertyExpense.property_id == property_filter)
-    if expense_type_filter:
-        query = query.filter(PropertyExpense.expense_type == expense_type_filter)
-    if status_filter == 'paid':
-        query = query.filter(PropertyExpense.paid_by_company == True)
-    elif status_filter == 'unpaid':
-        query = query.filter(PropertyExpense.paid_by_company == False)
-        
-    if export_status_filter == 'pending':
-        query = query.filter((PropertyExpense.export_status == 'pending') | (PropertyExpense.export_status == None))
-    elif export_status_filter == 'exported':
-        query = query.filter(PropertyExpense.export_status == 'exported')
-    
-    expenses = query.order_by(PropertyExpense.bill_date.desc()).all()
+    query = filter_expenses(PropertyExpense.query,
+                            property_filter, expense_type_filter, status_filter, export_status_filter)
     
     # Create Excel file
-    if not Workbook:
+    try:
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+    except ImportError:
         flash('Excel export not available. Please install openpyxl.', 'error')
         return redirect(url_for('properties.expenses_dashboard'))
     
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Expenses"
+    # Column projection joined to Property: no ORM objects, no per-row property load
+    rows = query.join(Property, PropertyExpense.property_id == Property.id).with_entities(
+        PropertyExpense.id,
+        PropertyExpense.bill_date,
+        Property.unit_number,
+        PropertyExpense.expense_type,
+        PropertyExpense.description,
+        PropertyExpense.amount,
+        PropertyExpense.paid_by_company,
+        PropertyExpense.payment_date,
+        PropertyExpense.payment_reference,
+        PropertyExpense.gl_code,
+        PropertyExpense.export_status,
+        PropertyExpense.exported_at
+    ).order_by(PropertyExpense.bill_date.desc()).execution_options(stream_results=True, yield_per=1000)
     
-    # Headers
-    headers = ['Date', 'Property', 'Expense Type', 'Description', 'Amount (RM)', 
-               'Payment Status', 'Payment Date', 'Payment Reference', 'GL Code', 'Export Status', 'Exported At']
-    ws.append(headers)
-    
-    # Data rows and Status Update
+    # Rows written now are marked exported by one UPDATE afterwards
+    now = datetime.utcnow()
     export_count = 0
-    for exp in expenses:
-        # Update status if pending
-        if not exp.export_status or exp.export_status == 'pending':
-            exp.export_status = 'exported'
-            exp.exported_at = datetime.utcnow()
+    max_id = 0
+    
+    def to_row(exp):
+        nonlocal export_count, max_id
+        max_id = max(max_id, exp.id)
+        export_status, exported_at = exp.export_status, exp.exported_at
+        if not export_status or export_status == 'pending':
+            export_status, exported_at = 'exported', now
             export_count += 1
-            
-        ws.append([
-            exp.bill_date.strftime('%Y-%m-%d'),
-            exp.property.unit_number,
+        return [
+            exp.bill_date.strftime('%Y-%m-%d') if exp.bill_date else '',
+            exp.unit_number,
             exp.expense_type.replace('_', ' ').title(),
             exp.description or '',
             float(exp.amount),
@@ -1154,28 +1209,46 @@ def export_expenses():
             exp.payment_date.strftime('%Y-%m-%d') if exp.payment_date else '',
             exp.payment_reference or '',
             exp.gl_code or '',
-            exp.export_status,
-            exp.exported_at.strftime('%Y-%m-%d %H:%M:%S') if exp.exported_at else ''
-        ])
+            export_status,
+            exported_at.strftime('%Y-%m-%d %H:%M:%S') if exported_at else ''
+        ]
+    
+    # Headers
+    headers = ['Date', 'Property', 'Expense Type', 'Description', 'Amount (RM)', 
+               'Payment Status', 'Payment Date', 'Payment Reference', 'GL Code', 'Export Status', 'Exported At']
+    
+    # Write-only sheets need column widths before the first row, so size them from a sample
+    result = iter(rows)
+    sample = []
+    for exp in result:
+        sample.append(to_row(exp))
+        if len(sample) >= EXPORT_WIDTH_SAMPLE:
+            break
+    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Expenses")
+    for i, header in enumerate(headers):
+        max_length = max([len(header)] + [len(str(row[i])) for row in sample])
+        ws.column_dimensions[get_column_letter(i + 1)].width = max_length + 2
+    
+    ws.append(headers)
+    for row in sample:
+        ws.append(row)
+    for exp in result:
+        ws.append(to_row(exp))
     
     if export_count > 0:
+        # Same filters, pending only, capped at the last id written so rows added mid-export stay pending
+        exported_ids = query.filter(
+            (PropertyExpense.export_status == 'pending') | (PropertyExpense.export_status == None),
+            PropertyExpense.id <= max_id
+        ).with_entities(PropertyExpense.id)
+        PropertyExpense.query.filter(PropertyExpense.id.in_(exported_ids.scalar_subquery()))\
+            .update({'export_status': 'exported', 'exported_at': now}, synchronize_session=False)
         db.session.commit()
     
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to BytesIO
-    output = io.BytesIO()
+    # Save to a temp file (removed when the response closes it)
+    output = tempfile.TemporaryFile()
     wb.save(output)
     output.seek(0)
     
@@ -1,17 +1,14 @@
 
 from flask import Blueprint, render_template, request, send_file, flash, redirect, url_for
-from models import db, Invoice, InvoiceLineItem, Tenant
+from models import db, Invoice, InvoiceLineItem, Tenant, Project
 from datetime import datetime, date
+from dateutil.relativedelta import relativedelta
 from flask_login import login_required
 from routes.auth import role_required
 from utils import log_audit
-import io
-try:
-    import openpyxl
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side
-except ImportError:
-    openpyxl = None
+from utils_sst import iter_sst_invoices, SST_RATE
+from utils_revenue import get_revenue_by, REVENUE_LEVELS
+import tempfile
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -33,7 +30,12 @@ def sst_preparation():
         flash('Invalid Booking Date', 'error')
         return redirect(url_for('reports.sst_preparation'))
 
-    if not openpyxl:
+    # Imported on use: openpyxl alone adds about 0.1s to every worker start
+    try:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+    except ImportError:
         flash('Server missing openpyxl library', 'error')
         return redirect(url_for('billing.dashboard'))
 
@@ -42,79 +44,92 @@ def sst_preparation():
     # SST is usually accrual basis (Invoice Date) for most businesses, 
     # but payment basis for some. MySST guide usually implies accrual (Invoice Issued).
     # We will use Invoice Issue Date.
+    # One grouped query gives SST and base amounts per invoice; only invoices we charged SST on are listed.
+    rows = iter_sst_invoices(start_date, end_date)
     
-    invoices = Invoice.query.filter(
-        Invoice.issue_date >= start_date,
-        Invoice.issue_date <= end_date,
-        Invoice.status != 'void' # Exclude void
-    ).order_by(Invoice.issue_date).all()
+    # Write-only workbook: rows stream to disk as they are appended
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("SST Return Draft")
+    ws_tenant = wb.create_sheet("By Tenant")
+    ws_month = wb.create_sheet("By Month")
     
-    # Create Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "SST Return Draft"
+    def bold_row(sheet, values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        return cells
     
     # Headers matching MySST Requirement Concepts
     headers = [
         'Invoice Date', 'Invoice No', 'Tenant Name', 'SST Reg No', 
         'Description', 'Taxable Service Value (Field 10)', 
-        'SST 8% Charged (Field 12?)', 'Total Invoice Amount'
+        'SST 8% Charged (Field 12?)', 'Total Invoice Amount', 'Base Amount (excl. SST)'
     ]
-    
-    # Style Headers
-    ws.append(headers)
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='center')
+    ws.append(bold_row(ws, headers))
         
     total_taxable_value = 0.0
     total_tax_charged = 0.0
+    total_invoiced = 0.0
+    by_tenant = {} # tenant_id -> [name, sst no, invoices, taxable, tax, total]
+    by_month = {} # 'YYYY-MM' -> [invoices, taxable, tax, total]
     
-    for inv in invoices:
-        # We need to calculate how much of this invoice was taxable
-        # We look for 'sst' line items to confirm it is a taxable invoice
-        sst_lines = [li for li in inv.line_items if li.item_type == 'sst']
-        
-        if not sst_lines:
-            continue # Skip non-taxable invoices? 
-            # Or should we list them as "Exempt"? 
-            # User wants "Taxable units", so likely only those we charged SST.
-            
-        tax_amount = sum(li.amount for li in sst_lines)
+    for inv in rows:
+        tax_amount = float(inv.tax_amount or 0)
         
         # Calculate Taxable Value (The Base)
-        # Assuming Tax = Base * 0.08  => Base = Tax / 0.08
-        # OR Sum of all other line items? 
-        # Safer to reverse calculate from Tax Amount to avoid floating point issues relative to what was charged.
-        # But if we have mix of taxable and non-taxable items on one invoice, this is tricky.
-        # Current logic: If we charge SST, we charge it on everything (Rent). 
-        # Let's assume Base = Tax / 0.08
+        # Reverse calculated from the tax charged (Base = Tax / 8%) so it ties to what was billed;
+        # the base line total is listed alongside for invoices mixing taxable and non-taxable items.
+        taxable_value = tax_amount / float(SST_RATE)
+        invoice_total = inv.total_amount or 0
         
-        taxable_value = tax_amount / 0.08
-        
-        row = [
+        ws.append([
             inv.issue_date,
             f"#{inv.id}",
-            inv.tenant.name,
-            inv.tenant.sst_registration_number or '-',
+            inv.tenant_name,
+            inv.sst_registration_number or '-',
             inv.description,
             taxable_value,
             tax_amount,
-            inv.total_amount
-        ]
-        ws.append(row)
+            invoice_total,
+            float(inv.base_amount or 0)
+        ])
         
         total_taxable_value += taxable_value
         total_tax_charged += tax_amount
+        total_invoiced += invoice_total
+        
+        tenant_row = by_tenant.setdefault(inv.tenant_id, [inv.tenant_name, inv.sst_registration_number or '-', 0, 0.0, 0.0, 0.0])
+        tenant_row[2] += 1
+        tenant_row[3] += taxable_value
+        tenant_row[4] += tax_amount
+        tenant_row[5] += invoice_total
+        
+        month_row = by_month.setdefault(inv.issue_date.strftime('%Y-%m'), [0, 0.0, 0.0, 0.0])
+        month_row[0] += 1
+        month_row[1] += taxable_value
+        month_row[2] += tax_amount
+        month_row[3] += invoice_total
         
     # Summary Row
     ws.append([])
-    ws.append(['TOTAL', '', '', '', '', total_taxable_value, total_tax_charged])
-    ws['F' + str(ws.max_row)].font = Font(bold=True)
-    ws['G' + str(ws.max_row)].font = Font(bold=True)
+    ws.append(bold_row(ws, ['TOTAL', '', '', '', '', total_taxable_value, total_tax_charged, total_invoiced]))
+    
+    ws_tenant.append(bold_row(ws_tenant, ['Tenant Name', 'SST Reg No', 'Invoices', 'Taxable Service Value', 'SST Charged', 'Total Invoiced']))
+    for tenant_row in sorted(by_tenant.values(), key=lambda r: r[0]):
+        ws_tenant.append(tenant_row)
+    ws_tenant.append([])
+    ws_tenant.append(bold_row(ws_tenant, ['TOTAL', '', sum(r[2] for r in by_tenant.values()), total_taxable_value, total_tax_charged, total_invoiced]))
+    
+    ws_month.append(bold_row(ws_month, ['Month', 'Invoices', 'Taxable Service Value', 'SST Charged', 'Total Invoiced']))
+    for month in sorted(by_month):
+        ws_month.append([month] + by_month[month])
+    ws_month.append([])
+    ws_month.append(bold_row(ws_month, ['TOTAL', sum(r[0] for r in by_month.values()), total_taxable_value, total_tax_charged, total_invoiced]))
 
-    # Save
-    output = io.BytesIO()
+    # Save to a temp file (removed when the response closes it) instead of memory
+    output = tempfile.TemporaryFile()
     wb.save(output)
     output.seek(0)
     
@@ -136,3 +151,37 @@ def list_sst_exemptions():
     from models import SSTExemption
     exemptions = SSTExemption.query.join(Tenant).order_by(SSTExemption.start_date.desc()).all()
     return render_template('reports/sst_exemptions.html', exemptions=exemptions)
+
+@reports_bp.route('/revenue', methods=['GET'])
+@login_required
+@role_required('admin', 'accounts')
+def revenue():
+    """Billed revenue and yield per project / block / floor / unit for a range of months."""
+    today = date.today()
+    default_end = today.replace(day=1)
+    default_start = default_end - relativedelta(months=11)
+    
+    try:
+        start_month = datetime.strptime(request.args.get('start', ''), '%Y-%m').date()
+    except ValueError:
+        start_month = default_start
+    try:
+        end_month = datetime.strptime(request.args.get('end', ''), '%Y-%m').date()
+    except ValueError:
+        end_month = default_end
+    if end_month < start_month:
+        start_month, end_month = end_month, start_month
+    
+    level = request.args.get('level', 'project')
+    project = request.args.get('project') or None
+    
+    report = get_revenue_by(level, start_month, end_month, project)
+    projects = [p.name for p in Project.query.order_by(Project.name).all()]
+    
+    return render_template('reports/revenue.html',
+                         report=report,
+                         levels=REVENUE_LEVELS,
+                         projects=projects,
+                         project=project,
+                         start=start_month.strftime('%Y-%m'),
+                         end=end_month.strftime('%Y-%m'))
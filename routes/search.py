@@ -0,0 +1,39 @@
+from flask import Blueprint, render_template, request, jsonify, url_for
+from flask_login import login_required
+from utils_search import search, KINDS
+
+search_bp = Blueprint('search', __name__)
+
+SUGGEST_LIMIT = 8
+RESULTS_LIMIT = 50
+
+def result_url(kind, ref_id):
+    if kind == 'tenant':
+        return url_for('tenants.edit_tenant', id=ref_id)
+    if kind == 'property':
+        return url_for('properties.history', id=ref_id)
+    return url_for('billing.download_invoice_pdf', id=ref_id)
+
+@search_bp.route('/')
+@login_required
+def results():
+    q = request.args.get('q', '').strip()
+    kind = request.args.get('kind')
+    kinds = [kind] if kind in KINDS else None
+
+    grouped = {k: [] for k in KINDS}
+    for hit in search(q, kinds=kinds, limit=RESULTS_LIMIT):
+        hit['url'] = result_url(hit['kind'], hit['id'])
+        grouped[hit['kind']].append(hit)
+
+    return render_template('search/results.html', q=q, kind=kind, grouped=grouped)
+
+@search_bp.route('/suggest')
+@login_required
+def suggest():
+    # Typeahead for the sidebar search box
+    q = request.args.get('q', '').strip()
+    hits = search(q, limit=SUGGEST_LIMIT)
+    for hit in hits:
+        hit['url'] = result_url(hit['kind'], hit['id'])
+    return jsonify(hits)
@@ -4,16 +4,17 @@ from models import db, Tenant, Lease, Property
 import csv
 from datetime import datetime
 from datetime import datetime, date
-try:
-    import openpyxl
-    from openpyxl import Workbook
-except ImportError:
-    openpyxl = None
-    Workbook = None
 import io
+from time import perf_counter
 from flask_login import login_required, current_user
 from routes.auth import role_required
 from utils import log_audit
+from utils_tenant_lifecycle import run_tenant_lifecycle
+from utils_search import matching_ids
+from utils_units import find_property, load_unit_index
+from utils_dedup import refresh_duplicate_queue, merge_tenants, dismiss_duplicate
+from utils_bulk import delete_tenants, archive_tenants
+from utils_metrics import record_import
 
 tenants_bp = Blueprint('tenants', __name__)
 
@@ -24,30 +25,11 @@ def list_tenants():
     query = Tenant.query
     
     # Filter by Status
+    # effective_status is maintained by the lifecycle job (active / lapsed follow lease dates)
     status_filter = params.get('status')
-    today = date.today()
     
-    if status_filter:
-        if status_filter == 'active':
-            # Active = Status is active AND has at least one valid lease ending in future
-            query = query.filter(
-                Tenant.status == 'active',
-                Tenant.leases.any(Lease.end_date >= today)
-            )
-        elif status_filter == 'lapsed':
-            # Lapsed = Status is active BUT all leases are expired
-            query = query.filter(
-                Tenant.status == 'active',
-                ~Tenant.leases.any(Lease.end_date >= today)
-            )
-        elif status_filter == 'past':
-            # Past = Explicitly marked past
-            query = query.filter(Tenant.status == 'past')
-        elif status_filter == 'prospective':
-            query = query.filter(Tenant.status == 'prospective')
-        elif status_filter != 'all':
-            # Fallback
-            query = query.filter(Tenant.status == status_filter)
+    if status_filter and status_filter != 'all':
+        query = query.filter(Tenant.effective_status == status_filter)
     
     # Filter by Project
     project_filter = params.get('project')
@@ -60,19 +42,8 @@ def list_tenants():
     # Search Filter
     search_term = params.get('search')
     if search_term:
-        if not joined_lease:
-            query = query.outerjoin(Lease)
-            joined_lease = True
-            
-        term = f"%{search_term}%"
-        query = query.filter(
-            db.or_(
-                Tenant.name.ilike(term),
-                Tenant.account_code.ilike(term),
-                Lease.unit_number.ilike(term),
-                Lease.project.ilike(term)
-            )
-        )
+        # Name, account, reg no, TIN, unit numbers and projects via the FTS index
+        query = query.filter(Tenant.id.in_(matching_ids('tenant', search_term)))
 
     sort_col = params.get('sort')
     sort_order = params.get('order', 'asc')
@@ -589,6 +560,8 @@ def add_sst_exemption(id):
             # CREATE CREDIT NOTE
             cn = Invoice(
                 tenant_id=tenant.id,
+                lease_id=inv.lease_id,
+                property_id=inv.property_id,
                 issue_date=date.today(),
                 due_date=date.today(),
                 description=f"Credit Note: SST Adjustment for Inv #{inv.id}",
@@ -601,6 +574,8 @@ def add_sst_exemption(id):
             # Line Item
             item = InvoiceLineItem(
                 invoice_id=cn.id,
+                lease_id=inv.lease_id,
+                property_id=inv.property_id,
                 item_type='credit',
                 description=f"SST Refund ({description}) for Period {overlap_start} to {overlap_end}",
                 amount=-diff
@@ -668,7 +643,9 @@ def add_note(id):
 
 @tenants_bp.route('/download_template')
 def download_template():
-    if not openpyxl:
+    try:
+        from openpyxl import Workbook
+    except ImportError:
         return "Server config error: openpyxl missing", 500
 
     import tempfile
@@ -749,6 +726,7 @@ def import_tenants():
         return redirect(url_for('tenants.list_tenants'))
 
     try:
+        started = perf_counter()
         data_rows = []
         headers = []
 
@@ -758,7 +736,9 @@ def import_tenants():
             headers = csv_reader.fieldnames
             data_rows = list(csv_reader)
         else:
-            if not openpyxl:
+            try:
+                import openpyxl
+            except ImportError:
                 flash('Server missing openpyxl library', 'error')
                 return redirect(url_for('tenants.list_tenants'))
                 
@@ -792,6 +772,7 @@ def import_tenants():
 
         success_count = 0
         errors = []
+        unit_index = load_unit_index() # {unit_key: [Property]}, one query for the whole file
         
         for index, row in enumerate(data_rows):
             try:
@@ -871,23 +852,9 @@ def import_tenants():
                 if not start_date: start_date = date.today() 
                 if not end_date: end_date = date.today().replace(year=date.today().year + 1)
  
-                # Smart Linking Logic
-                # 1. Try exact match
-                prop_obj = Property.query.filter_by(unit_number=unit_no).first()
-                
-                # 2. Try Stripping Prefixes (e.g. KC2/1-3-7B -> 1-3-7B)
-                if not prop_obj and '/' in unit_no:
-                    cleaned_unit = unit_no.split('/')[-1].strip()
-                    prop_obj = Property.query.filter_by(unit_number=cleaned_unit).first()
-                    # If found, update our local unit_no to matches canonical property unit
-                    if prop_obj:
-                         unit_no = cleaned_unit
-
-                # 3. Try Prefix Match (Reverse: Import has '1-3-7B', DB has 'KC-1-3-7B')
-                if not prop_obj and proj and unit_no:
-                    # Try common variation
-                    candidate = f"{proj}-{unit_no}"
-                    prop_obj = Property.query.filter_by(unit_number=candidate).first()
+                # Smart Linking Logic: case, separators, KC2/ prefixes, project
+                # prefixes and "Lot" variants all resolve through the unit key
+                prop_obj = find_property(unit_no, proj, unit_index)
                     
                 # If found, use its canonical data
                 prop_id = None
@@ -942,6 +909,7 @@ def import_tenants():
                 errors.append(f"Error row {index}: {str(e)}")
         
         db.session.commit()
+        record_import('tenant', perf_counter() - started, imported=success_count, error=len(errors))
         flash(f'Imported {success_count} records. Alerts: {len(errors)}')
         for err in errors[:5]:
             flash(err)
@@ -954,49 +922,128 @@ def import_tenants():
 
 @tenants_bp.route('/bulk_delete', methods=['POST'])
 @login_required
+@role_required('admin', 'coordinator')
 def bulk_delete():
-    """Bulk delete tenants and all related data (leases, invoices, receipts, notes)"""
+    """Bulk delete tenants and all related data; {"dry_run": true} previews the per-table counts"""
+    data = request.get_json()
+    return _bulk_delete(data, dry_run=bool(data.get('dry_run')))
+
+@tenants_bp.route('/bulk_delete/preview', methods=['POST'])
+@login_required
+def bulk_delete_preview():
+    """Dry run of bulk_delete for anyone who can see the list; nothing is changed"""
+    return _bulk_delete(request.get_json(), dry_run=True)
+
+def _bulk_delete(data, dry_run):
     try:
-        data = request.get_json()
         tenant_ids = data.get('tenant_ids', [])
         
         if not tenant_ids:
             return jsonify({'status': 'error', 'message': 'No tenants selected'}), 400
         
-        deleted_count = 0
-        
-        # Import related models
-        from models import Invoice, Receipt, TenantNote
-        
-        for tenant_id in tenant_ids:
-            tenant = Tenant.query.get(int(tenant_id))
-            if not tenant:
-                continue
-            
-            # Delete all related data (cascade)
-            # 1. Delete receipts and invoices (invoices are linked to tenant)
-            for invoice in Invoice.query.filter_by(tenant_id=tenant.id).all():
-                Receipt.query.filter_by(invoice_id=invoice.id).delete()
-                db.session.delete(invoice)
-            
-            # 2. Delete leases
-            Lease.query.filter_by(tenant_id=tenant.id).delete()
-            
-            # 3. Delete notes
-            TenantNote.query.filter_by(tenant_id=tenant.id).delete()
-            
-            # 4. Delete tenant
-            db.session.delete(tenant)
-            deleted_count += 1
-        
-        db.session.commit()
+        counts = delete_tenants(tenant_ids, user_id=current_user.id, dry_run=dry_run)
+        deleted_count = counts.get('tenant', 0)
         
         return jsonify({
             'status': 'success',
+            'dry_run': dry_run,
             'deleted_count': deleted_count,
-            'message': f'Successfully deleted {deleted_count} tenant(s)'
+            'counts': counts,
+            'message': f'{"Would delete" if dry_run else "Successfully deleted"} {deleted_count} tenant(s)'
         })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@tenants_bp.route('/bulk_archive', methods=['POST'])
+@login_required
+@role_required('admin', 'coordinator')
+def bulk_archive():
+    """Marks the selected tenants as past; tenants with a running lease are skipped"""
+    try:
+        data = request.get_json()
+        tenant_ids = data.get('tenant_ids', [])
+        if not tenant_ids:
+            return jsonify({'status': 'error', 'message': 'No tenants selected'}), 400
+        
+        result = archive_tenants(tenant_ids, user_id=current_user.id)
+        message = f"Archived {result['archived']} tenant(s)"
+        if result['skipped_active']:
+            message += f", skipped {result['skipped_active']} with a running lease"
+        return jsonify({'status': 'success', 'message': message, **result})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@tenants_bp.route('/refresh_status', methods=['POST'])
+@login_required
+@role_required('admin', 'coordinator')
+def refresh_status():
+    """Runs the nightly lifecycle job now (e.g. when the scheduled run was missed)"""
+    result = run_tenant_lifecycle()
+    flash(f"Statuses updated: {result['effective_changes']} change(s) recorded in the audit log.", 'success')
+    return redirect(url_for('tenants.list_tenants'))
+
+@tenants_bp.route('/duplicates')
+@login_required
+@role_required('admin', 'coordinator')
+def duplicates():
+    """Review queue of likely duplicate tenants (rescan with the button or dedupe_tenants.py)"""
+    from models import Invoice, TenantDuplicate
+    status = request.args.get('status', 'pending')
+    pairs = TenantDuplicate.query.options(
+        db.joinedload(TenantDuplicate.tenant), db.joinedload(TenantDuplicate.duplicate)
+    ).filter(TenantDuplicate.status == status)\
+     .order_by(TenantDuplicate.score.desc(), TenantDuplicate.id).limit(200).all()
+
+    # Lease / invoice counts for every tenant on the page in two grouped queries
+    ids = {p.tenant_id for p in pairs} | {p.duplicate_id for p in pairs}
+    lease_counts = dict(db.session.query(Lease.tenant_id, db.func.count(Lease.id))
+                        .filter(Lease.tenant_id.in_(ids)).group_by(Lease.tenant_id).all())
+    invoice_counts = dict(db.session.query(Invoice.tenant_id, db.func.count(Invoice.id))
+                          .filter(Invoice.tenant_id.in_(ids)).group_by(Invoice.tenant_id).all())
+
+    return render_template('tenants/duplicates.html',
+                           pairs=pairs,
+                           status=status,
+                           lease_counts=lease_counts,
+                           invoice_counts=invoice_counts)
+
+@tenants_bp.route('/duplicates/scan', methods=['POST'])
+@login_required
+@role_required('admin', 'coordinator')
+def scan_duplicates():
+    result = refresh_duplicate_queue()
+    flash(f"Duplicate scan: {result['added']} new, {result['removed']} cleared, {result['pending']} pending review.")
+    return redirect(url_for('tenants.duplicates'))
+
+@tenants_bp.route('/duplicates/<int:id>/merge', methods=['POST'])
+@login_required
+@role_required('admin', 'coordinator')
+def merge_duplicate(id):
+    from models import TenantDuplicate
+    pair = TenantDuplicate.query.get_or_404(id)
+    if request.form.get('keep') == 'duplicate':
+        keep_id, merge_id = pair.duplicate_id, pair.tenant_id
+    else:
+        keep_id, merge_id = pair.tenant_id, pair.duplicate_id
+
+    try:
+        moved = merge_tenants(keep_id, merge_id, user_id=current_user.id)
+    except ValueError as e:
+        flash(f'Merge failed: {e}')
+        return redirect(url_for('tenants.duplicates'))
+
+    flash(f"Merged tenant #{merge_id} into #{keep_id}: {sum(moved.values())} records moved.")
+    return redirect(url_for('tenants.duplicates'))
+
+@tenants_bp.route('/duplicates/<int:id>/dismiss', methods=['POST'])
+@login_required
+@role_required('admin', 'coordinator')
+def dismiss_duplicate_pair(id):
+    from models import TenantDuplicate
+    TenantDuplicate.query.get_or_404(id)
+    dismiss_duplicate(id, user_id=current_user.id)
+    flash('Marked as not a duplicate.')
+    return redirect(url_for('tenants.duplicates'))
@@ -0,0 +1,70 @@
+import os
+import threading
+import traceback
+from datetime import datetime
+
+from flask import current_app
+from flask_login import current_user
+
+from models import db, Job
+
+class JobService:
+    """
+    Runs long tasks (bulk printing, exports) in a background thread.
+
+    The Job row is the only shared state: the worker writes progress to it and
+    the browser polls /jobs/<id>. Targets receive (job_id, *args) and return the
+    path of the file they produced, or None.
+    """
+
+    @staticmethod
+    def start(kind, description, target, *args, **kwargs):
+        user_id = current_user.id if (current_user and current_user.is_authenticated) else None
+        job = Job(kind=kind, description=description, status='queued', created_by=user_id)
+        db.session.add(job)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        job_id = job.id
+
+        def run():
+            with app.app_context():
+                JobService.update(job_id, status='running', started_at=datetime.utcnow())
+                try:
+                    result_path = target(job_id, *args, **kwargs)
+                    JobService.update(job_id, status='done', result_path=result_path, finished_at=datetime.utcnow())
+                except Exception:
+                    db.session.rollback()
+                    error = traceback.format_exc()
+                    print(f"Job {job_id} failed: {error}")
+                    JobService.update(job_id, status='failed', error=error[-2000:], finished_at=datetime.utcnow())
+                finally:
+                    db.session.remove()
+
+        threading.Thread(target=run, name=f"job-{job_id}", daemon=True).start()
+        return job
+
+    @staticmethod
+    def update(job_id, **values):
+        """Single UPDATE so progress writes never touch stale ORM state."""
+        Job.query.filter_by(id=job_id).update(values, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def progress_callback(job_id, every=25):
+        """Returns progress(completed, total) that writes at most every `every` items."""
+        state = {'last': -every}
+
+        def progress(completed, total):
+            if completed - state['last'] >= every or completed == total:
+                state['last'] = completed
+                JobService.update(job_id, completed=completed, total=total)
+
+        return progress
+
+    @staticmethod
+    def output_path(job_id, filename):
+        """Job outputs live in instance/exports so they are never web-served directly."""
+        folder = os.path.join(current_app.instance_path, 'exports')
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"job_{job_id}_{filename}")
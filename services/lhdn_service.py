@@ -1,20 +1,13 @@
-import requests
 import json
 import hashlib
 import base64
 from datetime import datetime, timedelta
 import io
-from cryptography.hazmat.primitives.serialization import pkcs12
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography import x509
-from lxml import etree
 import uuid
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.serialization.pkcs12 import load_key_and_certificates
 import os
 
 from models import db, MyInvoisConfig, Invoice
+from utils_metrics import inc
 
 class LHDNService:
     # API Endpoints (Sandbox)
@@ -39,6 +32,10 @@ class LHDNService:
 
     def get_access_token(self):
         """Authenticates with LHDN Identity Server and returns access token"""
+        # requests, cryptography and lxml are imported where used: loading them
+        # with the module would slow down every worker that touches LHDN pages
+        import requests
+
         # Check cache
         if self._access_token and datetime.utcnow() < (self._token_expiry - timedelta(minutes=5)):
             return self._access_token
@@ -83,6 +80,7 @@ class LHDNService:
 
     def validate_tin(self, tin):
         """Validates a TIN using the API"""
+        import requests
         try:
             token = self.get_access_token()
             headers = {'Authorization': f'Bearer {token}'}
@@ -99,6 +97,7 @@ class LHDNService:
         2. Crypto Sign Payload
         3. Submit to API
         """
+        import requests
         invoice = Invoice.query.get(invoice_id)
         if not invoice:
             raise ValueError("Invoice not found")
@@ -201,17 +200,21 @@ class LHDNService:
                 invoice.lhdn_status = 'Submitted'
                 invoice.lhdn_submission_date = datetime.utcnow()
                 db.session.commit()
+                inc('lhdn_submissions_total', result='submitted')
                 return submission_uid
             
             # Check if rejected
             if 'rejectedDocuments' in resp_data and resp_data['rejectedDocuments']:
                  error = resp_data['rejectedDocuments'][0].get('error', 'Unknown Error')
                  details = resp_data['rejectedDocuments'][0].get('details', '')
+                 inc('lhdn_submissions_total', result='rejected')
                  return f"Rejected: {error} - {details}"
 
+            inc('lhdn_submissions_total', result='no_uid')
             return "No UID returned (Check Logs)"
             
         except requests.exceptions.RequestException as e:
+            inc('lhdn_submissions_total', result='error')
             error_msg = str(e)
             if e.response is not None:
                 error_msg += f" | {e.response.text}"
@@ -355,6 +358,11 @@ class LHDNService:
         """
         Signs the XML payload using XAdES-EPES (Enveloped Signature).
         """
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+        from cryptography.hazmat.primitives.serialization import pkcs12
+        from lxml import etree
+
         # Load Certificate and Private Key
         p12_path = current_app.config['LHDN_CERT_PATH']
         p12_password = current_app.config['LHDN_CERT_PASS'].encode('utf-8')
@@ -0,0 +1,23 @@
+from app import create_app
+from datetime import date, datetime
+import sys
+
+from utils_rent_roll import take_occupancy_snapshot, backfill_occupancy_snapshots, get_occupancy_trend
+
+def snapshot(as_of=None):
+    """Stores today's rent roll totals and fills any missing month starts for the 24-month trend. Run nightly."""
+    app = create_app()
+    with app.app_context():
+        as_of = as_of or date.today()
+        count = take_occupancy_snapshot(as_of)
+        print(f"Occupancy snapshot for {as_of.isoformat()}: {count} projects.")
+        filled = backfill_occupancy_snapshots(24, as_of)
+        if filled:
+            print(f"Rebuilt {len(filled)} missing month starts from lease history.")
+        trend = get_occupancy_trend(24, as_of)
+        if trend['total_units'][-1]:
+            print(f"Occupancy on {trend['labels'][-1]}: {trend['occupancy'][-1]}% "
+                  f"({trend['occupied_units'][-1]}/{trend['total_units'][-1]} units)")
+
+if __name__ == '__main__':
+    snapshot(datetime.strptime(sys.argv[1], '%Y-%m-%d').date() if len(sys.argv) > 1 else None)
@@ -0,0 +1,94 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Cold-start time of a server worker (what Passenger pays on every spawn):
+#
+#   python startup_benchmark.py [--runs 5] [--imports]
+#
+# Each run is a fresh interpreter that imports app, calls create_app() and
+# serves its first request (the login page). Prints the median of each step
+# and exits 1 when the total is over TARGET_SECONDS. --imports also lists the
+# slowest top-level imports, to find what to import lazily.
+
+TARGET_SECONDS = 1.0
+IMPORT_REPORT = 15
+
+# Runs in the child process; prints one JSON line of step timings
+CHILD = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get('/login')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - started, 'create_app': created - imported, 'first_request': served - created}))
+"""
+
+STEPS = ['import', 'create_app', 'first_request']
+
+def measure():
+    """Step timings of one cold start, in seconds."""
+    env = dict(os.environ, INSTRUMENTATION_LOG='') # No requests.log from the benchmark
+    result = subprocess.run([sys.executable, '-c', CHILD], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise SystemExit(f"Startup failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def slowest_imports(limit=IMPORT_REPORT):
+    """[(seconds, module)] for the slowest imports directly under app, from python -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    imports, pending = [], []
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | <2 spaces per level>package", children before their parent
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            pending.append((int(cumulative) / 1e6, name.strip()))
+        elif depth == 0:
+            if name.strip() == 'app':
+                imports = pending
+            pending = []
+    return sorted(imports, reverse=True)[:limit]
+
+def run(runs=5, imports=False):
+    measure() # Warm-up: fills the bytecode cache and the OS file cache
+    timings = [measure() for _ in range(runs)]
+    medians = {step: statistics.median(t[step] for t in timings) for step in STEPS}
+    total = sum(medians.values())
+
+    print(f"Cold start, median of {runs} runs:")
+    for step in STEPS:
+        print(f"  {step:<14} {medians[step] * 1000:>8.1f} ms")
+    print(f"  {'total':<14} {total * 1000:>8.1f} ms (target {TARGET_SECONDS * 1000:.0f} ms)")
+
+    if imports:
+        print("Slowest imports:")
+        for seconds, name in slowest_imports():
+            print(f"  {name:<40} {seconds * 1000:>8.1f} ms")
+
+    if total > TARGET_SECONDS:
+        print("Over target.")
+        return 1
+    return 0
+
+def _option(args, name, default, cast=str):
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    sys.exit(run(
+        runs=_option(args, '--runs', 5, int),
+        imports='--imports' in args
+    ))
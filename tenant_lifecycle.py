@@ -0,0 +1,17 @@
+from app import create_app
+import sys
+
+from utils_tenant_lifecycle import run_tenant_lifecycle
+
+def run(dry_run=False):
+    """Updates tenants' effective status from lease dates. Safe to run nightly (cron / Task Scheduler)."""
+    app = create_app()
+    with app.app_context():
+        result = run_tenant_lifecycle(dry_run=dry_run)
+        for tenant_id, field, old, new, reason in result['transitions']:
+            print(f"Tenant {tenant_id}: {field} {old or '-'} -> {new} ({reason})")
+        print(f"{'[DRY RUN] ' if dry_run else ''}Effective status changes: {result['effective_changes']}, "
+              f"first-time fills: {result['initialised']}")
+
+if __name__ == '__main__':
+    run(dry_run='--dry-run' in sys.argv)
@@ -79,6 +79,37 @@ def get_tenant_ledger_status(tenant_id):
         'outstanding_rent_items': [], # Placeholder - see full rewrite below
     }
 
+def waterfall_priority(item_type, due_date):
+    """
+    Sort key for payment allocation: Late Fee (1) -> Rent (2) -> Other (3) -> Date.
+    Shared by the per-tenant ledger and the batch aging engine (utils_aging).
+    """
+    p = 3
+    if item_type == 'late_fee': p = 1
+    elif item_type == 'rent': p = 2
+    return (p, due_date)
+
+def allocate_payments(items, total_paid):
+    """
+    Applies total_paid to items (already in waterfall order).
+    Returns copies of the items left with a balance, each carrying 'unpaid_amount'.
+    """
+    unpaid_items = []
+
+    for item in items:
+        if total_paid >= item['amount']:
+            total_paid -= item['amount']
+        else:
+            # Partial or Unpaid
+            covered = total_paid
+            total_paid = 0
+            remaining = item['amount'] - covered
+
+            if remaining > 0.005: # Float tolerance
+                unpaid_items.append(dict(item, unpaid_amount=remaining))
+
+    return unpaid_items
+
 def get_tenant_unpaid_items(tenant_id):
     """
     Returns list of specific unpaid line items after waterfall allocation.
@@ -102,30 +133,9 @@ def get_tenant_unpaid_items(tenant_id):
             })
             
     # Sort Priority: Late Fee (1) -> Rent (2) -> Other (3) -> Date
-    def sort_key(i):
-        p = 3
-        if i['type'] == 'late_fee': p = 1
-        elif i['type'] == 'rent': p = 2
-        return (p, i['due_date'])
-        
-    items.sort(key=sort_key)
-    
-    unpaid_items = []
-    
-    for item in items:
-        if total_paid >= item['amount']:
-            total_paid -= item['amount']
-        else:
-            # Partial or Unpaid
-            covered = total_paid
-            total_paid = 0
-            remaining = item['amount'] - covered
-            
-            if remaining > 0.005: # Float tolerance
-                item['unpaid_amount'] = remaining
-                unpaid_items.append(item)
-                
-    return unpaid_items
+    items.sort(key=lambda i: waterfall_priority(i['type'], i['due_date']))
+
+    return allocate_payments(items, total_paid)
 
 def log_audit(action, target_type, target_id, details=""):
     """
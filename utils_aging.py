@@ -0,0 +1,212 @@
+from bisect import insort
+from collections import defaultdict
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+from models import db, Invoice, InvoiceLineItem, Receipt
+from utils import waterfall_priority, allocate_payments
+
+# Bucket keys match the columns of billing/aging.html
+AGING_BUCKETS = ['current', 'd1_30', 'd31_60', 'd61_90', 'over_90']
+
+AGING_BUCKET_LABELS = {
+    'current': 'Current',
+    'd1_30': '1-30 Days',
+    'd31_60': '31-60 Days',
+    'd61_90': '61-90 Days',
+    'over_90': '>90 Days'
+}
+
+def aging_bucket(days_overdue):
+    """Maps days past due date to an aging bucket key."""
+    if days_overdue <= 0:
+        return 'current'
+    elif days_overdue <= 30:
+        return 'd1_30'
+    elif days_overdue <= 60:
+        return 'd31_60'
+    elif days_overdue <= 90:
+        return 'd61_90'
+    return 'over_90'
+
+# Demand letter severity, escalating with the oldest overdue item
+LETTER_SEVERITIES = ['Reminder', 'Demand Letter', 'Final Notice']
+
+def letter_severity(max_days_overdue):
+    """Maps the oldest item's days overdue to a demand letter severity."""
+    if max_days_overdue > 90:
+        return "Final Notice"
+    elif max_days_overdue > 30:
+        return "Demand Letter"
+    return "Reminder"
+
+def month_end_dates(count, reference=None):
+    """
+    Returns the last `count` completed month-ends before `reference` (default today),
+    oldest first. e.g. count=12 on 15 Mar 2025 -> 31 Mar 2024 ... 28 Feb 2025.
+    """
+    reference = reference or date.today()
+    last_month_end = reference.replace(day=1) - timedelta(days=1)
+
+    dates = []
+    for i in range(count - 1, -1, -1):
+        d = last_month_end - relativedelta(months=i)
+        dates.append((d.replace(day=1) + relativedelta(months=1)) - timedelta(days=1))
+    return dates
+
+def get_unpaid_items_as_of(as_of_dates, tenant_ids=None):
+    """
+    Reconstructs each tenant's unpaid line items at every date in as_of_dates.
+
+    An invoice counts from its issue date, a receipt from its date_received.
+    Both are fetched once, date-sorted, and replayed in a single sweep; at each
+    as-of date the tenant's receipts to date are run through the same waterfall
+    as get_tenant_unpaid_items.
+
+    Returns:
+        dict: {as_of: {tenant_id: [unpaid item dicts]}}
+    """
+    dates = sorted(set(as_of_dates))
+    if not dates:
+        return {}
+    horizon = dates[-1]
+
+    # Voided invoices are excluded at every date (we do not keep a void date)
+    item_date = db.func.coalesce(Invoice.issue_date, Invoice.due_date)
+    item_query = db.session.query(
+        InvoiceLineItem.id,
+        InvoiceLineItem.item_type,
+        InvoiceLineItem.description,
+        InvoiceLineItem.amount,
+        Invoice.id.label('invoice_id'),
+        Invoice.tenant_id,
+        Invoice.due_date,
+        item_date.label('event_date')
+    ).join(Invoice, InvoiceLineItem.invoice_id == Invoice.id)\
+     .filter(Invoice.status != 'void', item_date <= horizon)
+
+    receipt_query = db.session.query(
+        Receipt.tenant_id,
+        Receipt.amount,
+        Receipt.date_received.label('event_date')
+    ).filter(db.or_(Receipt.date_received == None, Receipt.date_received <= horizon))
+
+    if tenant_ids is not None:
+        item_query = item_query.filter(Invoice.tenant_id.in_(tenant_ids))
+        receipt_query = receipt_query.filter(Receipt.tenant_id.in_(tenant_ids))
+
+    items = item_query.order_by(item_date, Invoice.id, InvoiceLineItem.id).all()
+    receipts = receipt_query.order_by(Receipt.date_received).all()
+
+    ledgers = defaultdict(list) # tenant_id -> [(sort_key, item)] in waterfall order
+    paid = defaultdict(float)
+    item_pos = 0
+    receipt_pos = 0
+    snapshots = {}
+
+    for as_of in dates:
+        # Advance both event streams up to this date
+        while item_pos < len(items) and items[item_pos].event_date <= as_of:
+            row = items[item_pos]
+            item = {
+                'id': row.id,
+                'type': row.item_type,
+                'amount': row.amount,
+                'due_date': row.due_date,
+                'invoice_id': row.invoice_id,
+                'description': row.description
+            }
+            key = waterfall_priority(row.item_type, row.due_date) + (row.invoice_id, row.id)
+            insort(ledgers[row.tenant_id], (key, item), key=lambda entry: entry[0])
+            item_pos += 1
+
+        while receipt_pos < len(receipts) and (receipts[receipt_pos].event_date is None or receipts[receipt_pos].event_date <= as_of):
+            row = receipts[receipt_pos]
+            paid[row.tenant_id] += row.amount
+            receipt_pos += 1
+
+        snapshot = {}
+        for tenant_id, ledger in ledgers.items():
+            unpaid = allocate_payments([item for _, item in ledger], paid.get(tenant_id, 0))
+            if unpaid:
+                snapshot[tenant_id] = unpaid
+        snapshots[as_of] = snapshot
+
+    return snapshots
+
+def summarize_aging(unpaid_items, as_of):
+    """Buckets unpaid items by days overdue relative to as_of."""
+    row = {'total': 0}
+    for key in AGING_BUCKETS:
+        row[key] = 0
+
+    for item in unpaid_items:
+        amount = item['unpaid_amount']
+        row['total'] += amount
+        row[aging_bucket((as_of - item['due_date']).days)] += amount
+
+    row['overdue'] = row['total'] - row['current']
+    return row
+
+def get_aging_history(as_of_dates, tenant_ids=None, by_tenant=False):
+    """
+    Portfolio aging totals at each date, oldest first.
+    With by_tenant=True each row also carries a 'tenants' dict of per-tenant rows.
+    """
+    snapshots = get_unpaid_items_as_of(as_of_dates, tenant_ids=tenant_ids)
+
+    history = []
+    for as_of in sorted(snapshots):
+        per_tenant = {
+            tenant_id: summarize_aging(unpaid, as_of)
+            for tenant_id, unpaid in snapshots[as_of].items()
+        }
+
+        row = {'as_of': as_of, 'tenant_count': 0, 'total': 0, 'overdue': 0}
+        for key in AGING_BUCKETS:
+            row[key] = 0
+        for tenant_row in per_tenant.values():
+            if tenant_row['total'] <= 0.01:
+                continue
+            row['tenant_count'] += 1
+            for key in AGING_BUCKETS + ['total', 'overdue']:
+                row[key] += tenant_row[key]
+
+        if by_tenant:
+            row['tenants'] = per_tenant
+        history.append(row)
+
+    return history
+
+def get_current_unpaid_items(tenant_ids=None):
+    """
+    Batch equivalent of get_tenant_unpaid_items: every invoice and receipt on file,
+    regardless of date. Returns {tenant_id: [unpaid item dicts]}.
+    """
+    return get_unpaid_items_as_of([date.max], tenant_ids=tenant_ids)[date.max]
+
+def select_demand_letters(snapshot, as_of, min_severity='Demand Letter'):
+    """
+    Picks tenants due a letter of at least min_severity from an unpaid-items
+    snapshot ({tenant_id: [items]}). Tenants with nothing past due are skipped.
+    Returns letter dicts sorted by total due, largest first.
+    """
+    threshold = LETTER_SEVERITIES.index(min_severity)
+
+    letters = []
+    for tenant_id, items in snapshot.items():
+        max_days_overdue = max((as_of - i['due_date']).days for i in items)
+        if max_days_overdue <= 0:
+            continue
+        severity = letter_severity(max_days_overdue)
+        if LETTER_SEVERITIES.index(severity) < threshold:
+            continue
+        letters.append({
+            'tenant_id': tenant_id,
+            'items': items,
+            'total_due': sum(i['unpaid_amount'] for i in items),
+            'max_days_overdue': max_days_overdue,
+            'severity': severity
+        })
+
+    letters.sort(key=lambda l: l['total_due'], reverse=True)
+    return letters
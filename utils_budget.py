@@ -0,0 +1,173 @@
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from models import db, Property, Project, PropertyExpense, ExpenseBudgetRollup, EXPENSE_GL_CODES
+
+# Property field holding the expected cost for each expense type, and the
+# months it covers (annual charges are accrued evenly over 12 months)
+EXPECTED_COST_FIELDS = {
+    'quit_rent': ('expected_quit_rent', 12),
+    'assessment': ('expected_assessment', 12),
+    'fire_insurance': ('expected_fire_insurance', 12),
+    'management_fee': ('expected_management_fee', 1),
+    'sinking_fund': ('expected_sinking_fund', 1),
+    'water': ('expected_water', 1)
+}
+
+GL_EXPENSE_TYPES = {gl_code: expense_type for expense_type, gl_code in EXPENSE_GL_CODES.items()}
+
+def month_range(start_month, end_month):
+    """First-of-month dates from start_month to end_month inclusive."""
+    months = []
+    current = start_month.replace(day=1)
+    while current <= end_month:
+        months.append(current)
+        current += relativedelta(months=1)
+    return months
+
+def expense_gl_code():
+    """SQL expression: the expense's own GL code, else the default code for its type."""
+    default_code = db.case(EXPENSE_GL_CODES, value=PropertyExpense.expense_type, else_=EXPENSE_GL_CODES['other'])
+    return db.func.coalesce(db.func.nullif(PropertyExpense.gl_code, ''), default_code)
+
+def get_expected_costs(months, property_ids=None):
+    """
+    Projected cost per (month, property_id, gl_code) from the Property expected_* fields.
+    Archived properties stop accruing after the month they were archived.
+    """
+    fields = [field for field, _ in EXPECTED_COST_FIELDS.values()]
+    query = db.session.query(
+        Property.id, Property.archived, Property.archived_date,
+        *[getattr(Property, field) for field in fields]
+    )
+    if property_ids is not None:
+        query = query.filter(Property.id.in_(property_ids))
+
+    expected = {}
+    for row in query:
+        monthly = {}
+        for expense_type, (field, months_covered) in EXPECTED_COST_FIELDS.items():
+            amount = getattr(row, field) or 0
+            if amount:
+                monthly[EXPENSE_GL_CODES[expense_type]] = amount / months_covered
+        if not monthly:
+            continue
+
+        for month in months:
+            if row.archived and (not row.archived_date or row.archived_date.date() < month):
+                continue
+            for gl_code, amount in monthly.items():
+                expected[(month, row.id, gl_code)] = amount
+    return expected
+
+def get_actual_costs(start_month, end_month, property_ids=None):
+    """Actual cost per (month, property_id, gl_code), summed in SQL by bill date."""
+    month = db.func.strftime('%Y-%m', PropertyExpense.bill_date)
+    gl_code = expense_gl_code()
+    query = db.session.query(
+        month, PropertyExpense.property_id, gl_code, db.func.sum(PropertyExpense.amount)
+    ).filter(
+        PropertyExpense.bill_date >= start_month,
+        PropertyExpense.bill_date < end_month + relativedelta(months=1)
+    ).group_by(month, PropertyExpense.property_id, gl_code)
+    if property_ids is not None:
+        query = query.filter(PropertyExpense.property_id.in_(property_ids))
+
+    actual = {}
+    for month_str, property_id, code, amount in query:
+        year, mon = map(int, month_str.split('-'))
+        actual[(date(year, mon, 1), property_id, code)] = float(amount or 0)
+    return actual
+
+def compute_budget(start_month, end_month, property_ids=None):
+    """Expected vs actual rows per month, property and GL code."""
+    months = month_range(start_month, end_month)
+    expected = get_expected_costs(months, property_ids)
+    actual = get_actual_costs(months[0], months[-1], property_ids)
+
+    return [
+        {
+            'month': key[0],
+            'property_id': key[1],
+            'gl_code': key[2],
+            'expected': expected.get(key, 0.0),
+            'actual': actual.get(key, 0.0)
+        }
+        for key in sorted(set(expected) | set(actual))
+    ]
+
+def refresh_budget_rollups(start_month, end_month):
+    """Rebuilds ExpenseBudgetRollup for the months in range. Returns rows written."""
+    start_month = start_month.replace(day=1)
+    end_month = end_month.replace(day=1)
+    rows = compute_budget(start_month, end_month)
+
+    ExpenseBudgetRollup.query.filter(
+        ExpenseBudgetRollup.month >= start_month,
+        ExpenseBudgetRollup.month <= end_month
+    ).delete(synchronize_session=False)
+
+    if rows:
+        now = datetime.utcnow()
+        db.session.execute(ExpenseBudgetRollup.__table__.insert(), [dict(row, refreshed_at=now) for row in rows])
+    db.session.commit()
+    return len(rows)
+
+def variance(expected, actual):
+    """Variance figures for one row; positive variance = over budget."""
+    expected = float(expected or 0)
+    actual = float(actual or 0)
+    return {
+        'expected': expected,
+        'actual': actual,
+        'variance': actual - expected,
+        'variance_pct': ((actual - expected) / expected * 100) if expected else None
+    }
+
+def _variance_rows(query, keys):
+    return [dict({key: getattr(row, key) for key in keys}, **variance(row.expected, row.actual)) for row in query]
+
+def get_variance_report(year, project=None):
+    """
+    Expected vs actual for a year from the monthly rollups: totals by project,
+    by month, by GL code, and by property when a project is selected.
+    The year is rolled up first if it never has been.
+    """
+    start_month = date(year, 1, 1)
+    end_month = date(year, 12, 1)
+    in_year = db.and_(ExpenseBudgetRollup.month >= start_month, ExpenseBudgetRollup.month <= end_month)
+
+    refreshed_at = db.session.query(db.func.max(ExpenseBudgetRollup.refreshed_at)).filter(in_year).scalar()
+    if refreshed_at is None:
+        refresh_budget_rollups(start_month, end_month)
+        refreshed_at = db.session.query(db.func.max(ExpenseBudgetRollup.refreshed_at)).filter(in_year).scalar()
+
+    project_name = db.func.coalesce(Project.name, Property.project, 'Unassigned')
+    expected = db.func.sum(ExpenseBudgetRollup.expected).label('expected')
+    actual = db.func.sum(ExpenseBudgetRollup.actual).label('actual')
+
+    def grouped(*columns):
+        query = db.session.query(*columns, expected, actual)\
+            .join(Property, ExpenseBudgetRollup.property_id == Property.id)\
+            .outerjoin(Project, Property.project_id == Project.id)\
+            .filter(in_year)
+        if project:
+            query = query.filter(project_name == project)
+        return query.group_by(*columns).order_by(*columns)
+
+    report = {
+        'year': year,
+        'project': project,
+        'refreshed_at': refreshed_at,
+        'by_project': _variance_rows(grouped(project_name.label('project')), ['project']),
+        'by_month': _variance_rows(grouped(ExpenseBudgetRollup.month), ['month']),
+        'by_gl': _variance_rows(grouped(ExpenseBudgetRollup.gl_code), ['gl_code']),
+        'by_property': []
+    }
+    if project:
+        report['by_property'] = _variance_rows(grouped(Property.id, Property.unit_number), ['id', 'unit_number'])
+    for row in report['by_gl']:
+        row['expense_type'] = GL_EXPENSE_TYPES.get(row['gl_code'], 'other')
+
+    report['total'] = variance(sum(r['expected'] for r in report['by_project']),
+                               sum(r['actual'] for r in report['by_project']))
+    return report
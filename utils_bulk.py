@@ -0,0 +1,246 @@
+from datetime import date, datetime
+
+from sqlalchemy import select, update, delete, exists
+
+from models import (
+    db, Tenant, Lease, Property, Invoice, InvoiceLineItem, LateFeeSource, Receipt, Commission,
+    SSTExemption, TenantNote, TenantDuplicate, LeaseLedgerSummary, PropertyExpense, ExpenseBudgetRollup, AuditLog
+)
+from utils_expenses import invalidate_expense_totals
+from utils_lease_ledger import refresh_lease_summaries
+from utils_lease_timeline import refresh_latest_lease_end
+from utils_tenant_lifecycle import refresh_effective_status, SYSTEM_USER_ID, TERMINAL_STATUSES
+
+# Search index documents are dropped by the search_* triggers on tenant, lease,
+# property and invoice, so they need no statement of their own here.
+
+def _run_steps(conn, steps):
+    """
+    Executes (label, statement) steps in order; returns {label: rows affected}
+    with zero counts left out. Labels of UPDATE steps name what was unlinked.
+    """
+    counts = {}
+    for label, stmt in steps:
+        rows = conn.execute(stmt).rowcount
+        if rows:
+            counts[label] = counts.get(label, 0) + rows
+    return counts
+
+def _invoice_steps(invoice_ids, lease_ids):
+    """
+    Statements removing everything hanging off a set of invoices and leases
+    (both given as subqueries), children first. Rows that merely point at
+    them from outside the set are unlinked instead of deleted.
+    """
+    line_items = InvoiceLineItem.__table__
+    line_item_ids = select(line_items.c.id).where(line_items.c.invoice_id.in_(invoice_ids))
+    late_fees = LateFeeSource.__table__
+    receipts = Receipt.__table__
+    invoices = Invoice.__table__
+    expenses = PropertyExpense.__table__
+    summaries = LeaseLedgerSummary.__table__
+    commissions = Commission.__table__
+    return [
+        ('late_fee_source', delete(late_fees).where(db.or_(
+            late_fees.c.line_item_id.in_(line_item_ids), late_fees.c.source_invoice_id.in_(invoice_ids)
+        ))),
+        ('invoice_line_item', delete(line_items).where(line_items.c.invoice_id.in_(invoice_ids))),
+        ('receipt', delete(receipts).where(receipts.c.invoice_id.in_(invoice_ids))),
+        # Expenses charged back to a deleted invoice stay, without the link
+        ('property_expense unlinked', update(expenses).where(expenses.c.tenant_invoice_id.in_(invoice_ids))
+         .values(tenant_invoice_id=None)),
+        ('invoice', delete(invoices).where(invoices.c.id.in_(invoice_ids))),
+        # Invoices of other tenants can still name a deleted lease
+        ('invoice unlinked', update(invoices).where(invoices.c.lease_id.in_(lease_ids)).values(lease_id=None)),
+        ('invoice_line_item unlinked', update(line_items).where(line_items.c.lease_id.in_(lease_ids))
+         .values(lease_id=None)),
+        ('commission', delete(commissions).where(commissions.c.lease_id.in_(lease_ids))),
+        ('lease_ledger_summary', delete(summaries).where(summaries.c.lease_id.in_(lease_ids))),
+    ]
+
+def _vacate_properties(property_ids):
+    """Occupied properties among property_ids left without a running lease go back to vacant."""
+    today = date.today()
+    prop, lease = Property.__table__, Lease.__table__
+    running = exists().where(lease.c.property_id == prop.c.id, lease.c.start_date <= today, lease.c.end_date >= today)
+    return update(prop).where(prop.c.id.in_(property_ids), prop.c.status == 'occupied', ~running).values(status='vacant')
+
+def _finish(counts, dry_run, user_id, action, target_type, details):
+    if dry_run:
+        db.session.rollback()
+        return counts
+    summary = ', '.join(f"{count} {label}" for label, count in counts.items()) or 'nothing'
+    db.session.add(AuditLog(
+        user_id=user_id or SYSTEM_USER_ID,
+        action=action,
+        target_type=target_type,
+        target_id=0,
+        details=f"{details} ({summary})"
+    ))
+    db.session.commit()
+    return counts
+
+def delete_tenants(tenant_ids, user_id=None, dry_run=False):
+    """
+    Deletes tenants with everything that belongs to them: leases and their
+    commissions and ledger summaries, invoices with their line items,
+    late-fee sources and receipts, unallocated receipts, notes, SST
+    exemptions and duplicate-queue entries. One statement per table
+    whatever the number of tenants, in one transaction with the audit entry.
+    dry_run runs the same statements and rolls back.
+
+    Returns:
+        dict: {table_name: rows deleted, 'table unlinked': rows unlinked}
+    """
+    tenant_ids = sorted({int(t) for t in tenant_ids})
+    tenants = Tenant.__table__
+    invoice_ids = select(Invoice.__table__.c.id).where(Invoice.__table__.c.tenant_id.in_(tenant_ids))
+    lease_ids = select(Lease.__table__.c.id).where(Lease.__table__.c.tenant_id.in_(tenant_ids))
+    duplicates = TenantDuplicate.__table__
+
+    try:
+        conn = db.session.connection()
+        # Captured first: once the leases are gone nothing says which units they held
+        property_ids = conn.execute(
+            select(Lease.property_id).where(Lease.tenant_id.in_(tenant_ids), Lease.property_id != None).distinct()
+        ).scalars().all()
+
+        steps = _invoice_steps(invoice_ids, lease_ids) + [
+            ('receipt', delete(Receipt.__table__).where(Receipt.__table__.c.tenant_id.in_(tenant_ids))),
+            ('lease_ledger_summary', delete(LeaseLedgerSummary.__table__)
+             .where(LeaseLedgerSummary.__table__.c.tenant_id.in_(tenant_ids))),
+            ('lease', delete(Lease.__table__).where(Lease.__table__.c.tenant_id.in_(tenant_ids))),
+            ('tenant_note', delete(TenantNote.__table__).where(TenantNote.__table__.c.tenant_id.in_(tenant_ids))),
+            ('sst_exemption', delete(SSTExemption.__table__)
+             .where(SSTExemption.__table__.c.tenant_id.in_(tenant_ids))),
+            ('tenant_duplicate', delete(duplicates).where(db.or_(
+                duplicates.c.tenant_id.in_(tenant_ids), duplicates.c.duplicate_id.in_(tenant_ids)
+            ))),
+            ('tenant', delete(tenants).where(tenants.c.id.in_(tenant_ids))),
+        ]
+        counts = _run_steps(conn, steps)
+        if property_ids:
+            counts.update(_run_steps(conn, [('property vacated', _vacate_properties(property_ids))]))
+        return _finish(counts, dry_run, user_id, 'DELETE', 'Tenant',
+                       f"Bulk deleted tenants {', '.join(map(str, tenant_ids))}")
+    except Exception:
+        db.session.rollback()
+        raise
+
+def delete_properties(property_ids, user_id=None, dry_run=False):
+    """
+    Deletes properties with their expenses, budget rollups and leases. The
+    invoices billed on those leases or units go with them, as do the other
+    unattributed invoices of tenants left with no lease at all. Tenants
+    themselves are kept, with their lease-derived columns refreshed.
+    dry_run runs the same statements and rolls back.
+
+    Returns:
+        dict: {table_name: rows deleted, 'table unlinked': rows unlinked}
+    """
+    property_ids = sorted({int(p) for p in property_ids})
+    lease, invoice = Lease.__table__, Invoice.__table__
+    line_items = InvoiceLineItem.__table__
+    lease_ids = select(lease.c.id).where(lease.c.property_id.in_(property_ids))
+    kept_tenants = select(lease.c.tenant_id).where(db.or_(
+        lease.c.property_id == None, lease.c.property_id.notin_(property_ids)
+    ))
+    leaseless_tenants = select(lease.c.tenant_id).where(
+        lease.c.property_id.in_(property_ids), lease.c.tenant_id.notin_(kept_tenants)
+    )
+    invoice_ids = select(invoice.c.id).where(db.or_(
+        invoice.c.lease_id.in_(lease_ids),
+        invoice.c.property_id.in_(property_ids),
+        db.and_(invoice.c.tenant_id.in_(leaseless_tenants), invoice.c.lease_id == None, invoice.c.property_id == None)
+    ))
+
+    try:
+        conn = db.session.connection()
+        tenant_ids = conn.execute(select(lease.c.tenant_id).where(lease.c.property_id.in_(property_ids)).distinct()).scalars().all()
+
+        steps = _invoice_steps(invoice_ids, lease_ids) + [
+            # Line items of surviving invoices billed against a deleted unit
+            ('invoice_line_item unlinked', update(line_items).where(line_items.c.property_id.in_(property_ids))
+             .values(property_id=None)),
+            ('lease', delete(lease).where(lease.c.property_id.in_(property_ids))),
+            ('property_expense', delete(PropertyExpense.__table__)
+             .where(PropertyExpense.__table__.c.property_id.in_(property_ids))),
+            ('expense_budget_rollup', delete(ExpenseBudgetRollup.__table__)
+             .where(ExpenseBudgetRollup.__table__.c.property_id.in_(property_ids))),
+            ('property', delete(Property.__table__).where(Property.__table__.c.id.in_(property_ids))),
+        ]
+        counts = _run_steps(conn, steps)
+        if tenant_ids:
+            refresh_latest_lease_end(tenant_ids, conn)
+            refresh_effective_status(tenant_ids, conn)
+            refresh_lease_summaries(tenant_ids, conn)
+        counts = _finish(counts, dry_run, user_id, 'DELETE', 'Property',
+                         f"Bulk deleted properties {', '.join(map(str, property_ids))}")
+    except Exception:
+        db.session.rollback()
+        raise
+    if not dry_run:
+        invalidate_expense_totals()
+    return counts
+
+def archive_properties(property_ids, user_id=None, dry_run=False):
+    """
+    Archives the given properties in one UPDATE. Occupied units are skipped,
+    as with a single archive, and already archived ones are left as they are.
+
+    Returns:
+        dict: {'archived', 'skipped_occupied'}
+    """
+    property_ids = sorted({int(p) for p in property_ids})
+    prop = Property.__table__
+    try:
+        conn = db.session.connection()
+        occupied = conn.execute(
+            select(db.func.count()).where(prop.c.id.in_(property_ids), prop.c.status == 'occupied')
+        ).scalar()
+        archived = conn.execute(
+            update(prop).where(
+                prop.c.id.in_(property_ids), prop.c.status != 'occupied',
+                db.or_(prop.c.archived == None, prop.c.archived == False)
+            ).values(archived=True, archived_date=datetime.utcnow())
+        ).rowcount
+        counts = {'archived': archived, 'skipped_occupied': occupied}
+        _finish({'property': archived}, dry_run, user_id, 'ARCHIVE', 'Property',
+                f"Bulk archived properties {', '.join(map(str, property_ids))}")
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
+
+def archive_tenants(tenant_ids, user_id=None, dry_run=False):
+    """
+    Moves the given tenants to 'past' in one UPDATE, skipping any with a
+    lease running today; evicted tenants stay evicted. Leases, invoices and
+    receipts are kept.
+
+    Returns:
+        dict: {'archived', 'skipped_active'}
+    """
+    tenant_ids = sorted({int(t) for t in tenant_ids})
+    today = date.today()
+    tenants, lease = Tenant.__table__, Lease.__table__
+    running = exists().where(lease.c.tenant_id == tenants.c.id, lease.c.start_date <= today, lease.c.end_date >= today)
+    try:
+        conn = db.session.connection()
+        active = conn.execute(
+            select(db.func.count()).select_from(tenants).where(tenants.c.id.in_(tenant_ids), running)
+        ).scalar()
+        archived = conn.execute(
+            update(tenants).where(
+                tenants.c.id.in_(tenant_ids), ~running,
+                db.or_(tenants.c.status == None, tenants.c.status.notin_(TERMINAL_STATUSES))
+            ).values(status='past')
+        ).rowcount
+        refresh_effective_status(tenant_ids, conn)
+        counts = {'archived': archived, 'skipped_active': active}
+        _finish({'tenant': archived}, dry_run, user_id, 'ARCHIVE', 'Tenant',
+                f"Bulk archived tenants {', '.join(map(str, tenant_ids))}")
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
@@ -0,0 +1,86 @@
+from sqlalchemy import select, update
+
+from models import db, Commission, AuditLog
+from utils_tenant_lifecycle import SYSTEM_USER_ID
+
+def _amount_sums():
+    amount = Commission.amount
+    return (
+        db.func.coalesce(db.func.sum(amount), 0),
+        db.func.coalesce(db.func.sum(db.case((Commission.status == 'pending', amount), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((Commission.status == 'paid', amount), else_=0)), 0),
+        db.func.count(Commission.id),
+    )
+
+def get_agent_totals():
+    """
+    Commission totals for every agent from one GROUP BY (agent, year).
+    Agents without commissions are absent.
+
+    Returns:
+        dict: {agent_id: {'total', 'pending', 'paid', 'count', 'years': {year: {'total', 'pending', 'paid'}}}}
+              with years newest first
+    """
+    year = db.func.strftime('%Y', Commission.created_at)
+    rows = db.session.execute(
+        select(Commission.agent_id, year, *_amount_sums())
+        .group_by(Commission.agent_id, year)
+        .order_by(Commission.agent_id, year.desc())
+    )
+
+    totals = {}
+    for agent_id, yr, total, pending, paid, count in rows:
+        agent = totals.setdefault(agent_id, {'total': 0.0, 'pending': 0.0, 'paid': 0.0, 'count': 0, 'years': {}})
+        agent['total'] += total
+        agent['pending'] += pending
+        agent['paid'] += paid
+        agent['count'] += count
+        agent['years'][yr or '-'] = {'total': total, 'pending': pending, 'paid': paid}
+    return totals
+
+def filter_commissions(query, status=None, agent_id=None):
+    if status and status != 'all':
+        query = query.filter(Commission.status == status)
+    if agent_id:
+        query = query.filter(Commission.agent_id == agent_id)
+    return query
+
+def get_commission_totals(status=None, agent_id=None):
+    """Totals for the commission dashboard filters in one aggregate: {'total', 'pending', 'paid', 'count'}."""
+    query = filter_commissions(db.session.query(*_amount_sums()), status, agent_id)
+    total, pending, paid, count = query.one()
+    return {'total': total, 'pending': pending, 'paid': paid, 'count': count}
+
+def pay_commissions(commission_ids, payment_date, reference, proof_path=None, user_id=None):
+    """
+    Marks many pending commissions paid with one UPDATE, sharing the payment
+    date, reference and proof of a single payout. Commissions already paid
+    are left untouched. Writes one audit entry in the same commit.
+
+    Returns:
+        tuple: (commissions paid, total amount)
+    """
+    commission_ids = sorted({int(c) for c in commission_ids})
+    table = Commission.__table__
+    pending = db.and_(table.c.id.in_(commission_ids), table.c.status == 'pending')
+    values = {'status': 'paid', 'payment_date': payment_date, 'payment_reference': reference}
+    if proof_path:
+        values['payment_proof'] = proof_path
+
+    try:
+        conn = db.session.connection()
+        amount = conn.execute(select(db.func.coalesce(db.func.sum(table.c.amount), 0)).where(pending)).scalar()
+        count = conn.execute(update(table).where(pending).values(**values)).rowcount
+        if count:
+            db.session.add(AuditLog(
+                user_id=user_id or SYSTEM_USER_ID,
+                action='PAYMENT',
+                target_type='Commission',
+                target_id=0,
+                details=f"Paid {count} commission(s) totalling RM{amount:,.2f}, ref {reference or '-'}"
+            ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count, amount
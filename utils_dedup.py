@@ -0,0 +1,265 @@
+import re
+from datetime import datetime
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from sqlalchemy import select, update, delete, bindparam
+
+from models import db, Tenant, TenantDuplicate, AuditLog
+from utils_lease_ledger import refresh_lease_summaries
+from utils_lease_timeline import refresh_latest_lease_end
+from utils_tenant_lifecycle import refresh_effective_status, SYSTEM_USER_ID
+
+# Legal-form words that do not tell two tenants apart
+NAME_NOISE = {'SDN', 'BHD', 'BERHAD', 'SENDIRIAN', 'PLT', 'LTD', 'LIMITED', 'M'}
+ARCHIVED_RE = re.compile(r'\(ARCHIVED \d+\)', re.I) # Left by the old merge_duplicates.py
+NON_ALNUM_RE = re.compile(r'[^A-Z0-9]+')
+DIGITS_RE = re.compile(r'\d+')
+
+# LHDN general TINs (general public, foreign buyer, ...) are shared by unrelated tenants
+GENERIC_TINS = {'EI00000000010', 'EI00000000020', 'EI00000000030', 'EI00000000040'}
+
+NAME_WEIGHT = 0.7 # Times name similarity (0-1)
+ID_WEIGHTS = {'account': 0.2, 'reg': 0.35, 'tin': 0.35} # Added when both tenants have the same value
+CONFLICT_PENALTY = 0.25 # Both have a reg no / TIN and they differ
+MIN_SCORE = 0.6
+PREFIX_LEN = 5 # Name-prefix block catches typos and suffix variants
+MAX_BLOCK = 50 # Larger blocks (very common prefixes) are skipped rather than compared pairwise
+
+# Identity fields copied from the merged tenant where the kept one is blank
+FILL_COLUMNS = (
+    'account_code', 'company_reg_no', 'sst_registration_number', 'contact_person', 'email', 'phone',
+    'msic_code', 'business_activity', 'address_line_1', 'address_line_2', 'city', 'state', 'postcode'
+)
+
+# Tables pointing at tenant.id that a merge must not re-point
+MERGE_SKIP_TABLES = {'tenant_duplicate'}
+
+def normalize_name(name):
+    """Upper case, punctuation and legal-form words removed ("ABC Sdn. Bhd." -> "ABC")."""
+    name = ARCHIVED_RE.sub(' ', name or '').upper().replace('&', ' AND ')
+    return ' '.join(w for w in NON_ALNUM_RE.sub(' ', name).split() if w not in NAME_NOISE)
+
+def normalize_id(value):
+    """Account codes, reg nos and TINs compared on letters and digits only."""
+    return NON_ALNUM_RE.sub('', str(value).upper()) if value else ''
+
+def _profile(row):
+    tin = normalize_id(row.sst_registration_number)
+    return {
+        'id': row.id,
+        'name': row.name,
+        'norm': normalize_name(row.name),
+        'account': normalize_id(row.account_code),
+        'reg': normalize_id(row.company_reg_no),
+        'tin': '' if tin in GENERIC_TINS else tin
+    }
+
+def _block_keys(p):
+    keys = []
+    if p['norm']:
+        keys.append(('name', p['norm']))
+        compact = p['norm'].replace(' ', '')
+        if len(compact) >= 4:
+            keys.append(('prefix', compact[:PREFIX_LEN]))
+    for field in ('account', 'reg', 'tin'):
+        if p[field]:
+            keys.append((field, p[field]))
+    return keys
+
+def score_pair(a, b):
+    """(score, reasons) for two tenant profiles; score is clamped to 0-1."""
+    reasons = []
+    similarity = SequenceMatcher(None, a['norm'], b['norm']).ratio() if a['norm'] and b['norm'] else 0
+    score = similarity * NAME_WEIGHT
+    if similarity == 1:
+        reasons.append('same name')
+    elif similarity >= 0.5:
+        reasons.append(f"name {similarity:.0%} similar")
+        # "Kedai 1" vs "Kedai 2": near-identical names that differ in their numbers
+        if DIGITS_RE.findall(a['norm']) != DIGITS_RE.findall(b['norm']):
+            score -= CONFLICT_PENALTY
+            reasons.append('different numbers in name')
+
+    labels = {'account': 'account code', 'reg': 'reg no', 'tin': 'TIN'}
+    for field, weight in ID_WEIGHTS.items():
+        if not (a[field] and b[field]):
+            continue
+        if a[field] == b[field]:
+            score += weight
+            reasons.append(f"same {labels[field]}")
+        elif field != 'account': # One tenant often holds several account codes (one per unit)
+            score -= CONFLICT_PENALTY
+            reasons.append(f"different {labels[field]}")
+    return max(0.0, min(1.0, score)), ', '.join(reasons)
+
+def find_duplicate_candidates(min_score=MIN_SCORE):
+    """
+    Likely duplicate tenant pairs. Tenants are grouped into blocks sharing a
+    normalized name, name prefix, account code, reg no or TIN, and only
+    pairs within a block are scored, so the work grows with block sizes
+    rather than with the square of the tenant count.
+
+    Returns:
+        list of (tenant_id, duplicate_id, score, reasons), best first, tenant_id < duplicate_id
+    """
+    profiles = {}
+    blocks = {}
+    for row in db.session.execute(select(
+        Tenant.id, Tenant.name, Tenant.account_code, Tenant.company_reg_no, Tenant.sst_registration_number
+    )):
+        p = _profile(row)
+        profiles[p['id']] = p
+        for key in _block_keys(p):
+            blocks.setdefault(key, []).append(p['id'])
+
+    pairs = set()
+    for ids in blocks.values():
+        if 2 <= len(ids) <= MAX_BLOCK:
+            pairs.update(combinations(sorted(ids), 2))
+
+    candidates = []
+    for a, b in pairs:
+        score, reasons = score_pair(profiles[a], profiles[b])
+        if score >= min_score:
+            candidates.append((a, b, round(score, 3), reasons))
+    candidates.sort(key=lambda c: (-c[2], c[0], c[1]))
+    return candidates
+
+def refresh_duplicate_queue():
+    """
+    Rescans and syncs the review queue: new pairs are added as pending,
+    pending pairs are rescored or dropped when no longer candidates, and
+    dismissed pairs stay dismissed.
+
+    Returns:
+        dict: {'added', 'updated', 'removed', 'pending'}
+    """
+    candidates = {(a, b): (score, reasons) for a, b, score, reasons in find_duplicate_candidates()}
+    existing = {
+        (row.tenant_id, row.duplicate_id): row
+        for row in db.session.execute(select(
+            TenantDuplicate.id, TenantDuplicate.tenant_id, TenantDuplicate.duplicate_id, TenantDuplicate.status
+        ))
+    }
+    conn = db.session.connection()
+    table = TenantDuplicate.__table__
+    now = datetime.utcnow()
+
+    added = [
+        {'tenant_id': a, 'duplicate_id': b, 'score': score, 'reasons': reasons, 'status': 'pending', 'created_at': now}
+        for (a, b), (score, reasons) in candidates.items() if (a, b) not in existing
+    ]
+    if added:
+        conn.execute(table.insert(), added)
+
+    updated = [
+        {'b_id': row.id, 'b_score': candidates[pair][0], 'b_reasons': candidates[pair][1]}
+        for pair, row in existing.items() if row.status == 'pending' and pair in candidates
+    ]
+    if updated:
+        conn.execute(
+            update(table).where(table.c.id == bindparam('b_id'))
+            .values(score=bindparam('b_score'), reasons=bindparam('b_reasons')), updated
+        )
+
+    stale = [row.id for pair, row in existing.items() if row.status == 'pending' and pair not in candidates]
+    if stale:
+        conn.execute(delete(table).where(table.c.id.in_(stale)))
+
+    db.session.commit()
+    return {
+        'added': len(added),
+        'updated': len(updated),
+        'removed': len(stale),
+        'pending': TenantDuplicate.query.filter_by(status='pending').count()
+    }
+
+def _tenant_references():
+    """(table, column) for every column holding a tenant id, found from the foreign keys."""
+    tenant_id = Tenant.__table__.c.id
+    for table in db.metadata.sorted_tables:
+        if table.name in MERGE_SKIP_TABLES:
+            continue
+        for fk in table.foreign_keys:
+            if fk.column is tenant_id:
+                yield table, fk.parent
+
+def merge_tenants(keep_id, merge_id, user_id=None):
+    """
+    Merges tenant merge_id into keep_id in one transaction: every table
+    referencing the tenant (leases, invoices, receipts, notes, SST
+    exemptions, ledger summaries) is re-pointed with one UPDATE each, blank
+    identity fields on the kept tenant are filled from the merged one, the
+    merged tenant and its queue entries are deleted and derived columns
+    are refreshed. The audit log entry is written in the same commit
+    (as user_id, else the system user).
+
+    Returns:
+        dict: {table_name: rows re-pointed}
+    """
+    if keep_id == merge_id:
+        raise ValueError("Cannot merge a tenant into itself")
+    keep = db.session.get(Tenant, keep_id)
+    merged = db.session.get(Tenant, merge_id)
+    if not keep or not merged:
+        raise ValueError("Tenant not found")
+    keep_name, merged_name = keep.name, merged.name
+
+    try:
+        conn = db.session.connection()
+        moved = {}
+        for table, column in _tenant_references():
+            count = conn.execute(update(table).where(column == merge_id).values({column.name: keep_id})).rowcount
+            if count:
+                moved[table.name] = moved.get(table.name, 0) + count
+
+        values = {
+            col: getattr(merged, col) for col in FILL_COLUMNS
+            if not getattr(keep, col) and getattr(merged, col)
+        }
+        if merged.status == 'active' and keep.status != 'evicted':
+            values['status'] = 'active'
+        if merged.is_sst_registered and not keep.is_sst_registered:
+            values.update(is_sst_registered=True, sst_start_date=keep.sst_start_date or merged.sst_start_date)
+        if values:
+            conn.execute(update(Tenant.__table__).where(Tenant.__table__.c.id == keep_id).values(**values))
+
+        duplicates = TenantDuplicate.__table__
+        conn.execute(delete(duplicates).where(db.or_(
+            duplicates.c.tenant_id == merge_id, duplicates.c.duplicate_id == merge_id
+        )))
+        conn.execute(delete(Tenant.__table__).where(Tenant.__table__.c.id == merge_id))
+
+        refresh_latest_lease_end([keep_id], conn)
+        refresh_effective_status([keep_id], conn)
+        refresh_lease_summaries([keep_id], conn)
+
+        # Loaded objects would otherwise keep their pre-merge children and fields
+        db.session.expunge(merged)
+        db.session.expire(keep)
+
+        summary = ', '.join(f"{count} {table}" for table, count in sorted(moved.items())) or 'no linked records'
+        db.session.add(AuditLog(
+            user_id=user_id or SYSTEM_USER_ID,
+            action='MERGE',
+            target_type='Tenant',
+            target_id=keep_id,
+            details=f"Merged tenant #{merge_id} '{merged_name}' into '{keep_name}' ({summary})"
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return moved
+
+def dismiss_duplicate(pair_id, user_id=None):
+    """Marks a queue entry as not a duplicate; rescans leave it dismissed."""
+    pair = db.session.get(TenantDuplicate, pair_id)
+    if pair is None:
+        raise ValueError("Duplicate pair not found")
+    pair.status = 'dismissed'
+    pair.reviewed_by = user_id
+    pair.reviewed_at = datetime.utcnow()
+    db.session.commit()
+    return pair
@@ -0,0 +1,184 @@
+from models import db, Invoice, Receipt, Tenant
+from sqlalchemy.orm import selectinload, joinedload
+import csv
+import io
+import os
+import zipfile
+from services.document_renderer import DocumentRenderer
+from services.job_service import JobService
+
+# Document contexts are plain dicts so they pickle cheaply into render workers.
+# Key names mirror the model attributes the pdf_* templates already use.
+
+def lease_context(lease):
+    return {
+        'project': lease.project,
+        'unit_number': lease.unit_number,
+        'rent_amount': lease.rent_amount
+    }
+
+def tenant_context(tenant):
+    return {
+        'id': tenant.id,
+        'name': tenant.name,
+        'account_code': tenant.account_code,
+        'address_line_1': tenant.address_line_1,
+        'address_line_2': tenant.address_line_2,
+        'postcode': tenant.postcode,
+        'city': tenant.city,
+        'state': tenant.state,
+        'leases': [lease_context(l) for l in tenant.leases]
+    }
+
+def invoice_context(invoice):
+    return {
+        'invoice': {
+            'id': invoice.id,
+            'issue_date': invoice.issue_date,
+            'due_date': invoice.due_date,
+            'status': invoice.status or '',
+            'description': invoice.description,
+            'total_amount': invoice.total_amount or 0,
+            'tenant': tenant_context(invoice.tenant),
+            'line_items': [{'description': i.description, 'amount': i.amount} for i in invoice.line_items]
+        }
+    }
+
+def receipt_context(receipt, tenant):
+    return {
+        'receipt': {
+            'id': receipt.id,
+            'date_received': receipt.date_received,
+            'amount': receipt.amount,
+            'reference': receipt.reference,
+            'invoice_id': receipt.invoice_id,
+            # Generic payments have no invoice; the template still reads the tenant through it
+            'invoice': {
+                'description': receipt.invoice.description if receipt.invoice else '',
+                'tenant': tenant_context(tenant)
+            }
+        }
+    }
+
+def build_invoice_documents(invoice_ids=None, period_start=None, period_end=None):
+    """(filename, kind, context) per invoice, loaded with three queries (invoices, line items, tenants+leases)."""
+    query = Invoice.query.options(
+        selectinload(Invoice.line_items),
+        joinedload(Invoice.tenant).selectinload(Tenant.leases)
+    )
+    if invoice_ids is not None:
+        query = query.filter(Invoice.id.in_(invoice_ids))
+    if period_start:
+        query = query.filter(Invoice.issue_date >= period_start)
+    if period_end:
+        query = query.filter(Invoice.issue_date <= period_end)
+
+    return [
+        (f"invoice_{inv.id}.html", 'invoice', invoice_context(inv))
+        for inv in query.order_by(Invoice.issue_date, Invoice.id).all()
+    ]
+
+def build_receipt_documents(receipt_ids=None, period_start=None, period_end=None):
+    """(filename, kind, context) per receipt."""
+    query = Receipt.query.options(joinedload(Receipt.invoice))
+    if receipt_ids is not None:
+        query = query.filter(Receipt.id.in_(receipt_ids))
+    if period_start:
+        query = query.filter(Receipt.date_received >= period_start)
+    if period_end:
+        query = query.filter(Receipt.date_received <= period_end)
+    receipts = query.order_by(Receipt.date_received, Receipt.id).all()
+
+    tenant_ids = {r.tenant_id for r in receipts}
+    tenants = {
+        t.id: t for t in Tenant.query.options(selectinload(Tenant.leases)).filter(Tenant.id.in_(tenant_ids)).all()
+    } if tenant_ids else {}
+
+    return [
+        (f"receipt_R-{r.id}.html", 'receipt', receipt_context(r, tenants[r.tenant_id]))
+        for r in receipts
+    ]
+
+def demand_letter_context(tenant, letter, letter_date):
+    return {
+        'tenant': tenant_context(tenant),
+        'items': [
+            {k: item[k] for k in ('invoice_id', 'due_date', 'description', 'unpaid_amount')}
+            for item in letter['items']
+        ],
+        'total_due': letter['total_due'],
+        'severity': letter['severity'],
+        'date': letter_date
+    }
+
+DOCUMENT_BUILDERS = {
+    'invoice': build_invoice_documents,
+    'receipt': build_receipt_documents
+}
+
+def run_document_job(job_id, kind, ids=None, period_start=None, period_end=None, fmt='zip', title='Documents'):
+    """Job target: snapshot contexts from the DB, then render outside any transaction."""
+    docs = DOCUMENT_BUILDERS[kind](ids, period_start, period_end)
+    db.session.remove() # Release the connection before the long render
+
+    JobService.update(job_id, total=len(docs))
+    if not docs:
+        return None
+
+    output_path = JobService.output_path(job_id, f"{kind}s.{'html' if fmt == 'merged' else 'zip'}")
+    DocumentRenderer().render(docs, output_path, fmt=fmt, title=title,
+                              progress=JobService.progress_callback(job_id))
+    return output_path
+
+def run_demand_letter_job(job_id, letters, letter_date, fmt='merged'):
+    """
+    Job target for bulk demand letters (see utils_aging.select_demand_letters).
+    Output is a zip holding the letters (one merged file or one per tenant)
+    and manifest.csv for tracking letters sent.
+    """
+    tenant_ids = [l['tenant_id'] for l in letters]
+    tenants = {
+        t.id: t for t in Tenant.query.options(selectinload(Tenant.leases)).filter(Tenant.id.in_(tenant_ids)).all()
+    }
+
+    docs = []
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(['Letter Ref', 'Letter Date', 'Tenant ID', 'Account Code', 'Tenant Name', 'Unit',
+                     'Severity', 'Max Days Overdue', 'Items', 'Total Due', 'File'])
+    for letter in letters:
+        tenant = tenants[letter['tenant_id']]
+        ref = f"DL-{job_id}-{tenant.id}"
+        filename = f"{ref}.html" if fmt != 'merged' else 'demand_letters.html'
+        docs.append((f"{ref}.html", 'demand_letter', demand_letter_context(tenant, letter, letter_date)))
+        writer.writerow([
+            ref,
+            letter_date.strftime('%Y-%m-%d'),
+            tenant.id,
+            tenant.account_code or '',
+            tenant.name,
+            tenant.leases[-1].unit_number if tenant.leases else '',
+            letter['severity'],
+            letter['max_days_overdue'],
+            len(letter['items']),
+            f"{letter['total_due']:.2f}",
+            filename
+        ])
+    db.session.remove()
+
+    JobService.update(job_id, total=len(docs))
+    output_path = JobService.output_path(job_id, f"demand_letters_{letter_date.strftime('%Y%m%d')}.zip")
+    renderer = DocumentRenderer()
+    progress = JobService.progress_callback(job_id)
+
+    if fmt == 'merged':
+        merged_path = output_path[:-len('.zip')] + '.html'
+        renderer.render(docs, merged_path, fmt='merged', progress=progress, title='Demand Letters')
+        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.write(merged_path, 'demand_letters.html')
+            zf.writestr('manifest.csv', manifest.getvalue())
+        os.remove(merged_path)
+    else:
+        renderer.render(docs, output_path, progress=progress, extra_files={'manifest.csv': manifest.getvalue()})
+
+    return output_path
@@ -0,0 +1,106 @@
+import threading
+import time
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, PropertyExpense, Property
+from utils_metrics import inc
+
+# Expense totals per filter combination, dropped whenever expenses change
+EXPENSE_TOTALS_TTL = 300 # seconds; backstop for writes made outside the ORM
+_totals_cache = {}
+_totals_lock = threading.Lock()
+
+def invalidate_expense_totals():
+    with _totals_lock:
+        _totals_cache.clear()
+
+@event.listens_for(Session, 'after_flush')
+def _expenses_flushed(session, flush_context):
+    if any(isinstance(obj, PropertyExpense) for obj in chain(session.new, session.dirty, session.deleted)):
+        invalidate_expense_totals()
+
+@event.listens_for(Session, 'do_orm_execute')
+def _expenses_bulk_changed(orm_execute_state):
+    # query(...).update() / .delete() bypass the flush
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is PropertyExpense:
+        invalidate_expense_totals()
+
+def filter_expenses(query, property_id=None, expense_type=None, status=None, export_status=None):
+    """Applies the expense dashboard filters (shared by the dashboard, totals and export)."""
+    if property_id:
+        query = query.filter(PropertyExpense.property_id == property_id)
+    if expense_type:
+        query = query.filter(PropertyExpense.expense_type == expense_type)
+
+    if status == 'paid':
+        query = query.filter(PropertyExpense.paid_by_company == True)
+    elif status == 'unpaid':
+        query = query.filter(PropertyExpense.paid_by_company == False)
+
+    if export_status == 'pending':
+        query = query.filter((PropertyExpense.export_status == 'pending') | (PropertyExpense.export_status == None))
+    elif export_status == 'exported':
+        query = query.filter(PropertyExpense.export_status == 'exported')
+    return query
+
+def get_expense_totals(property_id=None, expense_type=None, status=None, export_status=None):
+    """
+    Expense totals for a filter combination from one GROUP BY
+    (property, expense type, paid status, GL code), cached until expenses change.
+
+    Returns:
+        dict: {'total', 'paid', 'pending', 'count',
+               'by_property': {property_id: amount}, 'by_type': {...}, 'by_gl': {...}}
+    """
+    key = (str(property_id or ''), expense_type or '', status or '', export_status or '')
+    now = time.monotonic()
+    with _totals_lock:
+        cached = _totals_cache.get(key)
+    if cached and now - cached[0] < EXPENSE_TOTALS_TTL:
+        inc('cache_requests_total', cache='expense_totals', result='hit')
+        return cached[1]
+    inc('cache_requests_total', cache='expense_totals', result='miss')
+
+    query = filter_expenses(
+        db.session.query(
+            PropertyExpense.property_id,
+            PropertyExpense.expense_type,
+            PropertyExpense.paid_by_company,
+            PropertyExpense.gl_code,
+            db.func.sum(PropertyExpense.amount),
+            db.func.count(PropertyExpense.id)
+        ),
+        property_id, expense_type, status, export_status
+    ).group_by(
+        PropertyExpense.property_id,
+        PropertyExpense.expense_type,
+        PropertyExpense.paid_by_company,
+        PropertyExpense.gl_code
+    )
+
+    totals = {'total': 0.0, 'paid': 0.0, 'pending': 0.0, 'count': 0,
+              'by_property': {}, 'by_type': {}, 'by_gl': {}}
+    for prop_id, exp_type, paid, gl_code, amount, count in query:
+        amount = float(amount or 0)
+        totals['total'] += amount
+        totals['count'] += count
+        if paid:
+            totals['paid'] += amount
+        totals['by_property'][prop_id] = totals['by_property'].get(prop_id, 0) + amount
+        totals['by_type'][exp_type] = totals['by_type'].get(exp_type, 0) + amount
+        gl_key = gl_code or '-'
+        totals['by_gl'][gl_key] = totals['by_gl'].get(gl_key, 0) + amount
+    totals['pending'] = totals['total'] - totals['paid']
+
+    with _totals_lock:
+        _totals_cache[key] = (now, totals)
+    return totals
+
+def get_property_choices():
+    """id / unit_number pairs for property dropdowns, without loading Property rows."""
+    return db.session.query(Property.id, Property.unit_number).order_by(Property.unit_number).all()
@@ -0,0 +1,145 @@
+import heapq
+import json
+import logging
+import re
+from time import perf_counter
+
+from flask import g, has_request_context, request, request_started, request_finished, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('rental.requests')
+
+SLOWEST_KEPT = 3 # Statements listed per request
+STATEMENT_PREVIEW = 200 # Characters of SQL kept in the log
+IN_LIST_RE = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)') # "IN (?, ?, ?)" -> "IN (?)" for the N+1 shape
+SPACE_RE = re.compile(r'\s+')
+
+class RequestStats:
+    """SQL and render timings of the request in progress (one per request, kept on flask.g)"""
+    __slots__ = ('started', 'queries', 'sql_time', 'render_time', 'render_started', 'shapes', 'slowest')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        self.shapes = {} # statement -> times run
+        self.slowest = [] # min-heap of (seconds, statement)
+
+    def add_query(self, statement, elapsed):
+        self.queries += 1
+        self.sql_time += elapsed
+        self.shapes[statement] = self.shapes.get(statement, 0) + 1
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, (elapsed, statement))
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (elapsed, statement))
+
+    def repeated(self, threshold):
+        """[(shape, times)] for statement shapes run more than threshold times (likely N+1), worst first."""
+        counts = {}
+        for statement, times in self.shapes.items():
+            shape = IN_LIST_RE.sub('(?)', statement)
+            counts[shape] = counts.get(shape, 0) + times
+        return sorted(((s, n) for s, n in counts.items() if n > threshold), key=lambda item: -item[1])
+
+def current_stats():
+    """RequestStats of the current request, or None outside a request (CLI scripts, job threads)."""
+    return g.get('request_stats') if has_request_context() else None
+
+def _preview(statement):
+    return SPACE_RE.sub(' ', statement).strip()[:STATEMENT_PREVIEW]
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._instrument_started = perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instrument_started', None)
+    if started is None:
+        return
+    stats = current_stats()
+    if stats is not None:
+        stats.add_query(statement, perf_counter() - started)
+
+def _request_started(sender, **extra):
+    g.request_stats = RequestStats()
+
+def _render_started(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.render_started is None:
+        stats.render_started = perf_counter()
+
+def _render_finished(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.render_started is not None:
+        stats.render_time += perf_counter() - stats.render_started
+        stats.render_started = None
+
+def _request_finished(sender, response, **extra):
+    stats = current_stats()
+    if stats is None:
+        return
+    config = sender.config
+    total_ms = (perf_counter() - stats.started) * 1000
+    sql_ms = stats.sql_time * 1000
+    render_ms = stats.render_time * 1000
+
+    if config.get('SERVER_TIMING'):
+        response.headers['Server-Timing'] = (
+            f'db;dur={sql_ms:.1f};desc="{stats.queries} queries", '
+            f'render;dur={render_ms:.1f}, total;dur={total_ms:.1f}'
+        )
+
+    repeated = stats.repeated(config.get('N_PLUS_ONE_THRESHOLD', 10))
+    slow = total_ms >= config.get('SLOW_REQUEST_MS', 500)
+    level = logging.WARNING if slow or repeated else logging.DEBUG
+    if not logger.isEnabledFor(level):
+        return
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'total_ms': round(total_ms, 1),
+        'sql_ms': round(sql_ms, 1),
+        'render_ms': round(render_ms, 1),
+        'queries': stats.queries,
+        'slow': slow,
+    }
+    if slow:
+        record['slowest'] = [
+            {'ms': round(seconds * 1000, 1), 'sql': _preview(statement)}
+            for seconds, statement in sorted(stats.slowest, reverse=True)
+        ]
+    if repeated:
+        record['n_plus_one'] = [{'times': times, 'sql': _preview(shape)} for shape, times in repeated[:SLOWEST_KEPT]]
+    logger.log(level, json.dumps(record))
+
+def init_instrumentation(app):
+    """
+    Times every request: SQL statements (count, total time, slowest), N+1
+    patterns and template rendering. Slow requests (SLOW_REQUEST_MS) and
+    requests repeating one statement shape more than N_PLUS_ONE_THRESHOLD
+    times are logged as one JSON line on the 'rental.requests' logger;
+    every request is logged at DEBUG. SERVER_TIMING adds the timings as a
+    Server-Timing header for the browser dev tools.
+    """
+    if not app.config.get('INSTRUMENTATION', True):
+        return
+    log_file = app.config.get('INSTRUMENTATION_LOG')
+    if not logger.handlers:
+        # No file: the console (stderr), so INSTRUMENTATION_LOG_ALL still shows every request
+        handler = logging.FileHandler(log_file, encoding='utf-8', delay=True) if log_file else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG if app.config.get('INSTRUMENTATION_LOG_ALL') else logging.WARNING)
+
+    request_started.connect(_request_started, app)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+    request_finished.connect(_request_finished, app)
@@ -0,0 +1,301 @@
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import bindparam, event, inspect, select, delete
+from sqlalchemy.orm import Session
+
+from models import db, Invoice, InvoiceLineItem, Receipt, Lease, LeaseLedgerSummary
+
+# Changes from the current flush (kept on session.info): tenants to recompute
+# in full, invoice/receipt differences, invoices whose line items changed
+PENDING_KEY = 'lease_ledger_tenants'
+DELTA_KEY = 'lease_ledger_deltas'
+LINE_ITEM_KEY = 'lease_ledger_line_invoices'
+# Lease columns that decide which lease an invoice or receipt is attributed to
+LEASE_TERMS = ('tenant_id', 'unit_number', 'start_date', 'end_date')
+CHUNK_SIZE = 500
+
+def _days_apart(lease, on_date):
+    """0 when on_date falls within the lease, else days to the nearest end."""
+    if on_date is None:
+        return 0
+    if on_date < lease.start_date:
+        return (lease.start_date - on_date).days
+    if on_date > lease.end_date:
+        return (on_date - lease.end_date).days
+    return 0
+
+def attribute_to_lease(leases, on_date, descriptions=()):
+    """
+    Picks the lease an invoice or receipt belongs to among the tenant's leases:
+    a unit named in a line item ("Monthly Rent (A-1-2)") narrows the choice,
+    then the lease running on the date, else the nearest one in time.
+    """
+    if not leases:
+        return None
+    named = [l for l in leases if any(f"({l.unit_number})" in (d or '') for d in descriptions)]
+    candidates = named or leases
+    # Ties (overlapping leases): the most recently started lease wins
+    return min(candidates, key=lambda l: (_days_apart(l, on_date), -l.start_date.toordinal(), l.id)).id
+
+def refresh_lease_summaries(tenant_ids, connection=None):
+    """
+    Recomputes LeaseLedgerSummary for every lease of the given tenants.
+    Runs on plain Core statements so it can be called from inside a flush.
+    """
+    conn = connection or db.session.connection()
+    tenant_ids = sorted(t for t in set(tenant_ids) if t is not None)
+    now = datetime.utcnow()
+
+    for i in range(0, len(tenant_ids), CHUNK_SIZE):
+        chunk = tenant_ids[i:i + CHUNK_SIZE]
+
+        leases = {}
+        for lease in conn.execute(
+            select(Lease.id, Lease.tenant_id, Lease.unit_number, Lease.start_date, Lease.end_date)
+            .where(Lease.tenant_id.in_(chunk))
+        ):
+            leases.setdefault(lease.tenant_id, []).append(lease)
+
+        descriptions = {}
+        for invoice_id, description in conn.execute(
+            select(InvoiceLineItem.invoice_id, InvoiceLineItem.description)
+            .join(Invoice, InvoiceLineItem.invoice_id == Invoice.id)
+            .where(Invoice.tenant_id.in_(chunk), Invoice.lease_id == None)
+        ):
+            descriptions.setdefault(invoice_id, []).append(description)
+
+        totals = {}
+        invoice_lease = {}
+        for inv in conn.execute(
+            select(Invoice.id, Invoice.tenant_id, Invoice.lease_id, Invoice.issue_date, Invoice.total_amount, Invoice.status)
+            .where(Invoice.tenant_id.in_(chunk))
+        ):
+            # Invoices record their lease since it was added; older ones are attributed
+            lease_id = inv.lease_id or attribute_to_lease(leases.get(inv.tenant_id), inv.issue_date, descriptions.get(inv.id, ()))
+            invoice_lease[inv.id] = lease_id
+            if lease_id is None or inv.status == 'void':
+                continue
+            row = totals.setdefault(lease_id, [0.0, 0.0, 0, 0])
+            row[0] += inv.total_amount or 0
+            row[2] += 1
+
+        for rec in conn.execute(
+            select(Receipt.tenant_id, Receipt.invoice_id, Receipt.date_received, Receipt.amount)
+            .where(Receipt.tenant_id.in_(chunk))
+        ):
+            # A receipt follows its invoice; unlinked payments go by date
+            lease_id = invoice_lease.get(rec.invoice_id) or attribute_to_lease(leases.get(rec.tenant_id), rec.date_received)
+            if lease_id is None:
+                continue
+            row = totals.setdefault(lease_id, [0.0, 0.0, 0, 0])
+            row[1] += rec.amount or 0
+            row[3] += 1
+
+        conn.execute(delete(LeaseLedgerSummary.__table__).where(LeaseLedgerSummary.tenant_id.in_(chunk)))
+        rows = []
+        for tenant_id, tenant_leases in leases.items():
+            for lease in tenant_leases:
+                invoiced, paid, invoice_count, receipt_count = totals.get(lease.id, (0.0, 0.0, 0, 0))
+                rows.append({
+                    'lease_id': lease.id,
+                    'tenant_id': tenant_id,
+                    'invoiced': invoiced,
+                    'paid': paid,
+                    'invoice_count': invoice_count,
+                    'receipt_count': receipt_count,
+                    'refreshed_at': now
+                })
+        if rows:
+            conn.execute(LeaseLedgerSummary.__table__.insert(), rows)
+
+def get_lease_summaries(leases):
+    """
+    {lease_id: {'invoiced', 'paid', 'balance'}} for the given leases in one query.
+    Leases never summarised (data from before the summary table) are computed on the spot.
+    """
+    lease_ids = [l.id for l in leases]
+    if not lease_ids:
+        return {}
+
+    def fetch():
+        return {
+            row.lease_id: {'invoiced': row.invoiced or 0, 'paid': row.paid or 0,
+                           'balance': (row.invoiced or 0) - (row.paid or 0)}
+            for row in LeaseLedgerSummary.query.filter(LeaseLedgerSummary.lease_id.in_(lease_ids))
+        }
+
+    summaries = fetch()
+    missing = [l.tenant_id for l in leases if l.id not in summaries]
+    if missing:
+        refresh_lease_summaries(missing)
+        db.session.commit()
+        summaries = fetch()
+    return summaries
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+# Attributes read by _before: load the old value when set on an expired object,
+# so a flush can take back what the object added before
+for _attr in (Invoice.tenant_id, Invoice.lease_id, Invoice.status, Invoice.total_amount,
+              Receipt.tenant_id, Receipt.invoice_id, Receipt.date_received, Receipt.amount,
+              InvoiceLineItem.invoice_id, Lease.tenant_id):
+    event.listen(_attr, 'set', _load_old_value, active_history=True)
+
+def _before(obj, attr):
+    """Value of attr before the current flush (call from after_flush)."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+def _changed(obj, attrs):
+    """True when a persistent object had any of attrs changed in the current flush."""
+    state = inspect(obj)
+    if state.session and obj in state.session.new:
+        return False
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+def _invoice_entry(obj, before=False):
+    """(tenant_id, lease_id, invoiced, invoice_count) an invoice adds to its lease's summary."""
+    value = (lambda attr: _before(obj, attr)) if before else (lambda attr: getattr(obj, attr))
+    if value('status') == 'void':
+        return (value('tenant_id'), value('lease_id'), 0.0, 0)
+    return (value('tenant_id'), value('lease_id'), value('total_amount') or 0, 1)
+
+def _receipt_entry(obj, before=False):
+    """(tenant_id, invoice_id, date_received, paid) of a receipt; its lease is resolved after the flush."""
+    value = (lambda attr: _before(obj, attr)) if before else (lambda attr: getattr(obj, attr))
+    return (value('tenant_id'), value('invoice_id'), value('date_received'), value('amount') or 0)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_ledger_changes(session, flush_context):
+    """
+    Lease inserts, deletes and changes to a lease's tenant, unit or dates
+    re-attribute the tenant's whole ledger: those tenants are recomputed in
+    full. Invoice and receipt changes only add their difference to their
+    lease's row, as do line items except on legacy invoices without a lease.
+    """
+    touched = session.info.setdefault(PENDING_KEY, set())
+    deltas = session.info.setdefault(DELTA_KEY, [])
+    line_invoices = session.info.setdefault(LINE_ITEM_KEY, set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Lease):
+            if obj in session.new or obj in session.deleted or _changed(obj, LEASE_TERMS):
+                touched.add(obj.tenant_id)
+                touched.add(_before(obj, 'tenant_id'))
+        elif isinstance(obj, Invoice):
+            # Deleting an invoice unlinks its receipts and moving it moves them: recompute
+            if obj in session.deleted or _changed(obj, ('tenant_id', 'lease_id')):
+                touched.add(obj.tenant_id)
+                touched.add(_before(obj, 'tenant_id'))
+                continue
+            new = _invoice_entry(obj)
+            old = None if obj in session.new else _invoice_entry(obj, before=True)
+            if new[1] is None:
+                touched.add(new[0]) # Legacy invoice without a lease: attributed by the full refresh
+            elif old != new:
+                deltas.append(('invoice', new, 1))
+                if old:
+                    deltas.append(('invoice', old, -1))
+        elif isinstance(obj, Receipt):
+            if _changed(obj, ('tenant_id',)):
+                touched.add(obj.tenant_id)
+                touched.add(_before(obj, 'tenant_id'))
+                continue
+            if obj in session.deleted:
+                deltas.append(('receipt', _receipt_entry(obj), -1))
+                continue
+            new = _receipt_entry(obj)
+            old = None if obj in session.new else _receipt_entry(obj, before=True)
+            if old != new:
+                deltas.append(('receipt', new, 1))
+                if old:
+                    deltas.append(('receipt', old, -1))
+        elif isinstance(obj, InvoiceLineItem):
+            # Line items name the unit a legacy invoice is attributed to
+            line_invoices.add(obj.invoice_id)
+            line_invoices.add(_before(obj, 'invoice_id'))
+
+def _apply_deltas(deltas, touched, conn):
+    """
+    Adds invoice/receipt differences to their leases' summary rows. Tenants
+    whose entries cannot be placed without the full attribution (receipts of
+    legacy invoices) are added to touched instead.
+    """
+    invoice_ids = sorted({entry[1] for kind, entry, _ in deltas if kind == 'receipt' and entry[1]})
+    invoice_lease = {}
+    for i in range(0, len(invoice_ids), CHUNK_SIZE):
+        invoice_lease.update(conn.execute(
+            select(Invoice.id, Invoice.lease_id).where(Invoice.id.in_(invoice_ids[i:i + CHUNK_SIZE]))
+        ).all())
+
+    # Unlinked payments (or ones whose invoice is gone) go by date among the tenant's leases
+    dated = sorted({entry[0] for kind, entry, _ in deltas
+                    if kind == 'receipt' and entry[0] not in touched and invoice_lease.get(entry[1]) is None})
+    leases = {}
+    for i in range(0, len(dated), CHUNK_SIZE):
+        for lease in conn.execute(
+            select(Lease.id, Lease.tenant_id, Lease.unit_number, Lease.start_date, Lease.end_date)
+            .where(Lease.tenant_id.in_(dated[i:i + CHUNK_SIZE]))
+        ):
+            leases.setdefault(lease.tenant_id, []).append(lease)
+
+    totals = {}
+    for kind, entry, sign in deltas:
+        if kind == 'invoice':
+            tenant_id, lease_id, invoiced, invoice_count = entry
+            paid = receipt_count = 0
+        else:
+            tenant_id, invoice_id, date_received, paid = entry
+            invoiced, invoice_count, receipt_count = 0.0, 0, 1
+            if invoice_id and invoice_id in invoice_lease and invoice_lease[invoice_id] is None:
+                touched.add(tenant_id) # Paid against a legacy invoice: only the full refresh places it
+                continue
+            lease_id = invoice_lease.get(invoice_id) or attribute_to_lease(leases.get(tenant_id), date_received)
+        if lease_id is None:
+            continue
+        row = totals.setdefault((tenant_id, lease_id), [0.0, 0.0, 0, 0])
+        row[0] += sign * invoiced
+        row[1] += sign * paid
+        row[2] += sign * invoice_count
+        row[3] += sign * receipt_count
+
+    rows = [
+        {'target': lease_id, 'd_invoiced': invoiced, 'd_paid': paid, 'd_invoices': invoice_count,
+         'd_receipts': receipt_count, 'now': datetime.utcnow()}
+        for (tenant_id, lease_id), (invoiced, paid, invoice_count, receipt_count) in totals.items()
+        if tenant_id not in touched
+    ]
+    if rows:
+        # Leases without a row yet are summarised in full when first read (get_lease_summaries)
+        table = LeaseLedgerSummary.__table__
+        conn.execute(
+            table.update().where(table.c.lease_id == bindparam('target')).values(
+                invoiced=table.c.invoiced + bindparam('d_invoiced'),
+                paid=table.c.paid + bindparam('d_paid'),
+                invoice_count=table.c.invoice_count + bindparam('d_invoices'),
+                receipt_count=table.c.receipt_count + bindparam('d_receipts'),
+                refreshed_at=bindparam('now'),
+            ),
+            rows
+        )
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _refresh_ledger(session, flush_context):
+    touched = session.info.pop(PENDING_KEY, None) or set()
+    deltas = session.info.pop(DELTA_KEY, None) or []
+    line_invoices = sorted(i for i in session.info.pop(LINE_ITEM_KEY, None) or () if i is not None)
+    if not (touched or deltas or line_invoices):
+        return
+    conn = session.connection()
+    for i in range(0, len(line_invoices), CHUNK_SIZE):
+        touched.update(conn.execute(
+            select(Invoice.tenant_id).where(Invoice.id.in_(line_invoices[i:i + CHUNK_SIZE]), Invoice.lease_id == None)
+        ).scalars())
+    touched.discard(None)
+    if deltas:
+        _apply_deltas([d for d in deltas if d[1][0] not in touched], touched, conn)
+    if touched:
+        refresh_lease_summaries(touched, conn)
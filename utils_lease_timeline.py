@@ -0,0 +1,112 @@
+from itertools import chain
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import event, inspect, select, update, bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, Tenant, Lease
+
+# Tenants whose leases changed in the current flush (kept on session.info)
+PENDING_KEY = 'lease_timeline_tenants'
+
+def _write_latest_lease_ends(conn, tenant_ids):
+    """Sets latest_lease_end for the given tenants; returns {tenant_id: latest_lease_end}."""
+    latest = dict(conn.execute(
+        select(Lease.tenant_id, db.func.max(Lease.end_date))
+        .where(Lease.tenant_id.in_(tenant_ids))
+        .group_by(Lease.tenant_id)
+    ).all())
+    values = {t: latest.get(t) for t in tenant_ids}
+    conn.execute(
+        update(Tenant.__table__).where(Tenant.__table__.c.id == bindparam('b_id'))
+        .values(latest_lease_end=bindparam('b_end')),
+        [{'b_id': t, 'b_end': end} for t, end in values.items()]
+    )
+    return values
+
+def refresh_latest_lease_end(tenant_ids=None, connection=None):
+    """
+    Recomputes Tenant.latest_lease_end (MAX lease end_date) for the given
+    tenants, or every tenant in one correlated UPDATE when tenant_ids is None.
+    Runs on Core statements so it can be called from inside a flush.
+    """
+    conn = connection or db.session.connection()
+    if tenant_ids is None:
+        latest = select(db.func.max(Lease.end_date)).where(Lease.tenant_id == Tenant.__table__.c.id).scalar_subquery()
+        conn.execute(update(Tenant.__table__).values(latest_lease_end=latest))
+        return
+    tenant_ids = sorted(t for t in set(tenant_ids) if t is not None)
+    if tenant_ids:
+        _write_latest_lease_ends(conn, tenant_ids)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_lease_tenants(session, flush_context):
+    touched = session.info.setdefault(PENDING_KEY, set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Lease):
+            touched.add(obj.tenant_id)
+            # Moved to another tenant: the old tenant needs a refresh too
+            touched.update(inspect(obj).attrs.tenant_id.history.deleted or ())
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _refresh_lease_tenants(session, flush_context):
+    touched = sorted(t for t in session.info.pop(PENDING_KEY, None) or () if t is not None)
+    if not touched:
+        return
+    values = _write_latest_lease_ends(session.connection(), touched)
+    # Keep Tenant objects already in the session consistent without a reload
+    for tenant_id, latest in values.items():
+        tenant = session.identity_map.get(session.identity_key(Tenant, tenant_id))
+        if tenant is not None:
+            set_committed_value(tenant, 'latest_lease_end', latest)
+
+def _sets_tenant(statement):
+    """True when an UPDATE statement assigns Lease.tenant_id."""
+    return any(getattr(key, 'key', key) == 'tenant_id' for key in statement._values or ())
+
+@event.listens_for(Session, 'do_orm_execute')
+def _leases_bulk_changed(orm_execute_state):
+    # query(Lease)...update() / .delete() bypass the flush: the tenants whose
+    # leases the statement matches are selected before it runs and refreshed
+    # after. Unfiltered statements, or ones moving leases to another tenant,
+    # refresh every tenant.
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is Lease:
+        statement = orm_execute_state.statement
+        conn = orm_execute_state.session.connection()
+        tenant_ids = None
+        if statement.whereclause is not None and not (orm_execute_state.is_update and _sets_tenant(statement)):
+            tenant_ids = conn.execute(
+                select(Lease.tenant_id).where(statement.whereclause).distinct(),
+                orm_execute_state.parameters or {}
+            ).scalars().all()
+        result = orm_execute_state.invoke_statement()
+        refresh_latest_lease_end(tenant_ids, connection=conn)
+        return result
+
+def get_expiry_histogram(start_month, months):
+    """
+    Leases ending in each month from start_month for `months` months, from one
+    GROUP BY over the end_date index.
+
+    Returns:
+        dict: {'labels': ['Jan 2026', ...], 'counts': [...]}
+    """
+    start_month = start_month.replace(day=1)
+    end = start_month + relativedelta(months=months)
+    month = db.func.strftime('%Y-%m', Lease.end_date)
+    counts = dict(
+        db.session.query(month, db.func.count(Lease.id))
+        .filter(Lease.end_date >= start_month, Lease.end_date < end)
+        .group_by(month)
+        .all()
+    )
+
+    histogram = {'labels': [], 'counts': []}
+    for i in range(months):
+        d = start_month + relativedelta(months=i)
+        histogram['labels'].append(d.strftime('%b %Y'))
+        histogram['counts'].append(counts.get(d.strftime('%Y-%m'), 0))
+    return histogram
@@ -0,0 +1,158 @@
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from flask import g, request, request_started, request_finished
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# In-process metrics for /metrics (Prometheus text format). One registry per
+# process, shared by every waitress thread under a single lock; each update is
+# a dict lookup and an add, so recording stays in the microseconds.
+
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+
+METRICS = {
+    'http_requests_total': ('counter', 'Requests served, by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'db_queries_total': ('counter', 'SQL statements executed'),
+    'db_query_duration_seconds': ('histogram', 'SQL statement latency'),
+    'cache_requests_total': ('counter', 'Cache lookups by cache and result (hit / miss)'),
+    'lhdn_submissions_total': ('counter', 'LHDN e-invoice submissions by result'),
+    'import_rows_total': ('counter', 'Rows processed by spreadsheet imports, by kind and result'),
+    'import_duration_seconds_total': ('counter', 'Time spent in spreadsheet imports, by kind'),
+}
+BUCKETS = {
+    'http_request_duration_seconds': REQUEST_BUCKETS,
+    'db_query_duration_seconds': QUERY_BUCKETS,
+}
+
+_lock = threading.Lock()
+_counters = {} # (name, labels) -> value
+_histograms = {} # (name, labels) -> [count per bucket..., count above the last bucket, sum, count]
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    """Adds value to a counter."""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    """Records one observation in a histogram."""
+    buckets = BUCKETS[name]
+    key = (name, _labels(labels))
+    index = bisect_left(buckets, value)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(buckets) + 3)
+        hist[index] += 1 # Per-bucket; made cumulative when rendered
+        hist[-2] += value
+        hist[-1] += 1
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(gauges=(), counters=()):
+    """
+    The registry in Prometheus text format. gauges are extra
+    (name, help, [(labels dict, value)]) families sampled at scrape time;
+    counters are extra (name, labels dict, value) samples for counters in
+    METRICS that are kept elsewhere (e.g. functools cache statistics).
+    """
+    with _lock:
+        samples = dict(_counters)
+        histograms = {key: list(hist) for key, hist in _histograms.items()}
+    for name, labels, value in counters:
+        samples[(name, _labels(labels))] = value
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(samples.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+            continue
+        buckets = BUCKETS[name]
+        for (metric, labels), hist in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, hist):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {hist[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_number(hist[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {hist[-1]}')
+
+    for name, help_text, samples in gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None:
+        elapsed = perf_counter() - started
+        inc('db_queries_total')
+        observe('db_query_duration_seconds', elapsed)
+
+def _request_started(sender, **extra):
+    g.metrics_started = perf_counter()
+
+def _request_finished(sender, response, **extra):
+    started = g.get('metrics_started')
+    if started is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    inc('http_requests_total', endpoint=endpoint, method=request.method, status=str(response.status_code))
+    observe('http_request_duration_seconds', perf_counter() - started, endpoint=endpoint)
+
+def init_metrics(app):
+    """Records request counts and latencies per endpoint for /metrics."""
+    request_started.connect(_request_started, app)
+    request_finished.connect(_request_finished, app)
+
+def record_import(kind, seconds, **rows):
+    """Import throughput: rows by result (e.g. imported=120, skipped=3) and time taken."""
+    for result, count in rows.items():
+        if count:
+            inc('import_rows_total', count, kind=kind, result=result)
+    inc('import_duration_seconds_total', seconds, kind=kind)
+
+def sqlite_file_sizes(database):
+    """[(labels, bytes)] for the SQLite database file and its WAL (0 when absent)."""
+    samples = []
+    for file, suffix in (('db', ''), ('wal', '-wal')):
+        path = database + suffix
+        samples.append(({'file': file}, os.path.getsize(path) if os.path.exists(path) else 0))
+    return samples
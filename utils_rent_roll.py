@@ -0,0 +1,161 @@
+from datetime import date, datetime, time, timedelta
+from dateutil.relativedelta import relativedelta
+from models import db, Property, Project, Lease, Tenant, OccupancySnapshot
+
+def units_on(as_of):
+    """SQL filter: units not yet archived on as_of (an archive with no date counts throughout)."""
+    next_day = datetime.combine(as_of + timedelta(days=1), time.min)
+    return db.or_(
+        Property.archived == False,
+        Property.archived == None,
+        Property.archived_date >= next_day
+    )
+
+def get_rent_roll(as_of, project=None):
+    """
+    Every unit on as_of with the lease running that day (if any): tenant,
+    rent, deposits and expiry. One query over Property outer-joined to the
+    leases whose interval covers as_of. Legacy leases without property_id
+    are matched by unit number. Where leases overlap, the latest start wins.
+
+    Returns:
+        list of dicts ordered by project and unit
+    """
+    running = db.and_(
+        db.or_(
+            Lease.property_id == Property.id,
+            db.and_(Lease.property_id == None, Lease.unit_number == Property.unit_number)
+        ),
+        Lease.start_date <= as_of,
+        Lease.end_date >= as_of
+    )
+    project_name = db.func.coalesce(Project.name, Property.project, 'Unassigned')
+
+    query = db.session.query(
+        Property.id, Property.unit_number, project_name.label('project'), Property.block, Property.floor,
+        Property.property_type, Property.size_sqft, Property.target_rent,
+        Lease.id.label('lease_id'), Lease.start_date, Lease.end_date, Lease.rent_amount,
+        Lease.security_deposit, Lease.utility_deposit, Lease.misc_deposit,
+        Tenant.id.label('tenant_id'), Tenant.name.label('tenant_name'), Tenant.account_code
+    ).select_from(Property)\
+     .outerjoin(Project, Property.project_id == Project.id)\
+     .outerjoin(Lease, running)\
+     .outerjoin(Tenant, Lease.tenant_id == Tenant.id)\
+     .filter(units_on(as_of))
+    if project:
+        query = query.filter(project_name == project)
+    query = query.order_by(project_name, Property.unit_number, Lease.start_date.desc(), Lease.id.desc())
+
+    roll = []
+    seen = set()
+    for row in query:
+        if row.id in seen:
+            continue
+        seen.add(row.id)
+        occupied = row.lease_id is not None
+        roll.append({
+            'property_id': row.id,
+            'unit_number': row.unit_number,
+            'project': row.project,
+            'block': row.block,
+            'floor': row.floor,
+            'property_type': row.property_type,
+            'size_sqft': row.size_sqft,
+            'target_rent': row.target_rent or 0,
+            'status': 'occupied' if occupied else 'vacant',
+            'lease_id': row.lease_id,
+            'tenant_id': row.tenant_id,
+            'tenant_name': row.tenant_name,
+            'account_code': row.account_code,
+            'rent_amount': (row.rent_amount or 0) if occupied else 0,
+            'security_deposit': (row.security_deposit or 0) if occupied else 0,
+            'utility_deposit': (row.utility_deposit or 0) if occupied else 0,
+            'misc_deposit': (row.misc_deposit or 0) if occupied else 0,
+            'start_date': row.start_date,
+            'end_date': row.end_date,
+            'days_to_expiry': (row.end_date - as_of).days if occupied else None
+        })
+    return roll
+
+def summarize_rent_roll(roll):
+    """{project: {'total_units', 'occupied_units', 'contracted_rent', 'asking_rent'}}"""
+    summary = {}
+    for unit in roll:
+        entry = summary.setdefault(unit['project'], {
+            'total_units': 0, 'occupied_units': 0, 'contracted_rent': 0.0, 'asking_rent': 0.0
+        })
+        entry['total_units'] += 1
+        if unit['status'] == 'occupied':
+            entry['occupied_units'] += 1
+            entry['contracted_rent'] += unit['rent_amount']
+        else:
+            entry['asking_rent'] += unit['target_rent']
+    return summary
+
+def occupancy_rate(occupied, total):
+    return round(occupied / total * 100, 1) if total else 0
+
+def take_occupancy_snapshot(as_of=None):
+    """Stores the rent roll totals per project for as_of (default today), replacing any earlier run."""
+    as_of = as_of or date.today()
+    summary = summarize_rent_roll(get_rent_roll(as_of))
+
+    OccupancySnapshot.query.filter_by(snapshot_date=as_of).delete(synchronize_session=False)
+    if summary:
+        now = datetime.utcnow()
+        db.session.execute(OccupancySnapshot.__table__.insert(), [
+            dict(entry, snapshot_date=as_of, project=project, created_at=now)
+            for project, entry in summary.items()
+        ])
+    db.session.commit()
+    return len(summary)
+
+def month_starts(months, today=None):
+    """The 1st of each of the last `months` months, current month last."""
+    current = (today or date.today()).replace(day=1)
+    return [current - relativedelta(months=i) for i in range(months - 1, -1, -1)]
+
+def backfill_occupancy_snapshots(months=24, today=None):
+    """
+    Rebuilds the month starts of the last `months` months that have no
+    snapshot (before nightly snapshots began) from lease history. Run by the
+    nightly snapshot job, never on page loads. Returns the dates filled.
+    """
+    dates = month_starts(months, today)
+    taken = {d for (d,) in db.session.query(OccupancySnapshot.snapshot_date).distinct()
+             .filter(OccupancySnapshot.snapshot_date.in_(dates))}
+    missing = [d for d in dates if d not in taken]
+    for d in missing:
+        take_occupancy_snapshot(d)
+    return missing
+
+def get_occupancy_trend(months=12, today=None):
+    """
+    Occupancy and contracted rent on the 1st of each of the last `months`
+    months (current month last), read from the snapshot table. Month starts
+    without a snapshot are left empty (None) until the nightly job fills them.
+    """
+    dates = month_starts(months, today)
+    snapshots = {
+        row.snapshot_date: row for row in db.session.query(
+            OccupancySnapshot.snapshot_date,
+            db.func.sum(OccupancySnapshot.total_units).label('total_units'),
+            db.func.sum(OccupancySnapshot.occupied_units).label('occupied_units'),
+            db.func.sum(OccupancySnapshot.contracted_rent).label('contracted_rent')
+        ).filter(OccupancySnapshot.snapshot_date.in_(dates))
+         .group_by(OccupancySnapshot.snapshot_date)
+    }
+
+    trend = {'labels': [], 'occupancy': [], 'contracted_rent': [], 'occupied_units': [], 'total_units': []}
+    for d in dates:
+        row = snapshots.get(d)
+        trend['labels'].append(d.strftime('%b %Y'))
+        if not row:
+            for key in ('occupancy', 'contracted_rent', 'occupied_units', 'total_units'):
+                trend[key].append(None)
+            continue
+        trend['occupancy'].append(occupancy_rate(row.occupied_units, row.total_units))
+        trend['contracted_rent'].append(round(float(row.contracted_rent or 0), 2))
+        trend['occupied_units'].append(row.occupied_units)
+        trend['total_units'].append(row.total_units)
+    return trend
@@ -0,0 +1,237 @@
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import select, update, bindparam
+
+from models import db, Invoice, InvoiceLineItem, Lease, Property, Project, PropertyExpense
+from utils_lease_ledger import attribute_to_lease, refresh_lease_summaries
+
+REVENUE_LEVELS = ['project', 'block', 'floor', 'unit']
+CHUNK_SIZE = 1000
+
+def _named_leases(leases, description):
+    """Leases whose unit appears in a line item description, e.g. "Monthly Rent (A-1-2)"."""
+    return [l for l in leases if f"({l.unit_number})" in (description or '')]
+
+def lease_property_ids(leases):
+    """
+    {lease_id: property_id} for the given leases. Legacy leases typed in
+    before properties were linked go by their unit number, as in
+    link_invoices_to_leases.
+    """
+    unlinked = sorted({l.unit_number for l in leases if not l.property_id})
+    unit_property = {}
+    for i in range(0, len(unlinked), CHUNK_SIZE):
+        unit_property.update(db.session.query(Property.unit_number, Property.id)
+                             .filter(Property.unit_number.in_(unlinked[i:i + CHUNK_SIZE])).all())
+    return {l.id: l.property_id or unit_property.get(l.unit_number) for l in leases}
+
+def link_invoices_to_leases():
+    """
+    Backfills Invoice / InvoiceLineItem lease_id and property_id for invoices
+    created before they were recorded. In order of confidence:
+      1. a line item naming one of the tenant's units ("Monthly Rent (unit)")
+      2. the property of a charged-back expense billed on the invoice
+      3. the tenant's only lease
+    Invoices naming several units stay unlinked at header level; their
+    line items are still linked individually.
+
+    Returns:
+        dict: {'invoices': linked, 'unmatched': not linked, 'line_items': linked}
+    """
+    conn = db.session.connection()
+
+    leases = {}
+    lease_by_id = {}
+    for lease in conn.execute(select(Lease.id, Lease.tenant_id, Lease.unit_number, Lease.property_id,
+                                     Lease.start_date, Lease.end_date)):
+        leases.setdefault(lease.tenant_id, []).append(lease)
+        lease_by_id[lease.id] = lease
+
+    # Legacy leases were typed in before properties were linked
+    unit_property = dict(conn.execute(select(Property.unit_number, Property.id)).all())
+    chargeback_property = dict(conn.execute(
+        select(PropertyExpense.tenant_invoice_id, PropertyExpense.property_id)
+        .where(PropertyExpense.tenant_invoice_id != None)
+    ).all())
+
+    def property_of(lease_id):
+        lease = lease_by_id[lease_id]
+        return lease.property_id or unit_property.get(lease.unit_number)
+
+    invoice_ids = conn.execute(select(Invoice.id).where(Invoice.lease_id == None).order_by(Invoice.id)).scalars().all()
+    counts = {'invoices': 0, 'unmatched': 0, 'line_items': 0}
+    touched_tenants = set()
+
+    for i in range(0, len(invoice_ids), CHUNK_SIZE):
+        chunk = invoice_ids[i:i + CHUNK_SIZE]
+        invoices = conn.execute(
+            select(Invoice.id, Invoice.tenant_id, Invoice.issue_date).where(Invoice.id.in_(chunk))
+        ).all()
+        lines = {}
+        for line in conn.execute(
+            select(InvoiceLineItem.id, InvoiceLineItem.invoice_id, InvoiceLineItem.description)
+            .where(InvoiceLineItem.invoice_id.in_(chunk))
+        ):
+            lines.setdefault(line.invoice_id, []).append(line)
+
+        invoice_updates = []
+        line_updates = []
+        for inv in invoices:
+            tenant_leases = leases.get(inv.tenant_id, [])
+
+            line_leases = {}
+            for line in lines.get(inv.id, []):
+                named = _named_leases(tenant_leases, line.description)
+                if named:
+                    line_leases[line.id] = attribute_to_lease(named, inv.issue_date)
+
+            lease_id = None
+            property_id = None
+            if len(set(line_leases.values())) == 1:
+                lease_id = next(iter(line_leases.values()))
+            elif not line_leases and inv.id in chargeback_property:
+                property_id = chargeback_property[inv.id]
+                on_property = [l for l in tenant_leases if property_of(l.id) == property_id]
+                lease_id = attribute_to_lease(on_property, inv.issue_date)
+            elif not line_leases and len(tenant_leases) == 1:
+                lease_id = tenant_leases[0].id
+            if lease_id:
+                property_id = property_of(lease_id)
+
+            if lease_id or property_id:
+                invoice_updates.append({'b_id': inv.id, 'b_lease_id': lease_id, 'b_property_id': property_id})
+                counts['invoices'] += 1
+                touched_tenants.add(inv.tenant_id)
+            else:
+                counts['unmatched'] += 1
+
+            for line in lines.get(inv.id, []):
+                line_lease_id = line_leases.get(line.id, lease_id)
+                line_property_id = property_of(line_lease_id) if line_lease_id else property_id
+                if line_lease_id or line_property_id:
+                    line_updates.append({'b_id': line.id, 'b_lease_id': line_lease_id, 'b_property_id': line_property_id})
+
+        if invoice_updates:
+            conn.execute(
+                update(Invoice.__table__).where(Invoice.__table__.c.id == bindparam('b_id'))
+                .values(lease_id=bindparam('b_lease_id'), property_id=bindparam('b_property_id')),
+                invoice_updates
+            )
+        if line_updates:
+            conn.execute(
+                update(InvoiceLineItem.__table__).where(InvoiceLineItem.__table__.c.id == bindparam('b_id'))
+                .values(lease_id=bindparam('b_lease_id'), property_id=bindparam('b_property_id')),
+                line_updates
+            )
+        counts['line_items'] += len(line_updates)
+
+    # Core updates bypass the flush events that keep lease summaries current
+    refresh_lease_summaries(touched_tenants, conn)
+    return counts
+
+def _level_columns(level):
+    columns = [db.func.coalesce(Project.name, Property.project, 'Unassigned').label('project')]
+    if level in ('block', 'floor', 'unit'):
+        columns.append(db.func.coalesce(Property.block, '-').label('block'))
+    if level in ('floor', 'unit'):
+        columns.append(db.func.coalesce(Property.floor, '-').label('floor'))
+    if level == 'unit':
+        columns.append(Property.unit_number.label('unit_number'))
+    return columns
+
+def get_revenue_by(level, start_month, end_month, project=None):
+    """
+    Billed revenue and yield per project, block, floor or unit for the months
+    start_month..end_month (by invoice issue date). Two grouped queries:
+    revenue from linked line items and capacity (units, sqft, asking rent)
+    from unarchived properties. SST and void invoices are excluded.
+
+    Yield is rent billed against asking rent (target_rent x months).
+
+    Returns:
+        dict: {'level', 'columns', 'months', 'rows', 'total', 'unattributed'}
+    """
+    if level not in REVENUE_LEVELS:
+        level = 'project'
+    start_month = start_month.replace(day=1)
+    period_end = end_month.replace(day=1) + relativedelta(months=1)
+    months = (period_end.year - start_month.year) * 12 + period_end.month - start_month.month
+
+    columns = _level_columns(level)
+    keys = [c.name for c in columns]
+    project_column = columns[0].element
+
+    is_rent = db.func.lower(InvoiceLineItem.item_type) == 'rent'
+    billed = db.session.query(
+        *columns,
+        db.func.sum(InvoiceLineItem.amount).label('revenue'),
+        db.func.sum(db.case((is_rent, InvoiceLineItem.amount), else_=0)).label('rent')
+    ).select_from(InvoiceLineItem)\
+     .join(Invoice, InvoiceLineItem.invoice_id == Invoice.id)\
+     .join(Property, InvoiceLineItem.property_id == Property.id)\
+     .outerjoin(Project, Property.project_id == Project.id)\
+     .filter(
+        Invoice.issue_date >= start_month,
+        Invoice.issue_date < period_end,
+        Invoice.status != 'void',
+        InvoiceLineItem.item_type != 'sst'
+     )
+
+    capacity = db.session.query(
+        *columns,
+        db.func.count(Property.id).label('units'),
+        db.func.sum(Property.size_sqft).label('sqft'),
+        db.func.sum(Property.target_rent).label('target_rent')
+    ).select_from(Property)\
+     .outerjoin(Project, Property.project_id == Project.id)\
+     .filter(db.or_(Property.archived == False, Property.archived == None))
+
+    if project:
+        billed = billed.filter(project_column == project)
+        capacity = capacity.filter(project_column == project)
+
+    group = [c.element for c in columns]
+    rows = {}
+    for row in capacity.group_by(*group):
+        rows[tuple(getattr(row, k) for k in keys)] = {
+            'units': row.units, 'sqft': float(row.sqft or 0), 'target_rent': float(row.target_rent or 0),
+            'revenue': 0.0, 'rent': 0.0
+        }
+    for row in billed.group_by(*group):
+        entry = rows.setdefault(tuple(getattr(row, k) for k in keys),
+                                {'units': 0, 'sqft': 0.0, 'target_rent': 0.0, 'revenue': 0.0, 'rent': 0.0})
+        entry['revenue'] = float(row.revenue or 0)
+        entry['rent'] = float(row.rent or 0)
+
+    def with_yield(entry):
+        target = entry['target_rent'] * months
+        entry['other'] = entry['revenue'] - entry['rent']
+        entry['target'] = target
+        entry['yield_pct'] = (entry['rent'] / target * 100) if target else None
+        entry['rent_per_sqft'] = (entry['rent'] / entry['sqft'] / months) if entry['sqft'] else None
+        return entry
+
+    report_rows = [with_yield(dict(zip(keys, key), **entry)) for key, entry in sorted(rows.items(), key=lambda kv: [str(k) for k in kv[0]])]
+
+    total = {'units': 0, 'sqft': 0.0, 'target_rent': 0.0, 'revenue': 0.0, 'rent': 0.0}
+    for entry in report_rows:
+        for field in total:
+            total[field] += entry[field]
+
+    unattributed = db.session.query(db.func.sum(InvoiceLineItem.amount))\
+        .join(Invoice, InvoiceLineItem.invoice_id == Invoice.id)\
+        .filter(
+            InvoiceLineItem.property_id == None,
+            Invoice.issue_date >= start_month,
+            Invoice.issue_date < period_end,
+            Invoice.status != 'void',
+            InvoiceLineItem.item_type != 'sst'
+        ).scalar()
+
+    return {
+        'level': level,
+        'columns': keys,
+        'months': months,
+        'rows': report_rows,
+        'total': with_yield(total),
+        'unattributed': float(unattributed or 0)
+    }
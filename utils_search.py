@@ -0,0 +1,196 @@
+from sqlalchemy import select, text
+
+from models import db
+
+# Document rowid = ref_id * KIND_SLOTS + kind code, so a trigger can replace one
+# document by rowid without scanning the index
+KIND_SLOTS = 4
+KINDS = {'tenant': 1, 'property': 2, 'invoice': 3}
+
+# The trigram tokenizer only matches terms of 3+ characters; shorter terms use LIKE
+MIN_TRIGRAM = 3
+
+# Column weights for bm25(): kind, ref_id, title, keywords
+RANK_WEIGHTS = (0.0, 0.0, 10.0, 1.0)
+
+SEARCH_INDEX = db.table(
+    'search_index',
+    db.column('rowid'), db.column('kind'), db.column('ref_id'), db.column('title'), db.column('keywords')
+)
+
+def _tenant_doc(where):
+    return f"""
+        INSERT INTO search_index(rowid, kind, ref_id, title, keywords)
+        SELECT doc_id, kind, ref_id, title, keywords FROM search_tenant_doc WHERE {where};"""
+
+def _property_doc(where):
+    return f"""
+        INSERT INTO search_index(rowid, kind, ref_id, title, keywords)
+        SELECT doc_id, kind, ref_id, title, keywords FROM search_property_doc WHERE {where};"""
+
+def _invoice_doc(where):
+    return f"""
+        INSERT INTO search_index(rowid, kind, ref_id, title, keywords)
+        SELECT doc_id, kind, ref_id, title, keywords FROM search_invoice_doc WHERE {where};"""
+
+def _drop(kind, ref_id):
+    return f"\n        DELETE FROM search_index WHERE rowid = {ref_id} * {KIND_SLOTS} + {KINDS[kind]};"
+
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "kind UNINDEXED, ref_id UNINDEXED, title, keywords, tokenize='trigram')",
+
+    # One view per document kind; the triggers and rebuild_search_index() insert from these
+    f"""CREATE VIEW IF NOT EXISTS search_tenant_doc AS
+        SELECT t.id * {KIND_SLOTS} + {KINDS['tenant']} AS doc_id, 'tenant' AS kind, t.id AS ref_id, t.name AS title,
+               coalesce(t.account_code, '') || ' ' || coalesce(t.company_reg_no, '') || ' ' ||
+               coalesce(t.sst_registration_number, '') || ' ' ||
+               coalesce((SELECT group_concat(coalesce(l.unit_number, '') || ' ' || coalesce(l.project, ''), ' ')
+                         FROM lease l WHERE l.tenant_id = t.id), '') AS keywords
+        FROM tenant t""",
+    f"""CREATE VIEW IF NOT EXISTS search_property_doc AS
+        SELECT p.id * {KIND_SLOTS} + {KINDS['property']} AS doc_id, 'property' AS kind, p.id AS ref_id,
+               p.unit_number AS title, p.project_id AS project_id,
+               coalesce(pr.name, p.project, '') || ' ' || coalesce(p.property_type, '') || ' ' ||
+               coalesce(p.block, '') || ' ' || coalesce(p.unit, '') AS keywords
+        FROM property p LEFT JOIN project pr ON pr.id = p.project_id""",
+    f"""CREATE VIEW IF NOT EXISTS search_invoice_doc AS
+        SELECT i.id * {KIND_SLOTS} + {KINDS['invoice']} AS doc_id, 'invoice' AS kind, i.id AS ref_id,
+               'Invoice #' || i.id AS title, i.tenant_id AS tenant_id,
+               coalesce(i.description, '') || ' ' || coalesce(t.name, '') || ' ' || coalesce(t.account_code, '') AS keywords
+        FROM invoice i LEFT JOIN tenant t ON t.id = i.tenant_id""",
+
+    # Tenants
+    "CREATE TRIGGER IF NOT EXISTS search_tenant_ai AFTER INSERT ON tenant BEGIN"
+    + _tenant_doc('ref_id = NEW.id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_tenant_au "
+    "AFTER UPDATE OF name, account_code, company_reg_no, sst_registration_number ON tenant BEGIN"
+    + _drop('tenant', 'OLD.id') + _tenant_doc('ref_id = NEW.id') + "\n    END",
+    # Invoice documents carry the tenant name and account code
+    "CREATE TRIGGER IF NOT EXISTS search_tenant_au_invoices AFTER UPDATE OF name, account_code ON tenant "
+    "WHEN OLD.name IS NOT NEW.name OR OLD.account_code IS NOT NEW.account_code BEGIN"
+    f"\n        DELETE FROM search_index WHERE rowid IN "
+    f"(SELECT id * {KIND_SLOTS} + {KINDS['invoice']} FROM invoice WHERE tenant_id = NEW.id);"
+    + _invoice_doc('tenant_id = NEW.id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_tenant_ad AFTER DELETE ON tenant BEGIN"
+    + _drop('tenant', 'OLD.id') + "\n    END",
+
+    # Leases feed the unit numbers and projects of their tenant's document
+    "CREATE TRIGGER IF NOT EXISTS search_lease_ai AFTER INSERT ON lease BEGIN"
+    + _drop('tenant', 'NEW.tenant_id') + _tenant_doc('ref_id = NEW.tenant_id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_lease_au AFTER UPDATE OF tenant_id, unit_number, project ON lease BEGIN"
+    + _drop('tenant', 'OLD.tenant_id') + _tenant_doc('ref_id = OLD.tenant_id')
+    + _drop('tenant', 'NEW.tenant_id') + _tenant_doc('ref_id = NEW.tenant_id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_lease_ad AFTER DELETE ON lease BEGIN"
+    + _drop('tenant', 'OLD.tenant_id') + _tenant_doc('ref_id = OLD.tenant_id') + "\n    END",
+
+    # Properties
+    "CREATE TRIGGER IF NOT EXISTS search_property_ai AFTER INSERT ON property BEGIN"
+    + _property_doc('ref_id = NEW.id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_property_au "
+    "AFTER UPDATE OF unit_number, project, project_id, property_type, block, unit ON property BEGIN"
+    + _drop('property', 'OLD.id') + _property_doc('ref_id = NEW.id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_property_ad AFTER DELETE ON property BEGIN"
+    + _drop('property', 'OLD.id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_project_au AFTER UPDATE OF name ON project BEGIN"
+    f"\n        DELETE FROM search_index WHERE rowid IN "
+    f"(SELECT id * {KIND_SLOTS} + {KINDS['property']} FROM property WHERE project_id = NEW.id);"
+    + _property_doc('project_id = NEW.id') + "\n    END",
+
+    # Invoices
+    "CREATE TRIGGER IF NOT EXISTS search_invoice_ai AFTER INSERT ON invoice BEGIN"
+    + _invoice_doc('ref_id = NEW.id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_invoice_au AFTER UPDATE OF description, tenant_id ON invoice BEGIN"
+    + _drop('invoice', 'OLD.id') + _invoice_doc('ref_id = NEW.id') + "\n    END",
+    "CREATE TRIGGER IF NOT EXISTS search_invoice_ad AFTER DELETE ON invoice BEGIN"
+    + _drop('invoice', 'OLD.id') + "\n    END",
+]
+
+def rebuild_search_index(connection=None):
+    """Repopulates the whole index from the document views. Returns documents indexed."""
+    conn = connection or db.session.connection()
+    conn.execute(text("DELETE FROM search_index"))
+    for view in ('search_tenant_doc', 'search_property_doc', 'search_invoice_doc'):
+        conn.execute(text(
+            "INSERT INTO search_index(rowid, kind, ref_id, title, keywords) "
+            f"SELECT doc_id, kind, ref_id, title, keywords FROM {view}"
+        ))
+    return conn.execute(text("SELECT count(*) FROM search_index")).scalar()
+
+def ensure_search_index(engine=None):
+    """
+    Creates the FTS5 index, document views and sync triggers if missing.
+    Triggers go with their table when it is dropped, so a missing trigger
+    means rows may have changed unseen: the index is then rebuilt from
+    existing rows, as is a newly created one. Returns True when rebuilt.
+    """
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+    expected = sum(1 for statement in SEARCH_DDL if 'CREATE TRIGGER' in statement)
+    with engine.begin() as conn:
+        existing = dict(conn.execute(text(
+            "SELECT type, count(*) FROM sqlite_master "
+            "WHERE (type = 'table' AND name = 'search_index') OR (type = 'trigger' AND name LIKE 'search%') "
+            "GROUP BY type"
+        )).all())
+        stale = not existing.get('table') or existing.get('trigger', 0) < expected
+        for statement in SEARCH_DDL:
+            conn.execute(text(statement))
+        if stale:
+            rebuild_search_index(conn)
+    return stale
+
+def search_filter(query_text):
+    """
+    WHERE clause over search_index requiring every whitespace-separated term.
+    Terms of 3+ characters go through the trigram MATCH (quoted, so unit
+    numbers like 1-3-7B are taken literally); shorter ones fall back to LIKE.
+    Returns (clause, uses_match) or (None, False) for an empty query.
+    """
+    terms = (query_text or '').split()
+    if not terms:
+        return None, False
+    clauses = []
+    long_terms = [t for t in terms if len(t) >= MIN_TRIGRAM]
+    if long_terms:
+        phrases = ' '.join('"' + t.replace('"', '""') + '"' for t in long_terms)
+        clauses.append(db.literal_column('search_index').op('MATCH')(phrases))
+    for t in terms:
+        if len(t) < MIN_TRIGRAM:
+            like = '%' + t.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            clauses.append(db.or_(
+                SEARCH_INDEX.c.title.like(like, escape='\\'),
+                SEARCH_INDEX.c.keywords.like(like, escape='\\')
+            ))
+    return db.and_(*clauses), bool(long_terms)
+
+def matching_ids(kind, query_text):
+    """Subquery of ref_ids of one kind matching the query, for use in Model.id.in_(...)."""
+    clause, _ = search_filter(query_text)
+    return select(SEARCH_INDEX.c.ref_id).where(SEARCH_INDEX.c.kind == kind, clause)
+
+def search(query_text, kinds=None, limit=20):
+    """
+    Ranked documents matching the query: bm25 with the title weighted over
+    keywords, titles starting with the query first.
+
+    Returns:
+        list of dicts {'kind', 'id', 'title', 'keywords'}
+    """
+    clause, uses_match = search_filter(query_text)
+    if clause is None:
+        return []
+    c = SEARCH_INDEX.c
+    query = select(c.kind, c.ref_id, c.title, c.keywords).where(clause)
+    if kinds:
+        query = query.where(c.kind.in_(list(kinds)))
+    order = [c.title.like(query_text.strip() + '%').desc()]
+    if uses_match:
+        order.append(db.func.bm25(db.literal_column('search_index'), *RANK_WEIGHTS))
+    query = query.order_by(*order, c.title).limit(limit)
+
+    return [
+        {'kind': row.kind, 'id': row.ref_id, 'title': row.title, 'keywords': ' '.join(row.keywords.split())}
+        for row in db.session.execute(query)
+    ]
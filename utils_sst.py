@@ -1,5 +1,6 @@
 
 from decimal import Decimal, ROUND_HALF_UP
+from models import db, Invoice, InvoiceLineItem, Tenant
 
 SST_RATE = Decimal('0.08')
 
@@ -92,3 +93,36 @@ def get_sst_amount_if_applicable(tenant, amount, invoice_date, period_start=None
             return calculate_sst(amount)
         
     return 0.0
+
+def iter_sst_invoices(start_date, end_date):
+    """
+    Streams every non-void invoice in the period that carries an 'sst' line,
+    with its SST and base (non-SST lines) amounts summed in SQL.
+    One joined, grouped query; rows arrive in issue date order.
+    """
+    is_sst = InvoiceLineItem.item_type == 'sst'
+    tax_amount = db.func.sum(db.case((is_sst, InvoiceLineItem.amount), else_=0))
+    base_amount = db.func.sum(db.case((is_sst, 0), else_=InvoiceLineItem.amount))
+    sst_lines = db.func.sum(db.case((is_sst, 1), else_=0))
+
+    query = db.session.query(
+        Invoice.id,
+        Invoice.issue_date,
+        Invoice.description,
+        Invoice.total_amount,
+        Tenant.id.label('tenant_id'),
+        Tenant.name.label('tenant_name'),
+        Tenant.sst_registration_number,
+        tax_amount.label('tax_amount'),
+        base_amount.label('base_amount')
+    ).join(Tenant, Invoice.tenant_id == Tenant.id)\
+     .join(InvoiceLineItem, InvoiceLineItem.invoice_id == Invoice.id)\
+     .filter(
+        Invoice.issue_date >= start_date,
+        Invoice.issue_date <= end_date,
+        Invoice.status != 'void'
+     ).group_by(Invoice.id, Tenant.id)\
+     .having(sst_lines > 0)\
+     .order_by(Invoice.issue_date, Invoice.id)
+
+    return query.execution_options(stream_results=True, yield_per=1000)
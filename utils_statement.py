@@ -0,0 +1,143 @@
+from models import db, Invoice, Receipt
+from sqlalchemy import select, union_all, literal, func
+
+# Same-day ordering: charges before payments, then document id
+DOC_ORDER = {'Invoice': 0, 'Payment': 1}
+
+def _ledger_entries(tenant_ids=None, from_date=None, to_date=None):
+    """UNION ALL of invoice (debit) and receipt (credit) entries, as a subquery."""
+    inv = select(
+        Invoice.tenant_id.label('tenant_id'),
+        Invoice.issue_date.label('date'),
+        literal(DOC_ORDER['Invoice']).label('doc_order'),
+        Invoice.id.label('doc_id'),
+        Invoice.description.label('description'),
+        Invoice.status.label('status'),
+        Invoice.total_amount.label('debit'),
+        literal(0.0).label('credit')
+    ).where(Invoice.status != 'void')
+
+    rec = select(
+        Receipt.tenant_id.label('tenant_id'),
+        Receipt.date_received.label('date'),
+        literal(DOC_ORDER['Payment']).label('doc_order'),
+        Receipt.id.label('doc_id'),
+        Receipt.reference.label('description'),
+        literal(None).label('status'),
+        literal(0.0).label('debit'),
+        Receipt.amount.label('credit')
+    )
+
+    if tenant_ids is not None:
+        inv = inv.where(Invoice.tenant_id.in_(tenant_ids))
+        rec = rec.where(Receipt.tenant_id.in_(tenant_ids))
+    if from_date:
+        inv = inv.where(Invoice.issue_date >= from_date)
+        rec = rec.where(Receipt.date_received >= from_date)
+    if to_date:
+        inv = inv.where(Invoice.issue_date <= to_date)
+        rec = rec.where(Receipt.date_received <= to_date)
+
+    return union_all(inv, rec).subquery()
+
+def get_balances_before(from_date, tenant_ids=None):
+    """
+    Opening balance per tenant: charges minus payments dated before from_date.
+    One grouped aggregate served by the (tenant_id, date) indexes.
+    Returns {tenant_id: balance}; tenants with no history are absent.
+    """
+    if not from_date:
+        return {}
+
+    inv = select(
+        Invoice.tenant_id.label('tenant_id'),
+        Invoice.total_amount.label('amount')
+    ).where(Invoice.status != 'void', Invoice.issue_date < from_date)
+    rec = select(
+        Receipt.tenant_id.label('tenant_id'),
+        (-Receipt.amount).label('amount')
+    ).where(Receipt.date_received < from_date)
+
+    if tenant_ids is not None:
+        inv = inv.where(Invoice.tenant_id.in_(tenant_ids))
+        rec = rec.where(Receipt.tenant_id.in_(tenant_ids))
+
+    movements = union_all(inv, rec).subquery()
+    rows = db.session.execute(
+        select(movements.c.tenant_id, func.sum(movements.c.amount)).group_by(movements.c.tenant_id)
+    )
+    return {tenant_id: float(balance or 0) for tenant_id, balance in rows}
+
+def get_range_totals(tenant_id, from_date=None, to_date=None):
+    """(total debits, total credits) for a tenant within the range."""
+    entries = _ledger_entries([tenant_id], from_date, to_date)
+    debit, credit = db.session.execute(
+        select(func.sum(entries.c.debit), func.sum(entries.c.credit))
+    ).one()
+    return float(debit or 0), float(credit or 0)
+
+def iter_statement_rows(tenant_ids=None, from_date=None, to_date=None, opening=None, offset=0, limit=None):
+    """
+    Streams ledger rows ordered by tenant then date with a running balance.
+
+    The running balance is a SQL window (SUM() OVER, partitioned by tenant) over
+    the rows in range; the opening balance per tenant is added on top, so paging
+    with offset/limit still yields correct balances.
+    """
+    opening = opening or {}
+    entries = _ledger_entries(tenant_ids, from_date, to_date)
+    order = (entries.c.date, entries.c.doc_order, entries.c.doc_id)
+
+    running = func.sum(entries.c.debit - entries.c.credit).over(
+        partition_by=entries.c.tenant_id,
+        order_by=order,
+        rows=(None, 0)
+    ).label('running')
+
+    stmt = select(entries, running).order_by(entries.c.tenant_id, *order).offset(offset or None)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=500))
+    for row in result:
+        is_invoice = row.doc_order == DOC_ORDER['Invoice']
+        if is_invoice:
+            desc = row.description
+        else:
+            desc = f"Ref: {row.description}" if row.description else "Payment"
+        yield {
+            'tenant_id': row.tenant_id,
+            'date': row.date,
+            'type': 'Invoice' if is_invoice else 'Payment',
+            'ref': f"#{row.doc_id}" if is_invoice else f"R-{row.doc_id}",
+            'doc_id': row.doc_id,
+            'desc': desc,
+            'status': row.status,
+            'debit': float(row.debit or 0),
+            'credit': float(row.credit or 0),
+            'balance': opening.get(row.tenant_id, 0) + float(row.running or 0)
+        }
+
+def iter_portfolio_statements(tenants, from_date, to_date):
+    """
+    Month-end statements for many tenants in one pass: one opening-balance
+    aggregate plus one windowed scan over the period, grouped by tenant.
+
+    Yields (tenant, opening_balance, rows) for tenants with a balance or activity.
+    `tenants` must be ordered by id; rows is a list for that tenant.
+    """
+    tenant_ids = [t.id for t in tenants]
+    opening = get_balances_before(from_date, tenant_ids)
+    rows = iter_statement_rows(tenant_ids, from_date, to_date, opening=opening)
+
+    pending = next(rows, None)
+    for tenant in tenants:
+        tenant_rows = []
+        while pending is not None and pending['tenant_id'] == tenant.id:
+            tenant_rows.append(pending)
+            pending = next(rows, None)
+
+        balance = opening.get(tenant.id, 0)
+        if not tenant_rows and abs(balance) < 0.01:
+            continue
+        yield tenant, balance, tenant_rows
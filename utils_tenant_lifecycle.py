@@ -0,0 +1,126 @@
+from datetime import date, datetime
+from itertools import chain
+
+from sqlalchemy import event, inspect, select, update, exists
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, Tenant, Lease, AuditLog
+import utils_lease_timeline # Registers latest_lease_end upkeep before ours; effective_status reads it
+
+# Tenants whose status or leases changed in the current flush (kept on session.info)
+PENDING_KEY = 'tenant_lifecycle_tenants'
+
+SYSTEM_USER_ID = 1 # Same fallback as utils.log_audit for background actions
+TERMINAL_STATUSES = ('past', 'evicted') # Set by hand; never overridden by lease dates
+
+def effective_status_expr(today):
+    """
+    SQL CASE giving a tenant's status as of today:
+    past / evicted stay as set, prospective stays prospective until a lease
+    has started, anyone else is active while a lease runs to today or later,
+    else lapsed (whatever was stored, e.g. a legacy 'lapse').
+    """
+    t = Tenant.__table__.c
+    lease_started = exists().where(Lease.tenant_id == t.id, Lease.start_date <= today)
+    return db.case(
+        (t.status.in_(TERMINAL_STATUSES), t.status),
+        (db.and_(t.status == 'prospective', ~lease_started), 'prospective'),
+        (t.latest_lease_end >= today, 'active'),
+        else_='lapsed'
+    )
+
+def _needs_refresh(new_status):
+    t = Tenant.__table__.c
+    return db.or_(t.effective_status == None, t.effective_status != new_status)
+
+def refresh_effective_status(tenant_ids=None, connection=None, today=None):
+    """Recomputes effective_status in one UPDATE (given tenants, or all). Returns rows changed."""
+    conn = connection or db.session.connection()
+    new_status = effective_status_expr(today or date.today())
+    stmt = update(Tenant.__table__).values(effective_status=new_status).where(_needs_refresh(new_status))
+    if tenant_ids is not None:
+        stmt = stmt.where(Tenant.__table__.c.id.in_(list(tenant_ids)))
+    return conn.execute(stmt).rowcount
+
+def run_tenant_lifecycle(today=None, dry_run=False):
+    """
+    Nightly tenant status job (tenant_lifecycle.py, or the Tenants page
+    button): recomputes effective_status from lease dates in one set-based
+    UPDATE for every tenant whose value changed, and writes each transition
+    to the audit log in one batch insert. The status typed in by users is
+    never changed. Effective statuses filled for the first time are not
+    audited. dry_run computes everything and rolls back.
+
+    Returns:
+        dict: {'effective_changes', 'initialised', 'transitions': [(tenant_id, field, old, new, reason)]}
+    """
+    today = today or date.today()
+    conn = db.session.connection()
+    t = Tenant.__table__.c
+    transitions = []
+
+    new_status = effective_status_expr(today)
+    changed = conn.execute(
+        select(t.id, t.effective_status, new_status.label('new_status'), t.latest_lease_end).where(_needs_refresh(new_status))
+    ).all()
+    initialised = 0
+    if changed:
+        conn.execute(update(Tenant.__table__).values(effective_status=new_status).where(_needs_refresh(new_status)))
+        for row in changed:
+            if row.effective_status is None:
+                initialised += 1
+                continue
+            reason = f"latest lease ends {row.latest_lease_end.isoformat()}" if row.latest_lease_end else 'no leases'
+            transitions.append((row.id, 'effective_status', row.effective_status, row.new_status, reason))
+
+    if transitions:
+        now = datetime.utcnow()
+        conn.execute(AuditLog.__table__.insert(), [
+            {
+                'user_id': SYSTEM_USER_ID,
+                'action': 'STATUS',
+                'target_type': 'Tenant',
+                'target_id': tenant_id,
+                'details': f"Lifecycle job: {field} {old or '-'} -> {new} ({reason})",
+                'timestamp': now
+            }
+            for tenant_id, field, old, new, reason in transitions
+        ])
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+
+    return {
+        'effective_changes': len(changed) - initialised,
+        'initialised': initialised,
+        'transitions': transitions
+    }
+
+@event.listens_for(Session, 'after_flush')
+def _collect_lifecycle_tenants(session, flush_context):
+    touched = session.info.setdefault(PENDING_KEY, set())
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Tenant) and (obj in session.new or inspect(obj).attrs.status.history.has_changes()):
+            touched.add(obj.id)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Lease):
+            touched.add(obj.tenant_id)
+            touched.update(inspect(obj).attrs.tenant_id.history.deleted or ())
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _refresh_lifecycle_tenants(session, flush_context):
+    touched = sorted(t for t in session.info.pop(PENDING_KEY, None) or () if t is not None)
+    if not touched:
+        return
+    conn = session.connection()
+    refresh_effective_status(touched, conn)
+    # Keep Tenant objects already in the session consistent without a reload
+    for tenant_id, status in conn.execute(
+        select(Tenant.id, Tenant.effective_status).where(Tenant.id.in_(touched))
+    ):
+        tenant = session.identity_map.get(session.identity_key(Tenant, tenant_id))
+        if tenant is not None:
+            set_committed_value(tenant, 'effective_status', status)
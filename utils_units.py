@@ -0,0 +1,192 @@
+import re
+
+from sqlalchemy import event, select, update, bindparam
+
+from models import db, Property, Lease
+
+LOT_RE = re.compile(r'\bLOT\s*(?:NO\b\.?\s*)?(?=\d)') # "Lot 23", "LOT23", "Lot No. 23" -> "LOT-23"
+SEPARATOR_RE = re.compile(r'[^A-Z0-9]+')
+LOT_SUFFIX_RE = re.compile(r'(?:^|-)(LOT-[A-Z0-9].*)$')
+
+def project_key(project):
+    """Project name with the same case and separator rules as unit keys ("Latitud 6" -> "LATITUD-6")."""
+    if not project:
+        return None
+    return SEPARATOR_RE.sub('-', str(project).strip().upper()).strip('-') or None
+
+def unit_key(unit):
+    """
+    Canonical form of a unit number, used to match units across imports:
+      - upper case, any run of separators becomes a single '-'
+      - account-style prefixes are dropped (KC2/1-3-7B -> 1-3-7B)
+      - "Lot" variants are unified and win over any block prefix
+        (G-11-Lot 23, LOT23, Lot No. 23 -> LOT-23)
+    Returns None for a blank unit.
+    """
+    if unit is None:
+        return None
+    key = str(unit).strip().upper()
+    if '/' in key:
+        key = key.rsplit('/', 1)[-1]
+    key = LOT_RE.sub('LOT-', key)
+    key = SEPARATOR_RE.sub('-', key).strip('-')
+    lot = LOT_SUFFIX_RE.search(key)
+    if lot:
+        key = lot.group(1)
+    return key or None
+
+def dropped_parts(unit):
+    """
+    (account prefix, block) that unit_key() drops from a unit, each None when
+    absent: KC2/1-3-7B -> ('KC2', None), G-11-Lot 23 -> (None, 'G-11').
+    """
+    if unit is None:
+        return None, None
+    key = str(unit).strip().upper()
+    account = None
+    if '/' in key:
+        account, key = key.rsplit('/', 1)
+        account = SEPARATOR_RE.sub('-', account).strip('-') or None
+    key = SEPARATOR_RE.sub('-', LOT_RE.sub('LOT-', key)).strip('-')
+    lot = LOT_SUFFIX_RE.search(key)
+    block = key[:lot.start(1)].strip('-') if lot else ''
+    return account, block or None
+
+def _compatible(unit, property_unit):
+    """
+    Whether a key match of the typed unit to the property's unit holds: the
+    block the key dropped must be left out or the same, and so must the
+    account prefix, unless the property has none (KC2/1-3-7B -> 1-3-7B, as
+    imports have always been matched).
+    """
+    account, block = dropped_parts(unit)
+    own_account, own_block = dropped_parts(property_unit)
+    return (block is None or block == own_block) and (account is None or own_account is None or account == own_account)
+
+def candidate_keys(unit, project=None):
+    """
+    Keys to try for a unit string, best first: the unit itself, then the
+    project-prefixed form (import has 1-3-7B, property is KC-1-3-7B), then
+    the unit with its project prefix removed (the reverse).
+    """
+    key = unit_key(unit)
+    if not key:
+        return []
+    keys = [key]
+    prefix = project_key(project)
+    if prefix:
+        keys.append(f"{prefix}-{key}")
+        if key.startswith(prefix + '-') and len(key) > len(prefix) + 1:
+            keys.append(key[len(prefix) + 1:])
+    return keys
+
+def load_unit_index():
+    """
+    {unit_key: [Property]} for every property, for matching many rows without
+    a query each. A key can belong to several units (G-11-Lot 23, A-2-Lot 23).
+    """
+    index = {}
+    for p in Property.query.filter(Property.unit_key != None).order_by(Property.id):
+        index.setdefault(p.unit_key, []).append(p)
+    return index
+
+def _same_unit(a, b):
+    return str(a).strip().upper() == str(b).strip().upper()
+
+def find_property(unit, project=None, index=None):
+    """
+    The property a unit string refers to, or None. Uses the in-memory index
+    from load_unit_index() when given, otherwise one query on the unit_key
+    index. The key drops account prefixes and blocks, so a key match only
+    counts when the typed unit names the same ones as the property (or
+    leaves them out): A-2-Lot 23 never resolves to G-11-Lot 23. Of several
+    such matches, only the unit typed exactly is taken.
+    """
+    keys = candidate_keys(unit, project)
+    if not keys:
+        return None
+    if index is None:
+        index = {}
+        for p in Property.query.filter(Property.unit_key.in_(keys)).order_by(Property.id):
+            index.setdefault(p.unit_key, []).append(p)
+    for k in keys:
+        matches = [p for p in index.get(k, []) if _compatible(unit, p.unit_number)]
+        if len(matches) == 1:
+            return matches[0]
+        exact = next((p for p in matches if _same_unit(p.unit_number, unit)), None)
+        if exact:
+            return exact
+    return None
+
+def relink_leases(connection=None):
+    """
+    Links every lease without a property to the one its unit resolves to:
+    one UPDATE ... FROM join on the exact unit number, then find_property()
+    for the rest against an in-memory index, written in one executemany.
+    Returns the number of leases linked.
+    """
+    conn = connection or db.session.connection()
+    lease, prop = Lease.__table__, Property.__table__
+    linked = conn.execute(
+        update(lease).where(lease.c.property_id == None, prop.c.unit_number == lease.c.unit_number)
+        .values(property_id=prop.c.id)
+    ).rowcount
+
+    orphans = conn.execute(
+        select(lease.c.id, lease.c.unit_number, lease.c.project)
+        .where(lease.c.property_id == None, lease.c.unit_key != None)
+    ).all()
+    if not orphans:
+        return linked
+    index = {}
+    for row in conn.execute(select(prop.c.id, prop.c.unit_number, prop.c.unit_key).where(prop.c.unit_key != None).order_by(prop.c.id)):
+        index.setdefault(row.unit_key, []).append(row)
+    rows = []
+    for lease_id, unit_number, project in orphans:
+        match = find_property(unit_number, project, index)
+        if match:
+            rows.append({'b_id': lease_id, 'b_property': match.id})
+    if rows:
+        conn.execute(
+            update(lease).where(lease.c.id == bindparam('b_id')).values(property_id=bindparam('b_property')), rows
+        )
+    return linked + len(rows)
+
+def backfill_unit_keys(connection=None):
+    """
+    Fills unit_key on every property and lease. Properties sharing a key
+    (distinct units that normalize alike) all keep it and are returned as
+    (property_id, unit_number, key) for review; they only match on their
+    exact unit number.
+    """
+    conn = connection or db.session.connection()
+    by_key = {}
+    rows = []
+    for prop_id, unit_number in conn.execute(select(Property.id, Property.unit_number).order_by(Property.id)):
+        key = unit_key(unit_number)
+        if key:
+            by_key.setdefault(key, []).append((prop_id, unit_number, key))
+        rows.append({'b_id': prop_id, 'b_key': key})
+    collisions = [prop for props in by_key.values() if len(props) > 1 for prop in props]
+    if rows:
+        conn.execute(
+            update(Property.__table__).where(Property.__table__.c.id == bindparam('b_id'))
+            .values(unit_key=bindparam('b_key')), rows
+        )
+    lease_rows = [
+        {'b_id': lease_id, 'b_key': unit_key(unit_number)}
+        for lease_id, unit_number in conn.execute(select(Lease.id, Lease.unit_number))
+    ]
+    if lease_rows:
+        conn.execute(
+            update(Lease.__table__).where(Lease.__table__.c.id == bindparam('b_id'))
+            .values(unit_key=bindparam('b_key')), lease_rows
+        )
+    return collisions
+
+@event.listens_for(Property, 'before_insert')
+@event.listens_for(Property, 'before_update')
+@event.listens_for(Lease, 'before_insert')
+@event.listens_for(Lease, 'before_update')
+def _set_unit_key(mapper, connection, target):
+    target.unit_key = unit_key(target.unit_number)
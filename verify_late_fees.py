@@ -0,0 +1,59 @@
+from app import create_app, db
+from models import Tenant, Invoice, InvoiceLineItem
+from datetime import date, timedelta
+from routes.billing import calculate_late_fees
+
+app = create_app()
+
+# An overdue rent invoice also carries SST and charge-back lines (as
+# generate_rent makes them); only the rent line may attract the late fee.
+
+def run_test():
+    with app.app_context():
+        print("Setting up test data...")
+        t = Tenant.query.filter_by(account_code='TEST-LATEFEE').first()
+        if not t:
+            t = Tenant(name='Test Late Fee Tenant', account_code='TEST-LATEFEE', status='active')
+            db.session.add(t)
+            db.session.commit()
+
+        # Clear old invoices for this tenant
+        InvoiceLineItem.query.filter(InvoiceLineItem.invoice_id.in_(
+            Invoice.query.with_entities(Invoice.id).filter_by(tenant_id=t.id)
+        )).delete(synchronize_session=False)
+        Invoice.query.filter_by(tenant_id=t.id).delete()
+        db.session.commit()
+
+        due = date.today().replace(day=1) - timedelta(days=40)
+        inv = Invoice(tenant_id=t.id, due_date=due, total_amount=1180, status='unpaid', description="Test late fee")
+        db.session.add(inv)
+        db.session.flush()
+        db.session.add_all([
+            InvoiceLineItem(invoice_id=inv.id, item_type='rent', amount=1000, description="Rent"),
+            InvoiceLineItem(invoice_id=inv.id, item_type='sst', amount=80, description="SST 8%"),
+            InvoiceLineItem(invoice_id=inv.id, item_type='chargeback', amount=100, description="Chargeback"),
+        ])
+        db.session.commit()
+
+        print("Testing penalty base...")
+        assessment_date = due + timedelta(days=37) # 30 days after the grace period
+        fees = [f for f in calculate_late_fees([t], assessment_date) if f['tenant_id'] == t.id]
+        base = fees[0]['outstanding_rent'] if fees else 0
+        fee = fees[0]['fee_amount'] if fees else 0
+        expected_fee = 1000 * 0.08 * (30 / 365.0)
+        print(f"Penalty base: {base} (Expected 1000)")
+        print(f"Fee:          {fee:.2f} (Expected {expected_fee:.2f})")
+
+        if base == 1000 and abs(fee - expected_fee) < 0.005:
+            print("[PASS] Only the rent line is charged")
+        else:
+            print("[FAIL] Late fee charged on non-rent lines")
+
+        # Clean up
+        InvoiceLineItem.query.filter_by(invoice_id=inv.id).delete()
+        db.session.delete(inv)
+        db.session.delete(t)
+        db.session.commit()
+
+if __name__ == '__main__':
+    run_test()